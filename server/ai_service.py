@@ -2,6 +2,9 @@ import os
 import httpx
 from typing import Optional
 
+from http_clients import get_http_client
+from quota import QUOTAS, acquire_quota
+
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY", "")
 GEMINI_MODEL = "gemini-2.0-flash"
 
@@ -55,10 +58,9 @@ async def ask_travel_ai(
     end_date: str = "",
     avg_temp: Optional[float] = None,
     trip_type: str = "vacation",
+    client: httpx.AsyncClient | None = None,
 ) -> dict:
     """Ask the AI assistant a question about the trip destination."""
-    import asyncio
-    
     api_key = os.getenv("GEMINI_API_KEY", "")
     if not api_key:
         return {
@@ -90,53 +92,59 @@ async def ask_travel_ai(
 
     max_retries = 3
     base_delay = 2.0  # start with 2 seconds
+    overwhelmed = {
+        "answer": "Извините, AI-ассистент слишком перегружен запросами. Попробуйте через пару минут." if language == "ru" else "Sorry, AI assistant is overwhelmed. Please try again in a few minutes.",
+        "suggestions": SUGGESTED_QUESTIONS.get(language, SUGGESTED_QUESTIONS["ru"])[:3]
+    }
 
     try:
-        async with httpx.AsyncClient(timeout=15.0) as client:
-            for attempt in range(max_retries):
-                # Dynamically load base url to allow proxy services
-                gemini_url = os.getenv("GEMINI_BASE_URL", "").strip() or DEFAULT_URL
-                
-                resp = await client.post(
-                    f"{gemini_url}?key={api_key}",
-                    json=payload,
-                )
+        client = client or get_http_client("gemini")
+        for attempt in range(max_retries):
+            # Dynamically load base url to allow proxy services
+            gemini_url = os.getenv("GEMINI_BASE_URL", "").strip() or DEFAULT_URL
+
+            # Общий лимит Gemini на процесс: после 429 ждут все запросы, а не только этот
+            if not await acquire_quota("gemini"):
+                print("[AI] Gemini quota exhausted, skipping request")
+                return overwhelmed
+
+            resp = await client.post(
+                f"{gemini_url}?key={api_key}",
+                json=payload,
+            )
                 
-                if resp.status_code == 429:
-                    if attempt < max_retries - 1:
-                        sleep_time = base_delay * (2 ** attempt)
-                        print(f"[AI] Gemini rate limit (429). Retrying in {sleep_time}s... (Attempt {attempt+1}/{max_retries})")
-                        await asyncio.sleep(sleep_time)
-                        continue
-                    else:
-                        print(f"[AI] Gemini API error: {resp.status_code} {resp.text[:200]}")
-                        return {
-                            "answer": "Извините, AI-ассистент слишком перегружен запросами. Попробуйте через пару минут." if language == "ru" else "Sorry, AI assistant is overwhelmed. Please try again in a few minutes.",
-                            "suggestions": SUGGESTED_QUESTIONS.get(language, SUGGESTED_QUESTIONS["ru"])[:3]
-                        }
-                
-                if resp.status_code != 200:
+            if resp.status_code == 429:
+                if attempt < max_retries - 1:
+                    sleep_time = base_delay * (2 ** attempt)
+                    print(f"[AI] Gemini rate limit (429). Retrying in {sleep_time}s... (Attempt {attempt+1}/{max_retries})")
+                    QUOTAS["gemini"].backoff(sleep_time)
+                    continue
+                else:
                     print(f"[AI] Gemini API error: {resp.status_code} {resp.text[:200]}")
-                    return {
-                        "answer": "Извините, AI-ассистент временно недоступен. Попробуйте позже." if language == "ru" else "Sorry, AI assistant is temporarily unavailable.",
-                        "suggestions": SUGGESTED_QUESTIONS.get(language, SUGGESTED_QUESTIONS["ru"])[:3]
-                    }
-
-                data = resp.json()
-                candidates = data.get("candidates", [])
-                if not candidates:
-                    return {
-                        "answer": "Не удалось получить ответ." if language == "ru" else "Could not get a response.",
-                        "suggestions": []
-                    }
-
-                answer = candidates[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+                    return overwhelmed
                 
+            if resp.status_code != 200:
+                print(f"[AI] Gemini API error: {resp.status_code} {resp.text[:200]}")
                 return {
-                    "answer": answer.strip(),
+                    "answer": "Извините, AI-ассистент временно недоступен. Попробуйте позже." if language == "ru" else "Sorry, AI assistant is temporarily unavailable.",
                     "suggestions": SUGGESTED_QUESTIONS.get(language, SUGGESTED_QUESTIONS["ru"])[:3]
                 }
 
+            data = resp.json()
+            candidates = data.get("candidates", [])
+            if not candidates:
+                return {
+                    "answer": "Не удалось получить ответ." if language == "ru" else "Could not get a response.",
+                    "suggestions": []
+                }
+
+            answer = candidates[0].get("content", {}).get("parts", [{}])[0].get("text", "")
+                
+            return {
+                "answer": answer.strip(),
+                "suggestions": SUGGESTED_QUESTIONS.get(language, SUGGESTED_QUESTIONS["ru"])[:3]
+            }
+
     except Exception as e:
         print(f"[AI] Error: {e}")
         return {
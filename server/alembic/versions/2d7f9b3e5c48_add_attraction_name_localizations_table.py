@@ -0,0 +1,38 @@
+"""add attraction name localizations table
+
+Revision ID: 2d7f9b3e5c48
+Revises: 8e2b4d6f1a35
+Create Date: 2026-10-17 16:40:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "2d7f9b3e5c48"
+down_revision = "8e2b4d6f1a35"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "attraction_name_localizations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("lang", sa.String(), nullable=False),
+        sa.Column("city_name", sa.String(), nullable=False),
+        sa.Column("source_name", sa.String(), nullable=False),
+        sa.Column("localized_name", sa.String(), server_default="", nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("lang", "city_name", "source_name", name="uq_attraction_name_localizations_key"),
+    )
+    op.create_index(
+        op.f("ix_attraction_name_localizations_id"), "attraction_name_localizations", ["id"], unique=False
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_attraction_name_localizations_id"), table_name="attraction_name_localizations")
+    op.drop_table("attraction_name_localizations")
@@ -0,0 +1,65 @@
+"""add hotel cache and api usage tables
+
+Revision ID: 4a6c8e0b2d17
+Revises: 2d7f9b3e5c48
+Create Date: 2026-10-17 18:10:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "4a6c8e0b2d17"
+down_revision = "2d7f9b3e5c48"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "hotel_locations",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("query", sa.String(), nullable=False),
+        sa.Column("location_id", sa.String(), nullable=False),
+        sa.Column("label", sa.String(), nullable=True),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_hotel_locations_id"), "hotel_locations", ["id"], unique=False)
+    op.create_index(op.f("ix_hotel_locations_query"), "hotel_locations", ["query"], unique=True)
+
+    op.create_table(
+        "hotel_searches",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("location_id", sa.String(), nullable=False),
+        sa.Column("check_in", sa.Date(), nullable=False),
+        sa.Column("check_out", sa.Date(), nullable=False),
+        sa.Column("results", sa.JSON(), nullable=False),
+        sa.Column("fetched_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("location_id", "check_in", "check_out", name="uq_hotel_searches_location_dates"),
+    )
+    op.create_index(op.f("ix_hotel_searches_id"), "hotel_searches", ["id"], unique=False)
+
+    op.create_table(
+        "api_usage",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("provider", sa.String(), nullable=False),
+        sa.Column("period", sa.String(), nullable=False),
+        sa.Column("calls", sa.Integer(), server_default="0", nullable=False),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("provider", "period", name="uq_api_usage_provider_period"),
+    )
+    op.create_index(op.f("ix_api_usage_id"), "api_usage", ["id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_api_usage_id"), table_name="api_usage")
+    op.drop_table("api_usage")
+    op.drop_index(op.f("ix_hotel_searches_id"), table_name="hotel_searches")
+    op.drop_table("hotel_searches")
+    op.drop_index(op.f("ix_hotel_locations_query"), table_name="hotel_locations")
+    op.drop_index(op.f("ix_hotel_locations_id"), table_name="hotel_locations")
+    op.drop_table("hotel_locations")
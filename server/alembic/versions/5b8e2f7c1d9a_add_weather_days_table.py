@@ -0,0 +1,37 @@
+"""add weather days cache table
+
+Revision ID: 5b8e2f7c1d9a
+Revises: a7d3c9e1f4b2
+Create Date: 2026-10-17 11:20:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "5b8e2f7c1d9a"
+down_revision = "a7d3c9e1f4b2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "weather_days",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("lat", sa.Float(), nullable=False),
+        sa.Column("lon", sa.Float(), nullable=False),
+        sa.Column("source", sa.String(), nullable=False),
+        sa.Column("day", sa.Date(), nullable=False),
+        sa.Column("data", sa.JSON(), nullable=False),
+        sa.Column("fetched_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("lat", "lon", "source", "day", name="uq_weather_days_point_source_day"),
+    )
+    op.create_index(op.f("ix_weather_days_id"), "weather_days", ["id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_weather_days_id"), table_name="weather_days")
+    op.drop_table("weather_days")
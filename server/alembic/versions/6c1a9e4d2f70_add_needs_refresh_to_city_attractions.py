@@ -0,0 +1,29 @@
+"""add needs_refresh flag to city attractions
+
+Revision ID: 6c1a9e4d2f70
+Revises: 5b8e2f7c1d9a
+Create Date: 2026-10-17 14:05:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "6c1a9e4d2f70"
+down_revision = "5b8e2f7c1d9a"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column(
+        "city_attractions",
+        sa.Column("needs_refresh", sa.Boolean(), nullable=False, server_default="false"),
+    )
+    # Старые записи сохранялись без флага: один раз пересобрать их в фоне
+    op.execute("UPDATE city_attractions SET needs_refresh = true")
+
+
+def downgrade() -> None:
+    op.drop_column("city_attractions", "needs_refresh")
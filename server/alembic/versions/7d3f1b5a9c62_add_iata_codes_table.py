@@ -0,0 +1,35 @@
+"""add iata codes table
+
+Revision ID: 7d3f1b5a9c62
+Revises: 4a6c8e0b2d17
+Create Date: 2026-10-17 19:05:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "7d3f1b5a9c62"
+down_revision = "4a6c8e0b2d17"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "iata_codes",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("query", sa.String(), nullable=False),
+        sa.Column("code", sa.String(), nullable=False),
+        sa.Column("created_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_iata_codes_id"), "iata_codes", ["id"], unique=False)
+    op.create_index(op.f("ix_iata_codes_query"), "iata_codes", ["query"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_iata_codes_query"), table_name="iata_codes")
+    op.drop_index(op.f("ix_iata_codes_id"), table_name="iata_codes")
+    op.drop_table("iata_codes")
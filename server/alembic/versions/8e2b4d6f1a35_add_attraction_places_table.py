@@ -0,0 +1,139 @@
+"""add attraction_places table, city_attractions keeps place ids
+
+Revision ID: 8e2b4d6f1a35
+Revises: 6c1a9e4d2f70
+Create Date: 2026-10-17 15:30:00.000000
+"""
+
+import json
+from urllib.parse import parse_qs, quote, urlparse
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "8e2b4d6f1a35"
+down_revision = "6c1a9e4d2f70"
+branch_labels = None
+depends_on = None
+
+
+def _cid(link: str) -> str | None:
+    try:
+        return (parse_qs(urlparse(link).query).get("cid") or [""])[0].strip() or None
+    except Exception:
+        return None
+
+
+def _split_cache_key(cache_key: str) -> tuple[str, str]:
+    # Ключ кэша: f"{city}_{lang}_{limit}"; в названии города тоже может быть "_"
+    parts = cache_key.rsplit("_", 2)
+    if len(parts) != 3:
+        return cache_key, "ru"
+    return parts[0], parts[1]
+
+
+def upgrade() -> None:
+    op.create_table(
+        "attraction_places",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("link", sa.String(), nullable=False),
+        sa.Column("cid", sa.String(), nullable=True),
+        sa.Column("city_name", sa.String(), nullable=False),
+        sa.Column("names", postgresql.JSONB(), server_default="{}", nullable=False),
+        sa.Column("image", sa.String(), nullable=True),
+        sa.Column("photo_ref", sa.String(), nullable=True),
+        sa.Column("rating", sa.Float(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_attraction_places_id"), "attraction_places", ["id"], unique=False)
+    op.create_index(op.f("ix_attraction_places_link"), "attraction_places", ["link"], unique=True)
+    op.create_index(op.f("ix_attraction_places_cid"), "attraction_places", ["cid"], unique=False)
+    op.create_index(op.f("ix_attraction_places_city_name"), "attraction_places", ["city_name"], unique=False)
+    op.add_column(
+        "city_attractions",
+        sa.Column("place_ids", sa.JSON(), server_default="[]", nullable=False),
+    )
+
+    # Перенос: каждый элемент старых JSON-списков -> место (по ссылке), в записи остаются id
+    bind = op.get_bind()
+    places: dict[str, dict] = {}
+    variants = []
+    for variant_id, cache_key, data in bind.execute(sa.text("SELECT id, city_name, data FROM city_attractions")):
+        city_name, lang = _split_cache_key(cache_key)
+        if isinstance(data, str):
+            data = json.loads(data)
+        links = []
+        for item in data or []:
+            name = str((item or {}).get("name") or "").strip()
+            if not name:
+                continue
+            link = str(item.get("link") or "").strip() or (
+                f"https://www.google.com/maps/search/?api=1&query={quote(name + ', ' + city_name)}"
+            )
+            place = places.setdefault(link, {"city_name": city_name, "names": {}, "image": None})
+            place["names"].setdefault(lang, name)
+            image = str(item.get("image") or "").strip()
+            if image and (not place["image"] or "googleusercontent" in image):
+                place["image"] = image
+            if link not in links:
+                links.append(link)
+        variants.append((variant_id, links))
+
+    place_ids: dict[str, int] = {}
+    for link, place in places.items():
+        place_ids[link] = bind.execute(
+            sa.text(
+                "INSERT INTO attraction_places (link, cid, city_name, names, image) "
+                "VALUES (:link, :cid, :city_name, CAST(:names AS jsonb), :image) RETURNING id"
+            ),
+            {
+                "link": link,
+                "cid": _cid(link),
+                "city_name": place["city_name"],
+                "names": json.dumps(place["names"], ensure_ascii=False),
+                "image": place["image"],
+            },
+        ).scalar_one()
+    for variant_id, links in variants:
+        bind.execute(
+            sa.text("UPDATE city_attractions SET place_ids = CAST(:place_ids AS json) WHERE id = :id"),
+            {"id": variant_id, "place_ids": json.dumps([place_ids[link] for link in links])},
+        )
+
+    op.drop_column("city_attractions", "data")
+
+
+def downgrade() -> None:
+    op.add_column(
+        "city_attractions",
+        sa.Column("data", sa.JSON(), server_default="[]", nullable=False),
+    )
+    bind = op.get_bind()
+    places = {
+        place_id: (link, names, image)
+        for place_id, link, names, image in bind.execute(
+            sa.text("SELECT id, link, names, image FROM attraction_places")
+        )
+    }
+    for variant_id, cache_key, ids in bind.execute(sa.text("SELECT id, city_name, place_ids FROM city_attractions")):
+        _, lang = _split_cache_key(cache_key)
+        data = []
+        for place_id in ids or []:
+            if place_id not in places:
+                continue
+            link, names, image = places[place_id]
+            data.append({"name": names.get(lang) or next(iter(names.values()), ""), "image": image, "link": link})
+        bind.execute(
+            sa.text("UPDATE city_attractions SET data = CAST(:data AS json) WHERE id = :id"),
+            {"id": variant_id, "data": json.dumps(data, ensure_ascii=False)},
+        )
+    op.drop_column("city_attractions", "place_ids")
+    op.drop_index(op.f("ix_attraction_places_city_name"), table_name="attraction_places")
+    op.drop_index(op.f("ix_attraction_places_cid"), table_name="attraction_places")
+    op.drop_index(op.f("ix_attraction_places_link"), table_name="attraction_places")
+    op.drop_index(op.f("ix_attraction_places_id"), table_name="attraction_places")
+    op.drop_table("attraction_places")
@@ -0,0 +1,35 @@
+"""add exchange rate snapshots table
+
+Revision ID: 9b5e2c7d4f18
+Revises: 7d3f1b5a9c62
+Create Date: 2026-10-17 19:40:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "9b5e2c7d4f18"
+down_revision = "7d3f1b5a9c62"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "exchange_rate_snapshots",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("base", sa.String(), nullable=False),
+        sa.Column("rates", sa.JSON(), nullable=False),
+        sa.Column("fetched_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_exchange_rate_snapshots_id"), "exchange_rate_snapshots", ["id"], unique=False)
+    op.create_index(op.f("ix_exchange_rate_snapshots_base"), "exchange_rate_snapshots", ["base"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_exchange_rate_snapshots_base"), table_name="exchange_rate_snapshots")
+    op.drop_index(op.f("ix_exchange_rate_snapshots_id"), table_name="exchange_rate_snapshots")
+    op.drop_table("exchange_rate_snapshots")
@@ -0,0 +1,29 @@
+"""add rate limit slots table
+
+Revision ID: a3d9f1c6b8e2
+Revises: f2a6c8d4e1b9
+Create Date: 2026-10-18 15:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a3d9f1c6b8e2"
+down_revision = "f2a6c8d4e1b9"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "rate_limit_slots",
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("next_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("name"),
+    )
+
+
+def downgrade() -> None:
+    op.drop_table("rate_limit_slots")
@@ -0,0 +1,39 @@
+"""add geocode cache table
+
+Revision ID: a7d3c9e1f4b2
+Revises: f3c9b7a1d2e4
+Create Date: 2026-10-17 10:05:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a7d3c9e1f4b2"
+down_revision = "f3c9b7a1d2e4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "geocode_cache",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("query", sa.String(), nullable=False),
+        sa.Column("language", sa.String(), nullable=False, server_default=""),
+        sa.Column("lat", sa.Float(), nullable=False),
+        sa.Column("lon", sa.Float(), nullable=False),
+        sa.Column("country_code", sa.String(), nullable=True),
+        sa.Column("display_name", sa.String(), nullable=True),
+        sa.Column("address", sa.JSON(), nullable=True),
+        sa.Column("updated_at", sa.DateTime(), server_default=sa.text("now()"), nullable=True),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint("query", "language", name="uq_geocode_cache_query_language"),
+    )
+    op.create_index(op.f("ix_geocode_cache_id"), "geocode_cache", ["id"], unique=False)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_geocode_cache_id"), table_name="geocode_cache")
+    op.drop_table("geocode_cache")
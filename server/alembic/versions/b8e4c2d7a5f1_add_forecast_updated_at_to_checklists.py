@@ -0,0 +1,24 @@
+"""add forecast_updated_at to checklists
+
+Revision ID: b8e4c2d7a5f1
+Revises: a3d9f1c6b8e2
+Create Date: 2026-10-18 15:40:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "b8e4c2d7a5f1"
+down_revision = "a3d9f1c6b8e2"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("checklists", sa.Column("forecast_updated_at", sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("checklists", "forecast_updated_at")
@@ -0,0 +1,220 @@
+"""checklist_items: one row per item instead of arrays and JSON maps
+
+Старые колонки (items, checked_items, ..., packed_quantities) пока остаются: приложение
+их больше не читает и не пишет, а откат этой ревизии собирает их заново из строк.
+Удаляет их отдельная ревизия d7f3b9e2c6a4.
+
+Revision ID: c4e7a2f9b1d3
+Revises: 9b5e2c7d4f18
+Create Date: 2026-10-17 21:10:00.000000
+"""
+
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "c4e7a2f9b1d3"
+down_revision = "9b5e2c7d4f18"
+branch_labels = None
+depends_on = None
+
+
+BATCH_SIZE = 1000
+
+checklist_items = sa.table(
+    "checklist_items",
+    sa.column("checklist_id", sa.Integer),
+    sa.column("backpack_id", sa.Integer),
+    sa.column("section", sa.String),
+    sa.column("item_key", sa.String),
+    sa.column("text", sa.String),
+    sa.column("quantity", sa.Integer),
+    sa.column("packed_quantity", sa.Integer),
+    sa.column("is_checked", sa.Boolean),
+    sa.column("is_removed", sa.Boolean),
+    sa.column("position", sa.Integer),
+    sa.column("added_position", sa.Integer),
+)
+
+
+def _key(value) -> str:
+    # Как normalize_item_key в models.py
+    return str(value or "").strip().lower().replace("ё", "е")
+
+
+def _as_map(value) -> dict:
+    if isinstance(value, str):
+        try:
+            value = json.loads(value)
+        except ValueError:
+            return {}
+    return value if isinstance(value, dict) else {}
+
+
+def _rows_for(owner: dict, items, checked, removed, added, quantities, packed) -> list[dict]:
+    # Дубли по нормализованному ключу схлопываются: первый текст и первая позиция выигрывают
+    rows: dict[str, dict] = {}
+
+    def row(text) -> dict | None:
+        key = _key(text)
+        if not key:
+            return None
+        if key not in rows:
+            rows[key] = {
+                **owner,
+                "item_key": key,
+                "text": str(text).strip(),
+                "quantity": None,
+                "packed_quantity": None,
+                "is_checked": False,
+                "is_removed": False,
+                "position": None,
+                "added_position": None,
+            }
+        return rows[key]
+
+    for attr, values in (("position", items), ("added_position", added)):
+        for index, text in enumerate(values or []):
+            target = row(text)
+            if target is not None and target[attr] is None:
+                target[attr] = index
+    for attr, values in (("is_checked", checked), ("is_removed", removed)):
+        for text in values or []:
+            target = row(text)
+            if target is not None:
+                target[attr] = True
+    for attr, values in (("quantity", quantities), ("packed_quantity", packed)):
+        for key, value in _as_map(values).items():
+            try:
+                quantity = int(value)
+            except (TypeError, ValueError):
+                continue
+            target = row(key)
+            if target is not None:
+                target[attr] = quantity
+    return list(rows.values())
+
+
+def _backfill(bind, table: str, owner_column: str, section: str) -> None:
+    result = bind.execute(sa.text(
+        f"SELECT id, items, checked_items, removed_items, added_items, item_quantities, packed_quantities "
+        f"FROM {table} ORDER BY id"
+    ))
+    batch = []
+    for owner_id, items, checked, removed, added, quantities, packed in result:
+        owner = {
+            "checklist_id": None,
+            "backpack_id": None,
+            owner_column: owner_id,
+            "section": section,
+        }
+        batch.extend(_rows_for(owner, items, checked, removed, added, quantities, packed))
+        if len(batch) >= BATCH_SIZE:
+            op.bulk_insert(checklist_items, batch)
+            batch = []
+    if batch:
+        op.bulk_insert(checklist_items, batch)
+
+
+def upgrade() -> None:
+    op.create_table(
+        "checklist_items",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("checklist_id", sa.Integer(), nullable=True),
+        sa.Column("backpack_id", sa.Integer(), nullable=True),
+        sa.Column("section", sa.String(), server_default="checklist", nullable=False),
+        sa.Column("item_key", sa.String(), nullable=False),
+        sa.Column("text", sa.String(), nullable=False),
+        sa.Column("quantity", sa.Integer(), nullable=True),
+        sa.Column("packed_quantity", sa.Integer(), nullable=True),
+        sa.Column("is_checked", sa.Boolean(), server_default="false", nullable=False),
+        sa.Column("is_removed", sa.Boolean(), server_default="false", nullable=False),
+        sa.Column("position", sa.Integer(), nullable=True),
+        sa.Column("added_position", sa.Integer(), nullable=True),
+        sa.ForeignKeyConstraint(["checklist_id"], ["checklists.id"], ondelete="CASCADE"),
+        sa.ForeignKeyConstraint(["backpack_id"], ["user_backpacks.id"], ondelete="CASCADE"),
+        sa.CheckConstraint(
+            "(checklist_id IS NULL) <> (backpack_id IS NULL)",
+            name="ck_checklist_items_single_owner",
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_checklist_items_id"), "checklist_items", ["id"], unique=False)
+    op.create_index(op.f("ix_checklist_items_checklist_id"), "checklist_items", ["checklist_id"], unique=False)
+    op.create_index(op.f("ix_checklist_items_backpack_id"), "checklist_items", ["backpack_id"], unique=False)
+    op.create_index(
+        "uq_checklist_items_checklist_key",
+        "checklist_items",
+        ["checklist_id", "item_key"],
+        unique=True,
+        postgresql_where=sa.text("checklist_id IS NOT NULL"),
+    )
+    op.create_index(
+        "uq_checklist_items_backpack_key",
+        "checklist_items",
+        ["backpack_id", "item_key"],
+        unique=True,
+        postgresql_where=sa.text("backpack_id IS NOT NULL"),
+    )
+
+    bind = op.get_bind()
+    _backfill(bind, "checklists", "checklist_id", "checklist")
+    _backfill(bind, "user_backpacks", "backpack_id", "backpack")
+
+
+def downgrade() -> None:
+    # Колонки всё это время не обновлялись: собираем массивы и карты заново из строк
+    # (порядок отметок — по позиции в items)
+    bind = op.get_bind()
+    for table, owner_column in (("checklists", "checklist_id"), ("user_backpacks", "backpack_id")):
+        owners: dict[int, dict] = {}
+        rows = bind.execute(sa.text(
+            f"SELECT {owner_column}, item_key, text, quantity, packed_quantity, is_checked, is_removed, "
+            f"position, added_position FROM checklist_items WHERE {owner_column} IS NOT NULL "
+            f"ORDER BY {owner_column}, position NULLS LAST, added_position NULLS LAST, id"
+        ))
+        for owner_id, key, text, quantity, packed, is_checked, is_removed, position, added_position in rows:
+            owner = owners.setdefault(owner_id, {
+                "items": [], "checked_items": [], "removed_items": [], "added_items": [],
+                "item_quantities": {}, "packed_quantities": {},
+            })
+            if position is not None:
+                owner["items"].append((position, text))
+            if added_position is not None:
+                owner["added_items"].append((added_position, text))
+            if is_checked:
+                owner["checked_items"].append(text)
+            if is_removed:
+                owner["removed_items"].append(text)
+            if quantity is not None:
+                owner["item_quantities"][key] = quantity
+            if packed is not None:
+                owner["packed_quantities"][key] = packed
+        for owner_id, owner in owners.items():
+            bind.execute(
+                sa.text(
+                    f"UPDATE {table} SET items = :items, checked_items = :checked_items, "
+                    f"removed_items = :removed_items, added_items = :added_items, "
+                    f"item_quantities = CAST(:item_quantities AS JSON), "
+                    f"packed_quantities = CAST(:packed_quantities AS JSON) WHERE id = :id"
+                ),
+                {
+                    "id": owner_id,
+                    "items": [text for _, text in sorted(owner["items"])],
+                    "added_items": [text for _, text in sorted(owner["added_items"])],
+                    "checked_items": owner["checked_items"],
+                    "removed_items": owner["removed_items"],
+                    "item_quantities": json.dumps(owner["item_quantities"], ensure_ascii=False),
+                    "packed_quantities": json.dumps(owner["packed_quantities"], ensure_ascii=False),
+                },
+            )
+
+    op.drop_index("uq_checklist_items_backpack_key", table_name="checklist_items")
+    op.drop_index("uq_checklist_items_checklist_key", table_name="checklist_items")
+    op.drop_index(op.f("ix_checklist_items_backpack_id"), table_name="checklist_items")
+    op.drop_index(op.f("ix_checklist_items_checklist_id"), table_name="checklist_items")
+    op.drop_index(op.f("ix_checklist_items_id"), table_name="checklist_items")
+    op.drop_table("checklist_items")
@@ -0,0 +1,40 @@
+"""drop legacy item arrays and maps from checklists and user_backpacks
+
+Вещи живут в checklist_items с ревизии c4e7a2f9b1d3. Эту ревизию можно придержать
+(alembic upgrade b8e4c2d7a5f1), пока сохраняется окно для отката: до неё откат
+checklist_items восстанавливает старые колонки из строк.
+
+Revision ID: d7f3b9e2c6a4
+Revises: b8e4c2d7a5f1
+Create Date: 2026-10-19 10:20:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = "d7f3b9e2c6a4"
+down_revision = "b8e4c2d7a5f1"
+branch_labels = None
+depends_on = None
+
+
+LIST_COLUMNS = ("items", "checked_items", "removed_items", "added_items")
+MAP_COLUMNS = ("item_quantities", "packed_quantities")
+
+
+def upgrade() -> None:
+    for table in ("checklists", "user_backpacks"):
+        for column in (*LIST_COLUMNS, *MAP_COLUMNS):
+            op.drop_column(table, column)
+
+
+def downgrade() -> None:
+    # Колонки возвращаются пустыми: заполняет их откат c4e7a2f9b1d3
+    for table in ("checklists", "user_backpacks"):
+        for column in LIST_COLUMNS:
+            op.add_column(table, sa.Column(column, postgresql.ARRAY(sa.String()), nullable=True))
+        for column in MAP_COLUMNS:
+            op.add_column(table, sa.Column(column, sa.JSON(), server_default="{}", nullable=False))
@@ -0,0 +1,34 @@
+"""add job runs table
+
+Revision ID: e5b8d3a1c7f4
+Revises: c4e7a2f9b1d3
+Create Date: 2026-10-18 10:20:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "e5b8d3a1c7f4"
+down_revision = "c4e7a2f9b1d3"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "job_runs",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("name", sa.String(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), server_default=sa.text("now()"), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(op.f("ix_job_runs_id"), "job_runs", ["id"], unique=False)
+    op.create_index(op.f("ix_job_runs_name"), "job_runs", ["name"], unique=True)
+
+
+def downgrade() -> None:
+    op.drop_index(op.f("ix_job_runs_name"), table_name="job_runs")
+    op.drop_index(op.f("ix_job_runs_id"), table_name="job_runs")
+    op.drop_table("job_runs")
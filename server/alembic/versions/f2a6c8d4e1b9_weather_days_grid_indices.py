@@ -0,0 +1,51 @@
+"""weather_days: integer grid indices instead of Float lat/lon
+
+Revision ID: f2a6c8d4e1b9
+Revises: e5b8d3a1c7f4
+Create Date: 2026-10-18 14:00:00.000000
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "f2a6c8d4e1b9"
+down_revision = "e5b8d3a1c7f4"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    op.add_column("weather_days", sa.Column("lat_idx", sa.Integer(), nullable=True))
+    op.add_column("weather_days", sa.Column("lon_idx", sa.Integer(), nullable=True))
+    op.execute("UPDATE weather_days SET lat_idx = round(lat * 100), lon_idx = round(lon * 100)")
+    # Float-дубли одной точки схлопываются в одну ячейку сетки: оставляем самую свежую строку
+    op.execute(
+        "DELETE FROM weather_days w USING weather_days newer "
+        "WHERE w.lat_idx = newer.lat_idx AND w.lon_idx = newer.lon_idx "
+        "AND w.source = newer.source AND w.day = newer.day "
+        "AND (w.fetched_at, w.id) < (newer.fetched_at, newer.id)"
+    )
+    op.alter_column("weather_days", "lat_idx", nullable=False)
+    op.alter_column("weather_days", "lon_idx", nullable=False)
+    op.drop_constraint("uq_weather_days_point_source_day", "weather_days", type_="unique")
+    op.create_unique_constraint(
+        "uq_weather_days_point_source_day", "weather_days", ["lat_idx", "lon_idx", "source", "day"]
+    )
+    op.drop_column("weather_days", "lat")
+    op.drop_column("weather_days", "lon")
+
+
+def downgrade() -> None:
+    op.add_column("weather_days", sa.Column("lat", sa.Float(), nullable=True))
+    op.add_column("weather_days", sa.Column("lon", sa.Float(), nullable=True))
+    op.execute("UPDATE weather_days SET lat = lat_idx / 100.0, lon = lon_idx / 100.0")
+    op.alter_column("weather_days", "lat", nullable=False)
+    op.alter_column("weather_days", "lon", nullable=False)
+    op.drop_constraint("uq_weather_days_point_source_day", "weather_days", type_="unique")
+    op.create_unique_constraint(
+        "uq_weather_days_point_source_day", "weather_days", ["lat", "lon", "source", "day"]
+    )
+    op.drop_column("weather_days", "lat_idx")
+    op.drop_column("weather_days", "lon_idx")
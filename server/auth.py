@@ -50,6 +50,11 @@ async def get_current_user(
     db: AsyncSession = Depends(get_db),
 ):
     """Получение текущего пользователя из JWT-токена"""
+    return await user_from_token(token, db)
+
+
+async def user_from_token(token: Optional[str], db: AsyncSession):
+    """Пользователь из JWT-токена, прочитанный сессией db; без токена — None"""
     if token is None:
         return None
 
@@ -78,6 +83,10 @@ async def require_current_user(
     user=Depends(get_current_user),
 ):
     """Требование авторизации — если пользователь не авторизован, выбрасываем ошибку"""
+    return ensure_authenticated(user)
+
+
+def ensure_authenticated(user):
     if user is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
@@ -0,0 +1,101 @@
+import os
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from city_index import normalize_city_name
+
+
+AUTOCOMPLETE_CACHE_SIZE = int(os.getenv("AUTOCOMPLETE_CACHE_SIZE", "5000"))
+AUTOCOMPLETE_CACHE_TTL_SECONDS = int(os.getenv("AUTOCOMPLETE_CACHE_TTL_SECONDS", "86400"))
+# Пустые ответы держим недолго — провайдеры могут начать находить новое название
+AUTOCOMPLETE_NEGATIVE_TTL_SECONDS = 600
+# Короче этого префиксы не запрашиваются (min_length у эндпоинта)
+AUTOCOMPLETE_MIN_PREFIX = 2
+# Неполный (обрезанный лимитом провайдера) список годится для более длинного префикса,
+# только если после фильтрации в нём осталось хотя бы столько городов
+AUTOCOMPLETE_MIN_EXTENSION_RESULTS = 3
+
+
+@dataclass
+class _Entry:
+    results: list[dict]
+    exhaustive: bool
+    expires_at: float
+
+
+def _matches_prefix(result: dict, prefix: str) -> bool:
+    for field in ("name", "fullName"):
+        words = normalize_city_name(result.get(field)).split(" ")
+        if any(" ".join(words[i:]).startswith(prefix) for i in range(len(words))):
+            return True
+    return False
+
+
+class AutocompleteCache:
+    """LRU ответов автокомплита по (язык, нормализованный префикс).
+
+    Для «Пари» после «Пар» не нужен новый запрос: берём закэшированный ответ самого
+    длинного более короткого префикса и фильтруем его. exhaustive=True означает, что
+    провайдеры вернули меньше своего лимита, то есть список полный.
+    """
+
+    def __init__(self, max_size: int = AUTOCOMPLETE_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries: "OrderedDict[tuple[str, str], _Entry]" = OrderedDict()
+        self._counters = {
+            "hits": 0,
+            "extension_hits": 0,
+            "negative_hits": 0,
+            "misses": 0,
+        }
+
+    def _get_entry(self, key: tuple[str, str]) -> _Entry | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry.expires_at < time.time():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry
+
+    def get(self, language: str, prefix: str) -> list[dict] | None:
+        normalized = normalize_city_name(prefix)
+        entry = self._get_entry((language, normalized))
+        if entry is not None:
+            self._counters["negative_hits" if not entry.results else "hits"] += 1
+            return entry.results
+
+        for length in range(len(normalized) - 1, AUTOCOMPLETE_MIN_PREFIX - 1, -1):
+            shorter = self._get_entry((language, normalized[:length].rstrip()))
+            if shorter is None:
+                continue
+            filtered = [result for result in shorter.results if _matches_prefix(result, normalized)]
+            if shorter.exhaustive or len(filtered) >= AUTOCOMPLETE_MIN_EXTENSION_RESULTS:
+                self._counters["extension_hits" if filtered else "negative_hits"] += 1
+                return filtered
+            break
+
+        self._counters["misses"] += 1
+        return None
+
+    def put(self, language: str, prefix: str, results: list[dict], exhaustive: bool) -> None:
+        ttl = AUTOCOMPLETE_CACHE_TTL_SECONDS if results else AUTOCOMPLETE_NEGATIVE_TTL_SECONDS
+        key = (language, normalize_city_name(prefix))
+        self._entries[key] = _Entry(results=results, exhaustive=exhaustive, expires_at=time.time() + ttl)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def metrics(self) -> dict:
+        lookups = sum(self._counters.values())
+        hits = lookups - self._counters["misses"]
+        return {
+            **self._counters,
+            "size": len(self._entries),
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+        }
+
+
+AUTOCOMPLETE_CACHE = AutocompleteCache()
@@ -6,6 +6,8 @@ from typing import Any, Optional
 import httpx
 
 import crud
+from http_clients import get_http_client
+from quota import QUOTAS, acquire_quota
 
 
 GEMINI_MODEL = "gemini-2.0-flash"
@@ -229,7 +231,7 @@ CREATE_BAGGAGE_PATTERNS = [
 
 
 def _normalize_item(value: str) -> str:
-    return re.sub(r"\s+", " ", (value or "").strip().lower())
+    return re.sub(r"\s+", " ", (value or "").strip().lower()).replace("ё", "е")
 
 
 def _strip_conversational_prefixes(value: str) -> str:
@@ -1526,7 +1528,12 @@ def _extract_actions_fallback(command: str, checklist=None, actor_user_id: Optio
     return {"recognized_action_request": recognized, "actions": []}
 
 
-async def _extract_actions_with_ai(command: str, checklist_items: list[str], language: str = "ru") -> Optional[dict[str, Any]]:
+async def _extract_actions_with_ai(
+    command: str,
+    checklist_items: list[str],
+    language: str = "ru",
+    client: httpx.AsyncClient | None = None,
+) -> Optional[dict[str, Any]]:
     api_key = os.getenv("GEMINI_API_KEY", "").strip()
     if not api_key:
         return None
@@ -1554,49 +1561,53 @@ async def _extract_actions_with_ai(command: str, checklist_items: list[str], lan
     }
 
     try:
-        async with httpx.AsyncClient(timeout=12.0) as client:
-            url = os.getenv("GEMINI_BASE_URL", "").strip() or DEFAULT_GEMINI_URL
-            response = await client.post(f"{url}?key={api_key}", json=payload)
-            if response.status_code != 200:
-                return None
-
-            data = response.json()
-            text = (
-                data.get("candidates", [{}])[0]
-                .get("content", {})
-                .get("parts", [{}])[0]
-                .get("text", "")
-                .strip()
-            )
-            if not text:
-                return None
-
-            text = text.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
-            start = text.find("{")
-            end = text.rfind("}")
-            if start == -1 or end == -1:
-                return None
-
-            parsed = json.loads(text[start:end + 1])
-            if not isinstance(parsed, dict):
-                return None
-
-            actions = []
-            for action in parsed.get("actions", []):
-                action_type = action.get("type")
-                items = action.get("items") or []
-                if action_type not in {"add", "remove", "check", "uncheck"}:
-                    continue
-                if not isinstance(items, list):
-                    continue
-                normalized_items = _dedupe_preserve([str(item) for item in items if str(item).strip()])
-                if normalized_items:
-                    actions.append({"type": action_type, "items": normalized_items})
+        client = client or get_http_client("gemini")
+        url = os.getenv("GEMINI_BASE_URL", "").strip() or DEFAULT_GEMINI_URL
+        if not await acquire_quota("gemini"):
+            return None
+        response = await client.post(f"{url}?key={api_key}", json=payload, timeout=12.0)
+        if response.status_code == 429:
+            QUOTAS["gemini"].backoff(10)
+        if response.status_code != 200:
+            return None
+
+        data = response.json()
+        text = (
+            data.get("candidates", [{}])[0]
+            .get("content", {})
+            .get("parts", [{}])[0]
+            .get("text", "")
+            .strip()
+        )
+        if not text:
+            return None
 
-            return {
-                "recognized_action_request": bool(parsed.get("recognized_action_request")) or bool(actions),
-                "actions": actions,
-            }
+        text = text.removeprefix("```json").removeprefix("```").removesuffix("```").strip()
+        start = text.find("{")
+        end = text.rfind("}")
+        if start == -1 or end == -1:
+            return None
+
+        parsed = json.loads(text[start:end + 1])
+        if not isinstance(parsed, dict):
+            return None
+
+        actions = []
+        for action in parsed.get("actions", []):
+            action_type = action.get("type")
+            items = action.get("items") or []
+            if action_type not in {"add", "remove", "check", "uncheck"}:
+                continue
+            if not isinstance(items, list):
+                continue
+            normalized_items = _dedupe_preserve([str(item) for item in items if str(item).strip()])
+            if normalized_items:
+                actions.append({"type": action_type, "items": normalized_items})
+
+        return {
+            "recognized_action_request": bool(parsed.get("recognized_action_request")) or bool(actions),
+            "actions": actions,
+        }
     except Exception as exc:
         print(f"[Checklist AI] parse error: {exc}")
         return None
@@ -2701,23 +2712,31 @@ async def apply_checklist_ai_actions(
             "checklist": checklist,
         }
 
-    checklist.items = simulated["items"]
-    checklist.checked_items = simulated["checked_items"]
-    checklist.added_items = simulated["added_items"]
-    checklist.removed_items = simulated["removed_items"]
-    checklist.item_quantities = simulated["item_quantities"]
-    checklist.packed_quantities = simulated["packed_quantities"]
+    await crud.save_checklist_items(
+        db,
+        checklist,
+        items=simulated["items"],
+        checked_items=simulated["checked_items"],
+        added_items=simulated["added_items"],
+        removed_items=simulated["removed_items"],
+        item_quantities=simulated["item_quantities"],
+        packed_quantities=simulated["packed_quantities"],
+    )
     backpack_map = {backpack.id: backpack for backpack in (checklist.backpacks or [])}
     for backpack_snapshot in simulated["backpacks"]:
         backpack = backpack_map.get(backpack_snapshot["id"])
         if not backpack:
             continue
-        backpack.items = _dedupe_preserve(backpack_snapshot["items"])
-        backpack.checked_items = _dedupe_preserve(backpack_snapshot["checked_items"])
-        backpack.added_items = _dedupe_preserve(backpack_snapshot["added_items"])
-        backpack.removed_items = _dedupe_preserve(backpack_snapshot["removed_items"])
-        backpack.item_quantities = _normalize_quantity_map(backpack_snapshot.get("item_quantities"))
-        backpack.packed_quantities = _normalize_packed_quantity_map(backpack_snapshot.get("packed_quantities"))
+        await crud.save_checklist_items(
+            db,
+            backpack,
+            items=_dedupe_preserve(backpack_snapshot["items"]),
+            checked_items=_dedupe_preserve(backpack_snapshot["checked_items"]),
+            added_items=_dedupe_preserve(backpack_snapshot["added_items"]),
+            removed_items=_dedupe_preserve(backpack_snapshot["removed_items"]),
+            item_quantities=_normalize_quantity_map(backpack_snapshot.get("item_quantities")),
+            packed_quantities=_normalize_packed_quantity_map(backpack_snapshot.get("packed_quantities")),
+        )
 
     await db.commit()
     updated_checklist = await crud.get_checklist_by_id(db, checklist.id)
@@ -0,0 +1,173 @@
+import csv
+import os
+import re
+from bisect import bisect_left, insort
+from dataclasses import dataclass
+from typing import Optional
+
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+CITIES_FILE = os.path.join(DATA_DIR, "cities.tsv")
+COUNTRIES_FILE = os.path.join(DATA_DIR, "countries.tsv")
+
+# Города, подтянутые из Open-Meteo/Nominatim на промахах; держим ограниченное число
+CITY_INDEX_MAX_LEARNED = int(os.getenv("CITY_INDEX_MAX_LEARNED", "5000"))
+# Два результата ближе этого (в градусах) считаем одним городом
+DUPLICATE_COORD_DELTA = 0.1
+
+
+@dataclass(frozen=True)
+class City:
+    name_ru: str
+    name_en: str
+    country: str
+    country_name_ru: str
+    country_name_en: str
+    admin1: str
+    lat: float
+    lon: float
+    population: int
+    source: str = "local"
+
+    def to_autocomplete(self) -> dict:
+        name = self.name_ru or self.name_en
+        parts = [name]
+        if self.admin1 and self.admin1 != name:
+            parts.append(self.admin1)
+        country_name = self.country_name_ru or self.country_name_en
+        if country_name:
+            parts.append(country_name)
+        return {
+            "name": name,
+            "country": self.country,
+            "country_name": country_name,
+            "admin1": self.admin1,
+            "lat": self.lat,
+            "lon": self.lon,
+            "fullName": ", ".join(parts),
+            "source": self.source,
+        }
+
+
+def normalize_city_name(value: str | None) -> str:
+    value = (value or "").casefold().replace("ё", "е")
+    value = re.sub(r"[-‐–—'’.,]", " ", value)
+    return re.sub(r"\s+", " ", value).strip()
+
+
+class CityIndex:
+    """Префиксный поиск по отсортированному массиву нормализованных названий.
+
+    Каждое название (русское, английское, альтернативные) — отдельный ключ, указывающий
+    на город; диапазон ключей с префиксом находится двумя bisect'ами. Справочник собирается
+    один раз и не меняется, а города, выученные у внешних провайдеров, лежат в отдельном
+    небольшом отсортированном списке (insort), чтобы вставка не сдвигала весь справочник.
+    """
+
+    def __init__(self):
+        self._keys: list[str] = []
+        self._city_ids: list[int] = []
+        # (ключ, id города) выученных городов, отсортировано по ключу
+        self._learned_keys: list[tuple[str, int]] = []
+        self._cities: list[City] = []
+        # Сетка ~DUPLICATE_COORD_DELTA для поиска близких городов без перебора
+        self._grid: dict[tuple[int, int], list[int]] = {}
+        self._learned = 0
+
+    def __len__(self) -> int:
+        return len(self._cities)
+
+    @staticmethod
+    def _grid_cell(lat: float, lon: float) -> tuple[int, int]:
+        return int(lat // DUPLICATE_COORD_DELTA), int(lon // DUPLICATE_COORD_DELTA)
+
+    def find_near(self, lat: float, lon: float) -> Optional[City]:
+        cell_lat, cell_lon = self._grid_cell(lat, lon)
+        for d_lat in (-1, 0, 1):
+            for d_lon in (-1, 0, 1):
+                for city_id in self._grid.get((cell_lat + d_lat, cell_lon + d_lon), ()):
+                    city = self._cities[city_id]
+                    if abs(city.lat - lat) < DUPLICATE_COORD_DELTA and abs(city.lon - lon) < DUPLICATE_COORD_DELTA:
+                        return city
+        return None
+
+    def _register(self, city: City) -> int:
+        city_id = len(self._cities)
+        self._cities.append(city)
+        self._grid.setdefault(self._grid_cell(city.lat, city.lon), []).append(city_id)
+        return city_id
+
+    def build(self, entries: list[tuple[City, list[str]]]) -> None:
+        """Массовая загрузка: собрать все ключи и отсортировать один раз."""
+        pairs = []
+        for city, names in entries:
+            city_id = self._register(city)
+            for key in {normalize_city_name(name) for name in names if name}:
+                if key:
+                    pairs.append((key, city_id))
+        pairs.sort()
+        self._keys = [key for key, _ in pairs]
+        self._city_ids = [city_id for _, city_id in pairs]
+
+    def add(self, city: City, names: list[str]) -> bool:
+        """Добавить город из внешнего источника (если рядом ещё нет известного)."""
+        if self._learned >= CITY_INDEX_MAX_LEARNED or self.find_near(city.lat, city.lon):
+            return False
+        city_id = self._register(city)
+        for key in {normalize_city_name(name) for name in names if name}:
+            if key:
+                insort(self._learned_keys, (key, city_id))
+        self._learned += 1
+        return True
+
+    def search(self, prefix: str, limit: int = 10) -> list[City]:
+        key = normalize_city_name(prefix)
+        if not key:
+            return []
+        start = bisect_left(self._keys, key)
+        end = bisect_left(self._keys, key + "\uffff", lo=start)
+        city_ids = {self._city_ids[position] for position in range(start, end)}
+        start = bisect_left(self._learned_keys, (key,))
+        end = bisect_left(self._learned_keys, (key + "\uffff",), lo=start)
+        city_ids.update(city_id for _, city_id in self._learned_keys[start:end])
+        cities = [self._cities[city_id] for city_id in city_ids]
+        cities.sort(key=lambda city: (-city.population, city.name_ru or city.name_en))
+        return cities[:limit]
+
+
+def _load_countries(path: str) -> dict[str, tuple[str, str]]:
+    with open(path, encoding="utf-8", newline="") as f:
+        return {
+            row["code"]: (row["name_ru"], row["name_en"])
+            for row in csv.DictReader(f, delimiter="\t")
+        }
+
+
+def load_city_index(cities_path: str = CITIES_FILE, countries_path: str = COUNTRIES_FILE) -> CityIndex:
+    index = CityIndex()
+    try:
+        countries = _load_countries(countries_path)
+        entries = []
+        with open(cities_path, encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f, delimiter="\t"):
+                country_ru, country_en = countries.get(row["country"], ("", ""))
+                city = City(
+                    name_ru=row["name_ru"],
+                    name_en=row["name_en"],
+                    country=row["country"],
+                    country_name_ru=country_ru,
+                    country_name_en=country_en,
+                    admin1=row.get("admin1_ru") or "",
+                    lat=float(row["lat"]),
+                    lon=float(row["lon"]),
+                    population=int(row["population"] or 0),
+                )
+                alt_names = (row.get("alt_names") or "").split("|")
+                entries.append((city, [city.name_ru, city.name_en, *alt_names]))
+        index.build(entries)
+    except (OSError, KeyError, ValueError) as e:
+        print(f"City index load error: {e}")
+    return index
+
+
+CITY_INDEX = load_city_index()
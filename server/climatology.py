@@ -0,0 +1,165 @@
+import os
+import time
+from datetime import date
+from typing import Optional
+
+import numpy as np
+
+from memory_cache import LRUCache
+
+
+# Климатические нормы по дням года для ячейки сетки, посчитанные по нескольким годам архива.
+# Одна ячейка — один .npy-файл (366 x NORMAL_FIELDS, float32), открывается через mmap.
+CLIMATOLOGY_DIR = os.getenv("CLIMATOLOGY_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "climatology_cache"
+)
+CLIMATOLOGY_YEARS = int(os.getenv("CLIMATOLOGY_YEARS", "5"))
+# Нормы меняются медленно: ячейка ~11 км и пересчёт раз в год
+CLIMATOLOGY_COORD_PRECISION = 1
+CLIMATOLOGY_MAX_AGE_DAYS = 365
+# Окно сглаживания ±3 дня: 7 дней x 5 лет = 35 наблюдений на день года
+SMOOTHING_HALF_WINDOW = 3
+# Сколько открытых ячеек держать в памяти процесса (остальные снова читаются с диска)
+CLIMATOLOGY_MEMORY_CELLS = int(os.getenv("CLIMATOLOGY_MEMORY_CELLS", "2048"))
+# Осадки от 1 мм считаем «мокрым» днём
+WET_DAY_PRECIPITATION_MM = 1.0
+
+NORMAL_FIELDS = (
+    "temp_max",
+    "temp_min",
+    "precipitation_probability",
+    "weathercode",
+    "humidity",
+    "wind_speed",
+)
+_DAYS_IN_LEAP_YEAR = 366
+_MAX_WMO_CODE = 99
+
+_LOADED = LRUCache(CLIMATOLOGY_MEMORY_CELLS)
+
+
+def climate_cell(lat: float, lon: float) -> tuple[float, float]:
+    return round(float(lat), CLIMATOLOGY_COORD_PRECISION), round(float(lon), CLIMATOLOGY_COORD_PRECISION)
+
+
+def day_of_year_index(day: date) -> int:
+    """Индекс дня в високосном году, чтобы у 29 февраля был свой слот."""
+    return date(2000, day.month, day.day).timetuple().tm_yday - 1
+
+
+def archive_period(today: date) -> tuple[date, date]:
+    """Полные календарные годы архива, по которым считаются нормы."""
+    return date(today.year - CLIMATOLOGY_YEARS, 1, 1), date(today.year - 1, 12, 31)
+
+
+def _cell_path(cell: tuple[float, float]) -> str:
+    lat, lon = cell
+    return os.path.join(CLIMATOLOGY_DIR, f"{lat:+.{CLIMATOLOGY_COORD_PRECISION}f}_{lon:+.{CLIMATOLOGY_COORD_PRECISION}f}.npy")
+
+
+def load_normals(cell: tuple[float, float]) -> Optional[np.ndarray]:
+    max_age = CLIMATOLOGY_MAX_AGE_DAYS * 86400
+    normals = _LOADED.get(cell, ttl=max_age)
+    if normals is not None:
+        return normals
+    path = _cell_path(cell)
+    try:
+        modified_at = os.path.getmtime(path)
+        if time.time() - modified_at > max_age:
+            return None
+        normals = np.load(path, mmap_mode="r")
+    except (OSError, ValueError):
+        return None
+    if normals.shape != (_DAYS_IN_LEAP_YEAR, len(NORMAL_FIELDS)):
+        return None
+    # Возраст записи в памяти считаем от файла, чтобы устаревшие нормы не жили дольше года
+    _LOADED.put(cell, normals, stored_at=modified_at)
+    return normals
+
+
+def save_normals(cell: tuple[float, float], normals: np.ndarray) -> None:
+    try:
+        os.makedirs(CLIMATOLOGY_DIR, exist_ok=True)
+        path = _cell_path(cell)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, normals)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        print(f"Climatology write error for {cell}: {e}")
+    _LOADED.put(cell, normals)
+
+
+def _as_float_array(values: list) -> np.ndarray:
+    return np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+
+
+def _smoothed(per_day: np.ndarray) -> np.ndarray:
+    """Сумма по окну ±SMOOTHING_HALF_WINDOW дней с переходом через Новый год."""
+    return sum(np.roll(per_day, shift, axis=0) for shift in range(-SMOOTHING_HALF_WINDOW, SMOOTHING_HALF_WINDOW + 1))
+
+
+def _smoothed_mean(day_index: np.ndarray, values: np.ndarray) -> np.ndarray:
+    valid = ~np.isnan(values)
+    sums = np.bincount(day_index[valid], weights=values[valid], minlength=_DAYS_IN_LEAP_YEAR)
+    counts = np.bincount(day_index[valid], minlength=_DAYS_IN_LEAP_YEAR).astype(np.float64)
+    sums = _smoothed(sums)
+    counts = _smoothed(counts)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(counts > 0, sums / counts, np.nan)
+
+
+def compute_normals(daily: dict) -> Optional[np.ndarray]:
+    """Нормы по дням года из daily-ответа архива Open-Meteo за несколько лет."""
+    times = daily.get("time") or []
+    if not times:
+        return None
+    day_index = np.array(
+        [day_of_year_index(date.fromisoformat(t)) for t in times],
+        dtype=np.int64,
+    )
+    temp_max = _as_float_array(daily.get("temperature_2m_max") or [None] * len(times))
+    temp_min = _as_float_array(daily.get("temperature_2m_min") or [None] * len(times))
+    precipitation = _as_float_array(daily.get("precipitation_sum") or [None] * len(times))
+    humidity = _as_float_array(daily.get("relative_humidity_2m_mean") or [None] * len(times))
+    wind_speed = _as_float_array(daily.get("wind_speed_10m_max") or [None] * len(times))
+    codes = _as_float_array(daily.get("weathercode") or [None] * len(times))
+
+    wet_days = np.where(np.isnan(precipitation), np.nan, (precipitation >= WET_DAY_PRECIPITATION_MM).astype(np.float64))
+
+    # Преобладающий WMO-код — мода по окну
+    valid_codes = ~np.isnan(codes) & (codes >= 0) & (codes <= _MAX_WMO_CODE)
+    code_counts = np.zeros((_DAYS_IN_LEAP_YEAR, _MAX_WMO_CODE + 1), dtype=np.int64)
+    np.add.at(code_counts, (day_index[valid_codes], codes[valid_codes].astype(np.int64)), 1)
+    code_counts = _smoothed(code_counts)
+    dominant_code = np.where(code_counts.sum(axis=1) > 0, code_counts.argmax(axis=1), np.nan)
+
+    normals = np.column_stack([
+        _smoothed_mean(day_index, temp_max),
+        _smoothed_mean(day_index, temp_min),
+        _smoothed_mean(day_index, wet_days),
+        dominant_code,
+        _smoothed_mean(day_index, humidity),
+        _smoothed_mean(day_index, wind_speed),
+    ]).astype(np.float32)
+    if np.isnan(normals[:, :2]).any():
+        return None
+    return normals
+
+
+def _optional_round(value: float, digits: int = 1) -> Optional[float]:
+    return None if np.isnan(value) else round(float(value), digits)
+
+
+def normals_for_day(normals: np.ndarray, day: date) -> dict:
+    row = normals[day_of_year_index(day)]
+    temp_max, temp_min, precipitation_probability, weathercode, humidity, wind_speed = row
+    return {
+        "temp_max": round(float(temp_max), 1),
+        "temp_min": round(float(temp_min), 1),
+        "weathercode": None if np.isnan(weathercode) else int(weathercode),
+        "humidity": _optional_round(humidity),
+        "uv_index": None,
+        "wind_speed": _optional_round(wind_speed),
+        "precipitation_probability": _optional_round(precipitation_probability, 2),
+    }
@@ -1,6 +1,8 @@
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import case, func
+from sqlalchemy import Date, String, case, cast, delete, func, insert, or_, update
+from sqlalchemy import inspect as sa_inspect
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from sqlalchemy.orm import selectinload
 import models
 import schemas
@@ -103,6 +105,16 @@ async def get_user_by_id(db: AsyncSession, user_id: int):
     return result.scalar_one_or_none()
 
 
+async def get_users_by_ids(db: AsyncSession, user_ids: list[int]) -> list[models.User]:
+    """Получение пользователей по списку ID одним запросом"""
+    if not user_ids:
+        return []
+    result = await db.execute(
+        select(models.User).where(models.User.id.in_(user_ids))
+    )
+    return list(result.scalars().all())
+
+
 async def get_user_by_tg_id(db: AsyncSession, tg_id: str):
     """Получение пользователя по Telegram ID"""
     result = await db.execute(
@@ -244,6 +256,26 @@ async def get_followers(db: AsyncSession, user_id: int):
     result = await db.execute(stmt)
     return result.scalars().all()
 
+async def get_follow_counts(db: AsyncSession, user_id: int) -> tuple[int, int]:
+    """Число подписчиков и подписок одним запросом, без загрузки пользователей"""
+    table = models.followers_association
+    result = await db.execute(
+        select(
+            func.coalesce(func.sum(case((table.c.following_id == user_id, 1), else_=0)), 0),
+            func.coalesce(func.sum(case((table.c.follower_id == user_id, 1), else_=0)), 0),
+        ).where(or_(table.c.following_id == user_id, table.c.follower_id == user_id))
+    )
+    followers_count, following_count = result.one()
+    return int(followers_count), int(following_count)
+
+async def is_following(db: AsyncSession, follower_id: int, following_id: int) -> bool:
+    stmt = select(models.followers_association.c.follower_id).where(
+        models.followers_association.c.follower_id == follower_id,
+        models.followers_association.c.following_id == following_id
+    )
+    result = await db.execute(stmt)
+    return result.first() is not None
+
 async def get_following(db: AsyncSession, user_id: int):
     """Получить всех, на кого подписан user_id (подписки)"""
     stmt = (
@@ -356,6 +388,221 @@ async def cancel_follow_request(db: AsyncSession, from_user_id: int, to_user_id:
     return True
 
 
+# === Checklist Items CRUD ===
+# Вещи общего списка и рюкзаков — строки checklist_items, по одной на normalize_item_key.
+# Пишем их построчно: отметка или количество одной вещи — UPDATE одной строки, а не
+# перезапись всех списков. Повторы одной вещи («Паспорт» и «паспорт ») схлопываются
+# в одну строку — остаются первое написание и первая позиция. checked_items и
+# removed_items читаются в порядке items / added_items, а не в порядке отметок.
+
+ITEM_LIST_FIELDS = {"items": "position", "added_items": "added_position"}
+ITEM_FLAG_FIELDS = {"checked_items": "is_checked", "removed_items": "is_removed"}
+ITEM_QUANTITY_FIELDS = {"item_quantities": "quantity", "packed_quantities": "packed_quantity"}
+ITEM_FIELDS = (*ITEM_LIST_FIELDS, *ITEM_FLAG_FIELDS, *ITEM_QUANTITY_FIELDS)
+
+_EMPTY_ITEM_ROW = {
+    "position": None,
+    "added_position": None,
+    "is_checked": False,
+    "is_removed": False,
+    "quantity": None,
+    "packed_quantity": None,
+}
+
+
+def _item_owner_column(owner):
+    if isinstance(owner, models.UserBackpack):
+        return models.ChecklistItem.backpack_id
+    return models.ChecklistItem.checklist_id
+
+
+def _item_owner_values(owner) -> dict:
+    if isinstance(owner, models.UserBackpack):
+        return {"backpack_id": owner.id, "section": "backpack"}
+    return {"checklist_id": owner.id, "section": "checklist"}
+
+
+def _item_text(value) -> str:
+    return str(value).strip() if value is not None else ""
+
+
+async def insert_checklist_item(db: AsyncSession, owner, text: str, **fields):
+    await db.execute(
+        insert(models.ChecklistItem).values(
+            **_item_owner_values(owner),
+            item_key=models.normalize_item_key(_item_text(text)),
+            text=_item_text(text),
+            **{**_EMPTY_ITEM_ROW, **fields},
+        )
+    )
+
+
+async def update_checklist_item(db: AsyncSession, owner, item_key: str, **fields) -> int:
+    result = await db.execute(
+        update(models.ChecklistItem)
+        .where(_item_owner_column(owner) == owner.id, models.ChecklistItem.item_key == item_key)
+        .values(**fields)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+async def delete_checklist_item(db: AsyncSession, owner, item_key: str):
+    await db.execute(
+        delete(models.ChecklistItem)
+        .where(_item_owner_column(owner) == owner.id, models.ChecklistItem.item_key == item_key)
+        .execution_options(synchronize_session=False)
+    )
+
+
+def _item_rows_state(owner) -> dict[str, dict]:
+    return {
+        row.item_key: {"text": row.text, **{attr: getattr(row, attr) for attr in _EMPTY_ITEM_ROW}}
+        for row in owner.item_rows
+    }
+
+
+def _item_state_row(state: dict, key: str, text) -> dict:
+    return state.setdefault(key, {"text": _item_text(text), **_EMPTY_ITEM_ROW})
+
+
+def _apply_item_fields(state: dict, fields: dict) -> dict:
+    # Каждое переданное поле пересчитывается целиком, как раньше присваивание массива
+    for field, attr in ITEM_LIST_FIELDS.items():
+        if fields.get(field) is None:
+            continue
+        positions = {}
+        for text in fields[field]:
+            key = models.normalize_item_key(_item_text(text))
+            if not key or key in positions:
+                continue
+            positions[key] = len(positions)
+            row = _item_state_row(state, key, text)
+            if attr == "position":
+                # Отображаемый текст берём из основного списка
+                row["text"] = _item_text(text)
+        for key, row in state.items():
+            row[attr] = positions.get(key)
+
+    for field, attr in ITEM_FLAG_FIELDS.items():
+        if fields.get(field) is None:
+            continue
+        keys = set()
+        for text in fields[field]:
+            key = models.normalize_item_key(_item_text(text))
+            if key:
+                keys.add(key)
+                _item_state_row(state, key, text)
+        for key, row in state.items():
+            row[attr] = key in keys
+
+    for field, attr in ITEM_QUANTITY_FIELDS.items():
+        if fields.get(field) is None:
+            continue
+        quantities = {}
+        for text, value in fields[field].items():
+            try:
+                quantity = int(value)
+            except (TypeError, ValueError):
+                continue
+            key = models.normalize_item_key(_item_text(text))
+            if key:
+                quantities[key] = quantity
+                _item_state_row(state, key, text)
+        for key, row in state.items():
+            row[attr] = quantities.get(key)
+    return state
+
+
+def _is_empty_item(row: dict) -> bool:
+    return all(row[attr] == value for attr, value in _EMPTY_ITEM_ROW.items())
+
+
+async def _item_rows_changed(db: AsyncSession, owner):
+    attribute_names = ["item_rows"]
+    if isinstance(owner, models.UserBackpack):
+        # Строки вещей живут в своей таблице, onupdate рюкзака сам не сработает
+        await db.execute(
+            update(models.UserBackpack)
+            .where(models.UserBackpack.id == owner.id)
+            .values(updated_at=func.now())
+            .execution_options(synchronize_session=False)
+        )
+        attribute_names.append("updated_at")
+    for row in owner.item_rows:
+        db.expire(row)
+    await db.refresh(owner, attribute_names=attribute_names)
+
+
+async def save_checklist_items(db: AsyncSession, owner, **fields) -> bool:
+    """Привести вещи чеклиста или рюкзака к переданным спискам и картам.
+
+    Поля — те же items / checked_items / removed_items / added_items / item_quantities /
+    packed_quantities; не переданное (или None) поле не меняется. Пишутся только
+    изменившиеся строки. Не коммитит. Возвращает True, если что-то поменялось.
+    """
+    unknown = set(fields) - set(ITEM_FIELDS)
+    if unknown:
+        raise TypeError(f"Unknown checklist item fields: {', '.join(sorted(unknown))}")
+    if "item_rows" in sa_inspect(owner).unloaded:
+        await db.refresh(owner, attribute_names=["item_rows"])
+
+    before = _item_rows_state(owner)
+    after = _apply_item_fields({key: dict(row) for key, row in before.items()}, fields)
+
+    changed = False
+    for key, row in after.items():
+        current = before.get(key)
+        if _is_empty_item(row):
+            # Вещь, которой нет ни в одном списке и ни в одной карте, больше не нужна
+            if current is not None:
+                await delete_checklist_item(db, owner, key)
+                changed = True
+            continue
+        if current is None:
+            await insert_checklist_item(db, owner, **row)
+            changed = True
+            continue
+        values = {attr: value for attr, value in row.items() if current[attr] != value}
+        if values:
+            await update_checklist_item(db, owner, key, **values)
+            changed = True
+
+    if changed:
+        await _item_rows_changed(db, owner)
+    return changed
+
+
+def next_item_position(owner) -> int:
+    # После удаления в позициях бывают дыры — новую вещь ставим за последней
+    return max((row.position for row in owner.item_rows if row.position is not None), default=-1) + 1
+
+
+async def remove_checklist_item(db: AsyncSession, owner, text: str) -> bool:
+    """Убрать вещь из items вместе с отметками и количествами; added_items не трогаем. Не коммитит."""
+    item_key = models.normalize_item_key(_item_text(text))
+    row = next((row for row in owner.item_rows if row.item_key == item_key), None)
+    if row is None:
+        return False
+    if row.added_position is None:
+        await delete_checklist_item(db, owner, item_key)
+    else:
+        await update_checklist_item(db, owner, item_key, **{**_EMPTY_ITEM_ROW, "added_position": row.added_position})
+    await _item_rows_changed(db, owner)
+    return True
+
+
+async def set_checklist_item(db: AsyncSession, owner, text: str, **fields) -> bool:
+    """Поменять одну вещь (отметка, количество) — UPDATE её строки или INSERT новой. Не коммитит."""
+    item_key = models.normalize_item_key(_item_text(text))
+    if not item_key:
+        return False
+    if not await update_checklist_item(db, owner, item_key, **fields):
+        await insert_checklist_item(db, owner, text, **fields)
+    await _item_rows_changed(db, owner)
+    return True
+
+
 # === Checklist CRUD ===
 
 async def create_checklist(db: AsyncSession, data: schemas.ChecklistCreate):
@@ -366,21 +613,28 @@ async def create_checklist(db: AsyncSession, data: schemas.ChecklistCreate):
         city=data.city,
         start_date=data.start_date,
         end_date=data.end_date,
-        items=data.items,
         avg_temp=data.avg_temp,
         conditions=data.conditions,
         tg_user_id=data.tg_user_id,
-        checked_items=data.checked_items,
-        removed_items=data.removed_items,
-        added_items=data.added_items,
-        item_quantities=data.item_quantities or {},
-        packed_quantities=data.packed_quantities or {},
         daily_forecast=[f.model_dump(mode='json') if hasattr(f, 'model_dump') else f for f in data.daily_forecast] if data.daily_forecast else None,
+        forecast_updated_at=func.now() if data.daily_forecast else None,
         user_id=data.user_id,
         origin_city=data.origin_city,
         transports=data.transports,
+        item_rows=[],
     )
     db.add(checklist)
+    await db.flush()
+    await save_checklist_items(
+        db,
+        checklist,
+        items=data.items,
+        checked_items=data.checked_items,
+        removed_items=data.removed_items,
+        added_items=data.added_items,
+        item_quantities=data.item_quantities or {},
+        packed_quantities=data.packed_quantities or {},
+    )
     await db.commit()
     await db.refresh(checklist)
     return checklist
@@ -400,6 +654,93 @@ async def get_checklist_by_slug(db: AsyncSession, slug: str):
     return result.scalar_one_or_none()
 
 
+def _checklist_forecast_missing():
+    # None в JSON-колонке сохраняется как JSON null, а у старых строк — SQL NULL;
+    # пустой список get_checklist тоже считает отсутствующим прогнозом
+    return or_(
+        models.Checklist.daily_forecast.is_(None),
+        cast(models.Checklist.daily_forecast, String).in_(("null", "[]")),
+    )
+
+
+async def get_checklists_missing_forecast(db: AsyncSession, after_id: int = 0, limit: int = 200):
+    """Чеклисты без сохранённого прогноза (постранично по id)"""
+    result = await db.execute(
+        select(
+            models.Checklist.id,
+            models.Checklist.city,
+            models.Checklist.start_date,
+            models.Checklist.end_date,
+        )
+        .where(models.Checklist.id > after_id, _checklist_forecast_missing())
+        .order_by(models.Checklist.id)
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def get_checklists_in_forecast_window(
+    db: AsyncSession,
+    today,
+    horizon_end,
+    stale_before,
+    after_id: int = 0,
+    limit: int = 200,
+):
+    """Ещё не закончившиеся поездки в окне прогноза, которым нужен свежий прогноз.
+
+    Берутся поездки, у которых прогноз старше stale_before, и те, в которых с прошлого
+    обновления в окно вошли новые дни (окно тогда кончалось раньше, чем сейчас кончается поездка).
+    """
+    horizon_days = (horizon_end - today).days
+    result = await db.execute(
+        select(
+            models.Checklist.id,
+            models.Checklist.city,
+            models.Checklist.start_date,
+            models.Checklist.end_date,
+            models.Checklist.daily_forecast,
+            models.Checklist.conditions,
+        )
+        .where(
+            models.Checklist.id > after_id,
+            models.Checklist.start_date <= horizon_end,
+            models.Checklist.end_date >= today,
+            or_(
+                models.Checklist.forecast_updated_at.is_(None),
+                models.Checklist.forecast_updated_at < stale_before,
+                cast(models.Checklist.forecast_updated_at, Date) + horizon_days
+                < func.least(models.Checklist.end_date, horizon_end),
+            ),
+        )
+        .order_by(models.Checklist.id)
+        .limit(limit)
+    )
+    return result.all()
+
+
+async def save_checklist_weather(db: AsyncSession, updates: dict[int, dict]):
+    """Обновить daily_forecast/avg_temp/conditions нескольким чеклистам одной транзакцией"""
+    for checklist_id, values in updates.items():
+        await db.execute(
+            update(models.Checklist)
+            .where(models.Checklist.id == checklist_id)
+            .values(**values, forecast_updated_at=func.now())
+        )
+    await db.commit()
+
+
+async def save_checklist_forecasts(db: AsyncSession, forecasts: dict[int, list[dict]]):
+    """Записать daily_forecast нескольким чеклистам одной транзакцией"""
+    for checklist_id, forecast in forecasts.items():
+        await db.execute(
+            update(models.Checklist)
+            .where(models.Checklist.id == checklist_id)
+            .values(daily_forecast=forecast, forecast_updated_at=func.now())
+        )
+    await db.commit()
+
+
 async def search_users_by_username(db: AsyncSession, query: str, limit: int = 8):
     cleaned_query = (query or "").strip()
     if not cleaned_query:
@@ -465,6 +806,21 @@ async def get_checklists_by_user_id(db: AsyncSession, user_id: int):
     return result.scalars().all()
 
 
+async def get_all_checklists_for_user(db: AsyncSession, user_id: int):
+    """Собственные чеклисты и те, где у пользователя есть рюкзак, — одним запросом"""
+    shared_ids = select(models.UserBackpack.checklist_id).where(models.UserBackpack.user_id == user_id)
+    result = await db.execute(
+        select(models.Checklist)
+        .options(
+            selectinload(models.Checklist.backpacks),
+            selectinload(models.Checklist.reviews),
+        )
+        .where(or_(models.Checklist.user_id == user_id, models.Checklist.id.in_(shared_ids)))
+        .order_by(models.Checklist.id.desc())
+    )
+    return result.scalars().all()
+
+
 async def get_shared_checklists_by_user_id(db: AsyncSession, user_id: int):
     """Получение чеклистов, в которых пользователь является коллаборатором (имеет рюкзак)"""
     result = await db.execute(
@@ -501,19 +857,17 @@ async def update_checklist_state(
     checklist = result.scalar_one_or_none()
     if not checklist:
         return None
-    if checked_items is not None:
-        checklist.checked_items = checked_items
-    if removed_items is not None:
-        checklist.removed_items = removed_items
-    if added_items is not None:
-        checklist.added_items = added_items
-    if items is not None:
-        checklist.items = items
-    if item_quantities is not None:
-        checklist.item_quantities = item_quantities
-    if packed_quantities is not None:
-        checklist.packed_quantities = packed_quantities
-    await db.commit()
+    await save_checklist_items(
+        db,
+        checklist,
+        items=items,
+        checked_items=checked_items,
+        removed_items=removed_items,
+        added_items=added_items,
+        item_quantities=item_quantities,
+        packed_quantities=packed_quantities,
+    )
+    await db.commit()
     await db.refresh(checklist)
     return checklist
 
@@ -530,7 +884,8 @@ async def get_trip_review_by_user_and_checklist(db: AsyncSession, user_id: int,
 async def get_trip_reviews_by_user_id(db: AsyncSession, user_id: int, public_only: bool = False):
     stmt = (
         select(models.TripReview)
-        .options(selectinload(models.TripReview.checklist))
+        # Для карточки отзыва нужны только поля чеклиста, не его рюкзаки и события
+        .options(selectinload(models.TripReview.checklist).lazyload("*"))
         .join(models.Checklist, models.Checklist.id == models.TripReview.checklist_id)
         .where(models.TripReview.user_id == user_id)
         .order_by(models.TripReview.created_at.desc())
@@ -549,25 +904,321 @@ async def get_city_attractions(db: AsyncSession, city_name: str):
     )
     return result.scalar_one_or_none()
 
-async def save_city_attractions(db: AsyncSession, city_name: str, data: list):
-    """Сохранение/обновление достопримечательностей города"""
+async def save_city_attractions(db: AsyncSession, city_name: str, place_ids: list[int], needs_refresh: bool = False):
+    """Сохранение/обновление достопримечательностей города (упорядоченные id мест)"""
     normalized_name = city_name.strip().lower()
     existing = await get_city_attractions(db, normalized_name)
     if existing:
-        existing.data = data
+        existing.place_ids = place_ids
+        existing.needs_refresh = needs_refresh
+        # Свежесть записи = время последней сборки, даже если список не изменился
+        existing.updated_at = func.now()
         await db.commit()
         await db.refresh(existing)
         return existing
     
     new_attraction = models.CityAttraction(
         city_name=normalized_name,
-        data=data
+        place_ids=place_ids,
+        needs_refresh=needs_refresh,
     )
     db.add(new_attraction)
     await db.commit()
     await db.refresh(new_attraction)
     return new_attraction
 
+
+async def get_attraction_places_by_ids(db: AsyncSession, place_ids: list[int]) -> dict[int, models.AttractionPlace]:
+    if not place_ids:
+        return {}
+    result = await db.execute(
+        select(models.AttractionPlace).where(models.AttractionPlace.id.in_(place_ids))
+    )
+    return {place.id: place for place in result.scalars().all()}
+
+
+async def get_attraction_places(db: AsyncSession, city_name: str, links: list[str]):
+    """Известные места города плюс места с указанными ссылками (оба поиска по индексу)"""
+    conditions = [models.AttractionPlace.city_name == city_name.strip().lower()]
+    if links:
+        conditions.append(models.AttractionPlace.link.in_(links))
+    result = await db.execute(select(models.AttractionPlace).where(or_(*conditions)))
+    return result.scalars().all()
+
+
+async def upsert_attraction_places(db: AsyncSession, city_name: str, lang: str, places: list[dict]) -> dict[str, int]:
+    """Upsert мест по link: название добавляется под язык, пустые поля не затирают известные.
+
+    places — словари link, cid, name, image, photo_ref, rating. Возвращает link -> id.
+    """
+    by_link = {}
+    for place in places:
+        by_link.setdefault(place["link"], place)
+    if not by_link:
+        return {}
+
+    stmt = pg_insert(models.AttractionPlace).values([
+        {
+            "link": link,
+            "cid": place.get("cid") or None,
+            "city_name": city_name.strip().lower(),
+            "names": {lang: place["name"]},
+            "image": place.get("image") or None,
+            "photo_ref": place.get("photo_ref") or None,
+            "rating": place.get("rating"),
+        }
+        for link, place in by_link.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.AttractionPlace.link],
+        set_={
+            "names": models.AttractionPlace.names.op("||")(stmt.excluded.names),
+            "cid": func.coalesce(stmt.excluded.cid, models.AttractionPlace.cid),
+            "image": func.coalesce(stmt.excluded.image, models.AttractionPlace.image),
+            "photo_ref": func.coalesce(stmt.excluded.photo_ref, models.AttractionPlace.photo_ref),
+            "rating": func.coalesce(stmt.excluded.rating, models.AttractionPlace.rating),
+            "updated_at": func.now(),
+        },
+    ).returning(models.AttractionPlace.id, models.AttractionPlace.link)
+    result = await db.execute(stmt)
+    return {link: place_id for place_id, link in result.all()}
+
+# === Attraction Name Localization CRUD ===
+
+async def get_name_localizations(
+    db: AsyncSession,
+    lang: str,
+    city_name: str,
+    names: list[str],
+    negative_fresh_after=None,
+) -> dict[str, str]:
+    """Известные локализации (в т.ч. пустые — «не найдено») для списка названий: name -> localized
+
+    Пустые записи старше negative_fresh_after не возвращаются — их можно поискать снова.
+    """
+    keys = {name.casefold(): name for name in names}
+    if not keys:
+        return {}
+    conditions = [
+        models.AttractionNameLocalization.lang == lang,
+        models.AttractionNameLocalization.city_name == city_name.casefold(),
+        models.AttractionNameLocalization.source_name.in_(list(keys)),
+    ]
+    if negative_fresh_after is not None:
+        conditions.append(or_(
+            models.AttractionNameLocalization.localized_name != "",
+            models.AttractionNameLocalization.updated_at >= negative_fresh_after,
+        ))
+    result = await db.execute(
+        select(
+            models.AttractionNameLocalization.source_name,
+            models.AttractionNameLocalization.localized_name,
+        ).where(*conditions)
+    )
+    return {keys[source_name]: localized_name for source_name, localized_name in result.all()}
+
+
+async def save_name_localizations(db: AsyncSession, lang: str, city_name: str, localized: dict[str, str]):
+    rows = {
+        name.casefold(): {
+            "lang": lang,
+            "city_name": city_name.casefold(),
+            "source_name": name.casefold(),
+            "localized_name": localized_name or "",
+        }
+        for name, localized_name in localized.items()
+    }
+    if not rows:
+        return
+    stmt = pg_insert(models.AttractionNameLocalization).values(list(rows.values()))
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_attraction_name_localizations_key",
+        set_={"localized_name": stmt.excluded.localized_name, "updated_at": func.now()},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+# === Hotel Cache CRUD ===
+
+async def get_hotel_location(db: AsyncSession, query: str):
+    result = await db.execute(
+        select(models.HotelLocation.location_id).where(models.HotelLocation.query == query)
+    )
+    return result.scalar_one_or_none()
+
+
+async def save_hotel_location(db: AsyncSession, query: str, location_id: str, label: str = ""):
+    stmt = pg_insert(models.HotelLocation).values(query=query, location_id=location_id, label=label)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.HotelLocation.query],
+        set_={"location_id": stmt.excluded.location_id, "label": stmt.excluded.label},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+async def get_hotel_search(db: AsyncSession, location_id: str, check_in, check_out, fresh_after=None):
+    """Сохранённый ответ провайдера; fresh_after=None — любой давности."""
+    query = select(models.HotelSearch).where(
+        models.HotelSearch.location_id == location_id,
+        models.HotelSearch.check_in == check_in,
+        models.HotelSearch.check_out == check_out,
+    )
+    if fresh_after is not None:
+        query = query.where(models.HotelSearch.fetched_at >= fresh_after)
+    result = await db.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def save_hotel_search(db: AsyncSession, location_id: str, check_in, check_out, results: list):
+    stmt = pg_insert(models.HotelSearch).values(
+        location_id=location_id, check_in=check_in, check_out=check_out, results=results
+    )
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_hotel_searches_location_dates",
+        set_={"results": stmt.excluded.results, "fetched_at": func.now()},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+# === IATA Codes CRUD ===
+
+async def get_iata_code(db: AsyncSession, query: str):
+    result = await db.execute(select(models.IataCode.code).where(models.IataCode.query == query))
+    return result.scalar_one_or_none()
+
+
+async def save_iata_code(db: AsyncSession, query: str, code: str):
+    stmt = pg_insert(models.IataCode).values(query=query, code=code)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.IataCode.query],
+        set_={"code": stmt.excluded.code},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+# === Exchange Rates CRUD ===
+
+async def get_exchange_rate_snapshot(db: AsyncSession, base: str):
+    result = await db.execute(
+        select(models.ExchangeRateSnapshot).where(models.ExchangeRateSnapshot.base == base)
+    )
+    return result.scalar_one_or_none()
+
+
+async def save_exchange_rate_snapshot(db: AsyncSession, base: str, rates: dict):
+    stmt = pg_insert(models.ExchangeRateSnapshot).values(base=base, rates=rates)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.ExchangeRateSnapshot.base],
+        set_={"rates": stmt.excluded.rates, "fetched_at": func.now()},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+# === Job Runs CRUD ===
+
+async def get_job_last_run(db: AsyncSession, name: str):
+    result = await db.execute(select(models.JobRun.finished_at).where(models.JobRun.name == name))
+    return result.scalar_one_or_none()
+
+
+async def save_job_run(db: AsyncSession, name: str):
+    stmt = pg_insert(models.JobRun).values(name=name)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[models.JobRun.name],
+        set_={"finished_at": func.now()},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+
+# === API Usage CRUD ===
+
+async def increment_api_usage(db: AsyncSession, provider: str, period: str, calls: int = 1) -> int:
+    """Атомарно прибавить calls к счётчику провайдера за период; возвращает новое значение"""
+    stmt = pg_insert(models.ApiUsage).values(provider=provider, period=period, calls=calls)
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_api_usage_provider_period",
+        set_={"calls": models.ApiUsage.calls + stmt.excluded.calls, "updated_at": func.now()},
+    ).returning(models.ApiUsage.calls)
+    result = await db.execute(stmt)
+    await db.commit()
+    return result.scalar_one()
+
+
+async def get_api_usage(db: AsyncSession, provider: str, period: str) -> int:
+    result = await db.execute(
+        select(models.ApiUsage.calls).where(
+            models.ApiUsage.provider == provider,
+            models.ApiUsage.period == period,
+        )
+    )
+    return result.scalar_one_or_none() or 0
+
+# === Geocode Cache CRUD ===
+
+async def get_geocode_cache(db: AsyncSession, query: str, language: str):
+    result = await db.execute(
+        select(models.GeocodeCache).where(
+            models.GeocodeCache.query == query,
+            models.GeocodeCache.language == language,
+        )
+    )
+    return result.scalar_one_or_none()
+
+
+async def save_geocode_cache(db: AsyncSession, query: str, language: str, data: dict):
+    """Upsert: параллельные запросы одного города не должны падать на уникальном индексе"""
+    values = {
+        "lat": data["lat"],
+        "lon": data["lon"],
+        "country_code": data.get("country_code"),
+        "display_name": data.get("display_name"),
+        "address": data.get("address"),
+        "updated_at": func.now(),
+    }
+    stmt = pg_insert(models.GeocodeCache).values(query=query, language=language, **values)
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_geocode_cache_query_language",
+        set_=values,
+    )
+    await db.execute(stmt)
+    await db.commit()
+
+# === Weather Cache CRUD ===
+
+async def get_weather_days(db: AsyncSession, lat: float, lon: float, source: str, start_date, end_date):
+    result = await db.execute(
+        select(models.WeatherDay).where(
+            models.WeatherDay.lat_idx == models.weather_grid_index(lat),
+            models.WeatherDay.lon_idx == models.weather_grid_index(lon),
+            models.WeatherDay.source == source,
+            models.WeatherDay.day >= start_date,
+            models.WeatherDay.day <= end_date,
+        )
+    )
+    return result.scalars().all()
+
+
+async def save_weather_days(db: AsyncSession, lat: float, lon: float, source: str, days: dict):
+    """days: date -> payload. Перезаписывает уже закэшированные дни (обновлённый прогноз)"""
+    if not days:
+        return
+    lat_idx, lon_idx = models.weather_grid_index(lat), models.weather_grid_index(lon)
+    stmt = pg_insert(models.WeatherDay).values([
+        {"lat_idx": lat_idx, "lon_idx": lon_idx, "source": source, "day": day, "data": data, "fetched_at": func.now()}
+        for day, data in days.items()
+    ])
+    stmt = stmt.on_conflict_do_update(
+        constraint="uq_weather_days_point_source_day",
+        set_={"data": stmt.excluded.data, "fetched_at": func.now()},
+    )
+    await db.execute(stmt)
+    await db.commit()
+
 # === Itinerary Events CRUD ===
 
 async def create_itinerary_event(db: AsyncSession, checklist_id: int, data: schemas.ItineraryEventCreate):
@@ -700,15 +1351,12 @@ async def create_user_backpack(
         kind=normalized_kind,
         sort_order=max_sort_order + 1,
         is_default=should_be_default,
-        editor_user_ids=shared_editor_ids,
-        items=initial_items,
-        checked_items=[],
-        added_items=[],
-        removed_items=[],
-        item_quantities=initial_quantities,
-        packed_quantities={},
-    )
+        editor_user_ids=shared_editor_ids,
+        item_rows=[],
+    )
     db.add(new_backpack)
+    await db.flush()
+    await save_checklist_items(db, new_backpack, items=initial_items, item_quantities=initial_quantities)
     await db.commit()
     await db.refresh(new_backpack)
     return new_backpack
@@ -736,13 +1384,15 @@ async def update_backpack_items(db: AsyncSession, backpack_id: int, data: schema
     if not backpack:
         return None
 
-    update_data = data.model_dump(exclude_unset=True)
-    for key, value in update_data.items():
-        if value is None:
-            continue
-        setattr(backpack, key, value)
-        
-    await db.commit()
+    update_data = data.model_dump(exclude_unset=True)
+    item_fields = {key: update_data.pop(key) for key in ITEM_FIELDS if key in update_data}
+    for key, value in update_data.items():
+        if value is None:
+            continue
+        setattr(backpack, key, value)
+    await save_checklist_items(db, backpack, **item_fields)
+
+    await db.commit()
     await db.refresh(backpack)
     return backpack
 
@@ -818,11 +1468,14 @@ async def generate_checklist_invite_token(db: AsyncSession, checklist_slug: str)
     checklist = await get_checklist_by_slug(db, checklist_slug)
     if not checklist:
         return None
+    return await ensure_checklist_invite_token(db, checklist)
+
+async def ensure_checklist_invite_token(db: AsyncSession, checklist: models.Checklist) -> str:
+    """Токен для уже загруженного чеклиста — без повторной загрузки по slug"""
     if not checklist.invite_token:
         # Generate short unique token
         checklist.invite_token = str(uuid.uuid4())[:8]
         await db.commit()
-        await db.refresh(checklist)
     return checklist.invite_token
 
 async def get_checklist_by_invite_token(db: AsyncSession, token: str):
@@ -9,6 +9,9 @@ from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
 from sqlalchemy import create_engine
 from sqlalchemy.orm import DeclarativeBase
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import NullPool
+
+from db_instrumentation import instrument_engine
 
 class Base(DeclarativeBase):
     pass
@@ -17,8 +20,17 @@ DATABASE_URL = os.getenv("DATABASE_URL")
 if not DATABASE_URL:
     raise Exception("DATABASE_URL is not set!")
 
+# Печать каждого SQL в stdout — только для отладки; счётчики запросов см. db_instrumentation.py
+SQL_ECHO = os.getenv("SQL_ECHO", "false").lower() == "true"
+
 # Асинхронный движок для приложения
-async_engine = create_async_engine(DATABASE_URL, echo=True)
+async_engine = create_async_engine(DATABASE_URL, echo=SQL_ECHO)
+instrument_engine(async_engine.sync_engine)
+
+# Отдельный движок без пула для advisory lock'ов (single_flight.py): лидер держит блокировку,
+# пока ходит во внешние API и открывает свои сессии, и не должен занимать соединение пула
+lock_engine = create_async_engine(DATABASE_URL, echo=SQL_ECHO, poolclass=NullPool)
+instrument_engine(lock_engine.sync_engine)
 
 # Синхронный движок для Alembic
 if DATABASE_URL.startswith("postgresql+asyncpg"):
@@ -26,7 +38,7 @@ if DATABASE_URL.startswith("postgresql+asyncpg"):
 else:
     SYNC_DATABASE_URL = DATABASE_URL
 
-sync_engine = create_engine(SYNC_DATABASE_URL, echo=True)
+sync_engine = create_engine(SYNC_DATABASE_URL, echo=SQL_ECHO)
 
 SessionLocal = sessionmaker(
     autocommit=False,
@@ -36,6 +48,24 @@ SessionLocal = sessionmaker(
     expire_on_commit=False,
 )
 
+# Реплика для тяжёлых чтений (get_read_db в read_replica.py). Без DATABASE_REPLICA_URL всё идёт
+# в основную базу; тот же URL, что и DATABASE_URL, включает маршрутизацию на одном инстансе.
+DATABASE_REPLICA_URL = os.getenv("DATABASE_REPLICA_URL", "").strip()
+REPLICA_ENABLED = bool(DATABASE_REPLICA_URL)
+if REPLICA_ENABLED:
+    replica_engine = create_async_engine(DATABASE_REPLICA_URL, echo=SQL_ECHO)
+    instrument_engine(replica_engine.sync_engine)
+else:
+    replica_engine = async_engine
+
+ReadSessionLocal = sessionmaker(
+    autocommit=False,
+    autoflush=False,
+    bind=replica_engine,
+    class_=AsyncSession,
+    expire_on_commit=False,
+)
+
 from fastapi import HTTPException
 
 async def get_db():
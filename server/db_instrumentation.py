@@ -0,0 +1,159 @@
+import asyncio
+import contextvars
+import json
+import os
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Iterator, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Счётчики запросов к БД на HTTP-запрос: число statement'ов, суммарное время и
+# повторяющиеся «формы» запросов (кандидаты в N+1). Считает listener на движке,
+# состояние запроса живёт в contextvar, поэтому параллельные запросы не смешиваются.
+DB_QUERY_LOG = os.getenv("DB_QUERY_LOG", "false").lower() == "true"
+# Столько одинаковых statement'ов за один HTTP-запрос — уже подозрение на N+1
+DB_N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "5"))
+
+_PLACEHOLDER_RE = re.compile(r"\$\d+|%\(\w+\)s|\?")
+_PLACEHOLDER_LIST_RE = re.compile(r"\?(?:\s*,\s*\?)+")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@dataclass
+class QueryStats:
+    count: int = 0
+    total_seconds: float = 0.0
+    shapes: Counter = field(default_factory=Counter)
+
+    def n_plus_one_suspects(self, threshold: int = DB_N_PLUS_ONE_THRESHOLD) -> list[tuple[str, int]]:
+        return [(shape, count) for shape, count in self.shapes.most_common() if count >= threshold]
+
+    def server_timing(self) -> str:
+        return f'db;dur={self.total_seconds * 1000:.1f};desc="{self.count} queries"'
+
+
+_CURRENT: ContextVar[Optional[QueryStats]] = ContextVar("db_query_stats", default=None)
+
+
+def create_untracked_task(coro) -> asyncio.Task:
+    """asyncio.create_task без счётчиков текущего HTTP-запроса.
+
+    Задача получает копию contextvars на момент создания: фоновая работа (общая для
+    нескольких запросов сборка, прогрев кэша) иначе записывалась бы на счёт запроса,
+    который её случайно запустил, — в том числе уже после его завершения.
+    """
+    context = contextvars.copy_context()
+    context.run(_CURRENT.set, None)
+    return asyncio.create_task(coro, context=context)
+
+
+def statement_shape(statement: str) -> str:
+    """SQL без значений: IN (…) с любым числом параметров даёт одну и ту же форму."""
+    shape = _PLACEHOLDER_RE.sub("?", statement)
+    shape = _PLACEHOLDER_LIST_RE.sub("?", shape)
+    return _WHITESPACE_RE.sub(" ", shape).strip()
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _CURRENT.get() is not None:
+        conn.info.setdefault("query_started_at", []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _CURRENT.get()
+    started = conn.info.get("query_started_at")
+    if stats is None or not started:
+        return
+    stats.count += 1
+    stats.total_seconds += time.perf_counter() - started.pop()
+    stats.shapes[statement_shape(statement)] += 1
+
+
+def instrument_engine(engine: Engine) -> None:
+    """Подключить счётчики к движку (для AsyncEngine передавать async_engine.sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+    event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+@contextmanager
+def track_queries() -> Iterator[QueryStats]:
+    """Считать запросы внутри блока (вложенный блок считает отдельно)."""
+    stats = QueryStats()
+    token = _CURRENT.set(stats)
+    try:
+        yield stats
+    finally:
+        _CURRENT.reset(token)
+
+
+@contextmanager
+def assert_query_budget(max_queries: int, allow_n_plus_one: bool = False) -> Iterator[QueryStats]:
+    """Для тестов и скриптов: блок должен уложиться в max_queries запросов и не иметь N+1.
+
+        with assert_query_budget(4):
+            await get_public_profile("alice", db, None)
+    """
+    with track_queries() as stats:
+        yield stats
+    problems = []
+    if stats.count > max_queries:
+        problems.append(f"{stats.count} queries, budget is {max_queries}")
+    if not allow_n_plus_one:
+        problems.extend(f"N+1 suspect ({count}x): {shape}" for shape, count in stats.n_plus_one_suspects())
+    if problems:
+        raise AssertionError("Query budget exceeded:\n" + "\n".join(problems))
+
+
+def log_request_stats(method: str, path: str, status_code: int, stats: QueryStats) -> None:
+    suspects = stats.n_plus_one_suspects()
+    if not suspects and not (DB_QUERY_LOG and stats.count):
+        return
+    print(json.dumps({
+        "event": "db_queries",
+        "method": method,
+        "path": path,
+        "status": status_code,
+        "queries": stats.count,
+        "db_ms": round(stats.total_seconds * 1000, 1),
+        "n_plus_one": [{"count": count, "statement": shape[:300]} for shape, count in suspects],
+    }, ensure_ascii=False))
+
+
+class QueryStatsMiddleware:
+    """ASGI middleware: Server-Timing с числом запросов и временем БД + лог по запросу.
+
+    Заголовок уходит вместе с началом ответа, поэтому у потоковых ответов (SSE) в нём
+    только запросы до первого байта; в лог попадает итог за весь запрос.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_timing(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", stats.server_timing().encode("latin-1")))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        with track_queries() as stats:
+            try:
+                await self.app(scope, receive, send_with_timing)
+            finally:
+                log_request_stats(scope.get("method", ""), scope.get("path", ""), status_code, stats)
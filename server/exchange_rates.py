@@ -0,0 +1,163 @@
+import asyncio
+import os
+import time
+from typing import Optional, Sequence
+
+import numpy as np
+
+import crud
+from database import SessionLocal
+from db_instrumentation import create_untracked_task
+from http_clients import get_http_client
+
+
+# Курсы к рублю (бесплатный open.er-api.com, без ключа). Обновляются в фоне заранее,
+# до истечения TTL; запрос пользователя получает текущий снимок и никогда не ждёт
+# провайдера, если хоть какие-то курсы есть (в памяти или в exchange_rate_snapshots).
+EXCHANGE_RATES_URL = "https://open.er-api.com/v6/latest/RUB"
+EXCHANGE_RATES_BASE = "RUB"
+EXCHANGE_RATES_TTL = int(os.getenv("EXCHANGE_RATES_TTL_SECONDS", "86400"))  # 24 часа
+# Фоновое обновление стартует, когда снимок прожил эту долю TTL
+EXCHANGE_RATES_REFRESH_AHEAD_RATIO = 0.8
+EXCHANGE_RATES_RETRY_SECONDS = 300
+# Холодный старт без снимка: сколько запрос готов ждать общий запрос к провайдеру
+EXCHANGE_RATES_COLD_WAIT_SECONDS = 5.0
+
+
+class ExchangeRateService:
+    """Снимок курсов «валюта -> рублей за единицу».
+
+    Снимок не мутируется, а заменяется целиком. Обновление — одна задача на процесс
+    (single-flight): сколько бы поисков отелей ни пришло на границе TTL, к провайдеру
+    уйдёт один запрос, а они получат предыдущий снимок.
+    """
+
+    def __init__(self):
+        self._rates: dict[str, float] = {}
+        self._fetched_at = 0.0
+        self._snapshot_loaded = False
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._counters = {
+            "refreshes": 0,
+            "refresh_errors": 0,
+            "stale_served": 0,
+            "cold_waits": 0,
+        }
+
+    def _age(self) -> float:
+        return time.time() - self._fetched_at
+
+    async def _load_snapshot(self) -> None:
+        self._snapshot_loaded = True
+        try:
+            async with SessionLocal() as session:
+                row = await crud.get_exchange_rate_snapshot(session, EXCHANGE_RATES_BASE)
+        except Exception as e:
+            print(f"Exchange rates snapshot read error: {e}")
+            return
+        if row and row.rates and not self._rates:
+            self._rates = dict(row.rates)
+            self._fetched_at = row.fetched_at.timestamp()
+
+    async def _fetch(self) -> bool:
+        try:
+            client = get_http_client("exchange_rates")
+            resp = await client.get(EXCHANGE_RATES_URL)
+            if resp.status_code != 200:
+                raise RuntimeError(f"HTTP {resp.status_code}")
+            rates = resp.json().get("rates", {})
+        except Exception as e:
+            self._counters["refresh_errors"] += 1
+            print(f"Exchange rates error: {e}")
+            return False
+
+        # rates содержит: сколько единиц валюты в 1 RUB
+        # Нам нужно наоборот: сколько RUB в 1 единице валюты
+        snapshot = {cur: 1.0 / rate for cur, rate in rates.items() if rate and rate > 0}
+        if not snapshot:
+            self._counters["refresh_errors"] += 1
+            return False
+        self._rates = snapshot
+        self._fetched_at = time.time()
+        self._counters["refreshes"] += 1
+        print(f"Exchange rates updated: EUR={snapshot.get('EUR', 0):.1f}₽, USD={snapshot.get('USD', 0):.1f}₽")
+        try:
+            async with SessionLocal() as session:
+                await crud.save_exchange_rate_snapshot(session, EXCHANGE_RATES_BASE, snapshot)
+        except Exception as e:
+            print(f"Exchange rates snapshot save error: {e}")
+        return True
+
+    def refresh(self) -> asyncio.Task:
+        """Запустить обновление, если оно ещё не идёт; возвращает общую задачу."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = create_untracked_task(self._fetch())
+        return self._refresh_task
+
+    async def rates(self) -> dict[str, float]:
+        if not self._rates and not self._snapshot_loaded:
+            await self._load_snapshot()
+        if self._rates:
+            if self._age() >= EXCHANGE_RATES_TTL:
+                self._counters["stale_served"] += 1
+                self.refresh()
+            return self._rates
+
+        self._counters["cold_waits"] += 1
+        try:
+            await asyncio.wait_for(asyncio.shield(self.refresh()), EXCHANGE_RATES_COLD_WAIT_SECONDS)
+        except asyncio.TimeoutError:
+            pass
+        return self._rates
+
+    async def get_rub_rate(self, currency: str) -> float:
+        if currency == EXCHANGE_RATES_BASE:
+            return 1.0
+        return (await self.rates()).get(currency, 0)
+
+    async def convert_many(
+        self,
+        amounts: Sequence[Optional[float]],
+        currencies: Sequence[Optional[str]],
+    ) -> list[Optional[int]]:
+        """Суммы в рубли одним проходом по снимку; None, если суммы или курса нет."""
+        if not amounts:
+            return []
+        rates = await self.rates()
+        factors = np.array(
+            [1.0 if cur == EXCHANGE_RATES_BASE else rates.get(cur or "", np.nan) for cur in currencies],
+            dtype=np.float64,
+        )
+        values = np.array([amount if amount else np.nan for amount in amounts], dtype=np.float64)
+        converted = np.rint(values * factors)
+        return [None if np.isnan(value) else int(value) for value in converted]
+
+    async def run_refresher(self) -> None:
+        """Фоновый цикл для lifespan: обновляет курсы до истечения TTL, при ошибке — повтор."""
+        while True:
+            if not self._snapshot_loaded:
+                await self._load_snapshot()
+            refresh_at = EXCHANGE_RATES_TTL * EXCHANGE_RATES_REFRESH_AHEAD_RATIO
+            if self._age() >= refresh_at:
+                await self.refresh()
+            await asyncio.sleep(max(refresh_at - self._age(), EXCHANGE_RATES_RETRY_SECONDS))
+
+    def metrics(self) -> dict:
+        return {
+            **self._counters,
+            "currencies": len(self._rates),
+            "age_seconds": round(self._age()) if self._rates else None,
+            "refreshing": self._refresh_task is not None and not self._refresh_task.done(),
+        }
+
+
+EXCHANGE_RATES = ExchangeRateService()
+
+
+async def get_rub_rate(currency: str) -> float:
+    """Получить курс валюты к RUB. Бесплатный API, без ключа."""
+    return await EXCHANGE_RATES.get_rub_rate(currency)
+
+
+async def convert_many(amounts: Sequence[Optional[float]], currencies: Sequence[Optional[str]]) -> list[Optional[int]]:
+    return await EXCHANGE_RATES.convert_many(amounts, currencies)
@@ -0,0 +1,74 @@
+import os
+from typing import Optional
+
+import crud
+from database import SessionLocal
+from memory_cache import LRUCache
+
+
+# IATA-коды городов не меняются: LRU в памяти -> таблица iata_codes. Цены Travelpayouts
+# (тоже кэш на их стороне) держим недолго и только в памяти процесса.
+FLIGHT_FARES_CACHE_TTL = int(os.getenv("FLIGHT_FARES_CACHE_TTL_SECONDS", "1800"))
+FLIGHT_CACHE_SIZE = int(os.getenv("FLIGHT_CACHE_SIZE", "2000"))
+
+
+class FlightCache:
+    def __init__(self, memory_size: int = FLIGHT_CACHE_SIZE):
+        self._codes = LRUCache(memory_size)
+        self._fares = LRUCache(memory_size)
+        self._counters = {
+            "iata_memory_hits": 0,
+            "iata_db_hits": 0,
+            "iata_misses": 0,
+            "fare_hits": 0,
+            "fare_misses": 0,
+        }
+
+    async def get_iata(self, query: str) -> Optional[str]:
+        key = query.strip().lower()
+        code = self._codes.get(key)
+        if code:
+            self._counters["iata_memory_hits"] += 1
+            return code
+        try:
+            async with SessionLocal() as session:
+                code = await crud.get_iata_code(session, key)
+        except Exception as e:
+            print(f"IATA cache read error: {e}")
+        if not code:
+            self._counters["iata_misses"] += 1
+            return None
+        self._counters["iata_db_hits"] += 1
+        self._codes.put(key, code)
+        return code
+
+    async def put_iata(self, query: str, code: str) -> None:
+        key = query.strip().lower()
+        self._codes.put(key, code)
+        try:
+            async with SessionLocal() as session:
+                await crud.save_iata_code(session, key, code)
+        except Exception as e:
+            print(f"IATA cache save error: {e}")
+
+    def get_fares(self, origin: str, destination: str, departure_at: str) -> Optional[list[dict]]:
+        fares = self._fares.get((origin, destination, departure_at), ttl=FLIGHT_FARES_CACHE_TTL)
+        self._counters["fare_hits" if fares is not None else "fare_misses"] += 1
+        return fares
+
+    def get_stale_fares(self, origin: str, destination: str, departure_at: str) -> Optional[list[dict]]:
+        """Цены без учёта TTL — для ответа, когда Travelpayouts не успел."""
+        return self._fares.get_stale((origin, destination, departure_at))
+
+    def put_fares(self, origin: str, destination: str, departure_at: str, fares: list[dict]) -> None:
+        self._fares.put((origin, destination, departure_at), fares)
+
+    def metrics(self) -> dict:
+        return {
+            **self._counters,
+            "iata_size": len(self._codes),
+            "fares_size": len(self._fares),
+        }
+
+
+FLIGHT_CACHE = FlightCache()
@@ -0,0 +1,266 @@
+import asyncio
+import os
+import re
+from datetime import date, datetime, timedelta
+
+import crud
+from database import DATABASE_URL, SessionLocal, lock_engine
+from geocoding_service import geocode_city
+from rate_limit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from single_flight import advisory_lock_key, session_advisory_lock
+from weather_service import FORECAST_HORIZON_DAYS, describe_weather_code, get_daily_weather_batch
+
+
+# Сколько городов геокодируем и сколько пачек погоды запрашиваем одновременно
+FORECAST_JOB_CONCURRENCY = int(os.getenv("FORECAST_JOB_CONCURRENCY", "4"))
+FORECAST_BACKFILL_PAGE_SIZE = int(os.getenv("FORECAST_BACKFILL_PAGE_SIZE", "200"))
+# Точек в одном мульти-координатном запросе к Open-Meteo
+WEATHER_BATCH_POINTS = 20
+FORECAST_REFRESHER_ENABLED = os.getenv("FORECAST_REFRESHER_ENABLED", "true").lower() == "true"
+FORECAST_REFRESH_INTERVAL_HOURS = float(os.getenv("FORECAST_REFRESH_INTERVAL_HOURS", "24"))
+# Прогноз поездки в окне перезапрашивается, если он старше этого (или в окно вошли новые дни)
+FORECAST_STALE_HOURS = float(os.getenv("FORECAST_STALE_HOURS", "72"))
+# Как часто воркеры проверяют, не пора ли обновлять (сам запуск — не чаще интервала, см. job_runs)
+FORECAST_REFRESH_CHECK_SECONDS = 3600
+FORECAST_REFRESH_JOB = "forecast_refresh"
+
+
+def forecast_city_query(city: str | None) -> str:
+    """Город для геокодинга: первый город маршрута, часть до запятой."""
+    return (city or "").split("+")[0].split(",")[0].strip()
+
+
+def build_forecast_entries(weather_by_day: dict[str, dict], language: str, city: str | None = None) -> list[dict]:
+    """Погода по дням -> JSON для checklist.daily_forecast (поля schemas.DailyForecast)."""
+    entries = []
+    for date_str in sorted(weather_by_day.keys()):
+        day = weather_by_day[date_str]
+        desc, icon = describe_weather_code(day["weathercode"], language)
+        entries.append({
+            "date": date_str,
+            "temp_min": day["temp_min"],
+            "temp_max": day["temp_max"],
+            "condition": desc,
+            "icon": icon,
+            "source": day.get("source", "forecast"),
+            "city": city,
+            "humidity": day.get("humidity"),
+            "uv_index": day.get("uv_index"),
+            "wind_speed": day.get("wind_speed"),
+            "precipitation_probability": day.get("precipitation_probability"),
+        })
+    return entries
+
+
+async def fetch_checklist_forecasts(
+    trips: list[tuple[str, date, date]],
+    language: str = "ru",
+    priority: int = PRIORITY_INTERACTIVE,
+) -> list[list[dict]]:
+    """Прогнозы для поездок (city, start_date, end_date) с сохранением порядка.
+
+    Каждый город геокодируется один раз, погода идёт мульти-координатными пачками;
+    и то и другое — с ограниченной параллельностью. Не найденный город -> [].
+    """
+    semaphore = asyncio.Semaphore(FORECAST_JOB_CONCURRENCY)
+    queries = sorted({forecast_city_query(city) for city, _, _ in trips} - {""})
+
+    async def _geocode(query: str):
+        async with semaphore:
+            return await geocode_city(query, "ru", priority=priority)
+
+    geos = dict(zip(queries, await asyncio.gather(*(_geocode(query) for query in queries))))
+
+    points = []
+    point_indexes = []
+    for index, (city, start_date, end_date) in enumerate(trips):
+        geo = geos.get(forecast_city_query(city))
+        if geo:
+            points.append((geo["lat"], geo["lon"], start_date, end_date))
+            point_indexes.append(index)
+
+    async def _weather(chunk):
+        async with semaphore:
+            return await get_daily_weather_batch(chunk)
+
+    chunks = [points[i:i + WEATHER_BATCH_POINTS] for i in range(0, len(points), WEATHER_BATCH_POINTS)]
+    weather = [day for chunk in await asyncio.gather(*(_weather(chunk) for chunk in chunks)) for day in chunk]
+
+    forecasts: list[list[dict]] = [[] for _ in trips]
+    for index, weather_by_day in zip(point_indexes, weather):
+        forecasts[index] = build_forecast_entries(weather_by_day, language)
+    return forecasts
+
+
+async def backfill_missing_forecasts(page_size: int = FORECAST_BACKFILL_PAGE_SIZE) -> int:
+    """Заполнить daily_forecast у старых чеклистов, где его нет. Возвращает число обновлённых.
+
+    Идёт по таблице страницами по id, так что города, для которых погоду получить не
+    удалось, не блокируют остальные и будут повторены при следующем запуске.
+    """
+    updated = 0
+    after_id = 0
+    while True:
+        async with SessionLocal() as session:
+            rows = await crud.get_checklists_missing_forecast(session, after_id=after_id, limit=page_size)
+        if not rows:
+            break
+        after_id = rows[-1].id
+
+        forecasts = await fetch_checklist_forecasts(
+            [(row.city, row.start_date, row.end_date) for row in rows],
+            priority=PRIORITY_BACKGROUND,
+        )
+        to_save = {row.id: forecast for row, forecast in zip(rows, forecasts) if forecast}
+        if to_save:
+            async with SessionLocal() as session:
+                await crud.save_checklist_forecasts(session, to_save)
+            updated += len(to_save)
+        print(f"Forecast backfill: {updated} checklists updated (last id {after_id})")
+    return updated
+
+
+def _infer_language(conditions: list[str] | None, forecast: list[dict] | None) -> str:
+    texts = list(conditions or []) + [entry.get("condition") or "" for entry in forecast or []]
+    return "ru" if any(re.search("[а-яё]", text, re.IGNORECASE) for text in texts) or not any(texts) else "en"
+
+
+def _checklist_segments(row) -> list[tuple[str, date, date, bool]]:
+    """Непрерывные отрезки (город, начало, конец, город указан в прогнозе) по дням поездки.
+
+    Для мультигородских поездок город дня берётся из сохранённого прогноза.
+    """
+    city_by_day = {
+        entry.get("date"): entry.get("city")
+        for entry in row.daily_forecast or []
+        if isinstance(entry, dict)
+    }
+    segments: list[list] = []
+    day = row.start_date
+    while day <= row.end_date:
+        day_city = city_by_day.get(day.strftime("%Y-%m-%d"))
+        city = day_city or row.city
+        if segments and segments[-1][0] == city and segments[-1][3] == bool(day_city):
+            segments[-1][2] = day
+        else:
+            segments.append([city, day, day, bool(day_city)])
+        day += timedelta(days=1)
+    return [tuple(segment) for segment in segments]
+
+
+def _merge_forecast(stored: list[dict] | None, fresh: list[dict]) -> list[dict]:
+    """Свежие дни поверх сохранённых: дни, которых в ответе нет, остаются как были."""
+    by_date = {
+        entry.get("date"): entry
+        for entry in stored or []
+        if isinstance(entry, dict) and entry.get("date")
+    }
+    by_date.update({entry["date"]: entry for entry in fresh})
+    return [by_date[day] for day in sorted(by_date)]
+
+
+def _weather_values(forecast: list[dict]) -> dict:
+    temps = [
+        (entry["temp_min"] + entry["temp_max"]) / 2
+        for entry in forecast
+        if entry.get("temp_min") is not None and entry.get("temp_max") is not None
+    ]
+    return {
+        "daily_forecast": forecast,
+        "avg_temp": round(sum(temps) / len(temps), 1) if temps else None,
+        "conditions": sorted({entry["condition"] for entry in forecast if entry.get("condition")}),
+    }
+
+
+async def refresh_upcoming_forecasts(page_size: int = FORECAST_BACKFILL_PAGE_SIZE) -> int:
+    """Обновить погоду поездок, которые уже попали в окно прогноза.
+
+    Open-Meteo спрашиваем не про все поездки в окне, а только про те, где в окно вошли
+    новые дни с прошлого обновления, или чей прогноз старше FORECAST_STALE_HOURS.
+
+    Дни, сохранённые при создании как «прошлый год»/климат, получают настоящий прогноз
+    (source="forecast"), заодно пересчитываются avg_temp и conditions. Новые дни
+    накладываются на сохранённые; если хоть один отрезок вернулся пустым, поездка
+    пропускается целиком.
+    """
+    today = datetime.now().date()
+    horizon_end = today + timedelta(days=FORECAST_HORIZON_DAYS)
+    stale_before = datetime.now() - timedelta(hours=FORECAST_STALE_HOURS)
+    updated = 0
+    after_id = 0
+    while True:
+        async with SessionLocal() as session:
+            rows = await crud.get_checklists_in_forecast_window(
+                session, today, horizon_end, stale_before, after_id=after_id, limit=page_size
+            )
+        if not rows:
+            break
+        after_id = rows[-1].id
+
+        updates: dict[int, dict] = {}
+        rows_by_language: dict[str, list] = {}
+        for row in rows:
+            rows_by_language.setdefault(_infer_language(row.conditions, row.daily_forecast), []).append(row)
+        for language, language_rows in rows_by_language.items():
+            segments = [(row, _checklist_segments(row)) for row in language_rows]
+            trips = [(city, start, end) for _, row_segments in segments for city, start, end, _ in row_segments]
+            forecasts = iter(await fetch_checklist_forecasts(trips, language, priority=PRIORITY_BACKGROUND))
+            for row, row_segments in segments:
+                fresh = []
+                complete = True
+                for city, _, _, keep_city in row_segments:
+                    entries = next(forecasts)
+                    # Геокодинг или погода отрезка не удались — поездку не трогаем до следующего запуска
+                    complete = complete and bool(entries)
+                    if keep_city:
+                        entries = [{**entry, "city": city} for entry in entries]
+                    fresh.extend(entries)
+                if complete and fresh:
+                    updates[row.id] = _weather_values(_merge_forecast(row.daily_forecast, fresh))
+
+        if updates:
+            async with SessionLocal() as session:
+                await crud.save_checklist_weather(session, updates)
+            updated += len(updates)
+    print(f"Forecast refresh: {updated} upcoming checklists updated")
+    return updated
+
+
+async def _refresh_if_due() -> bool:
+    async with SessionLocal() as session:
+        last_run = await crud.get_job_last_run(session, FORECAST_REFRESH_JOB)
+    if last_run and datetime.now() - last_run < timedelta(hours=FORECAST_REFRESH_INTERVAL_HOURS):
+        return False
+    await refresh_upcoming_forecasts()
+    async with SessionLocal() as session:
+        await crud.save_job_run(session, FORECAST_REFRESH_JOB)
+    return True
+
+
+async def refresh_upcoming_forecasts_once() -> bool:
+    """Обновить прогнозы, если прошлый запуск был давнее интервала; True — если обновляли.
+
+    Цикл крутится в каждом воркере uvicorn, но работает один: кто взял advisory lock.
+    Время запуска лежит в job_runs, поэтому деплой и рестарты не запускают обновление заново.
+    """
+    if not DATABASE_URL.startswith("postgresql"):
+        return await _refresh_if_due()
+    async with session_advisory_lock(lock_engine, advisory_lock_key("jobs", FORECAST_REFRESH_JOB)) as acquired:
+        if not acquired:
+            return False
+        return await _refresh_if_due()
+
+
+async def run_forecast_refresher() -> None:
+    """Фоновый цикл для lifespan: раз в FORECAST_REFRESH_INTERVAL_HOURS обновляет прогнозы."""
+    while True:
+        try:
+            await refresh_upcoming_forecasts_once()
+        except Exception as e:
+            print(f"Forecast refresh error: {e}")
+        await asyncio.sleep(FORECAST_REFRESH_CHECK_SECONDS)
+
+
+if __name__ == "__main__":
+    # Разовый запуск: python forecast_jobs.py
+    asyncio.run(backfill_missing_forecasts())
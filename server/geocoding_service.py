@@ -0,0 +1,194 @@
+import os
+import re
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+import httpx
+
+import crud
+from database import DATABASE_URL, SessionLocal, async_engine
+from http_clients import get_http_client
+from rate_limit import PRIORITY_INTERACTIVE, ClusterRateLimiter, RequestScheduler
+
+
+NOMINATIM_URL = os.getenv("NOMINATIM_URL", "https://nominatim.openstreetmap.org/search")
+NOMINATIM_HEADERS = {"User-Agent": "Luggify/1.0 (travel packing app)"}
+# Политика Nominatim — не больше 1 запроса в секунду на приложение: лимит общий для всех
+# воркеров через Postgres (без Postgres — на процесс)
+NOMINATIM_RATE_PER_SECOND = float(os.getenv("NOMINATIM_RATE_PER_SECOND", "1"))
+NOMINATIM_SCHEDULER = RequestScheduler(
+    "nominatim",
+    ClusterRateLimiter(
+        "nominatim",
+        NOMINATIM_RATE_PER_SECOND,
+        async_engine if DATABASE_URL.startswith("postgresql") else None,
+    ),
+)
+
+GEOCODE_CACHE_TTL_DAYS = int(os.getenv("GEOCODE_CACHE_TTL_DAYS", "90"))
+GEOCODE_MEMORY_CACHE_SIZE = int(os.getenv("GEOCODE_MEMORY_CACHE_SIZE", "2048"))
+# "Не найдено" держим только в памяти и недолго — опечатку могут исправить в Nominatim
+GEOCODE_NEGATIVE_TTL_SECONDS = 3600
+
+# key: (query, language) -> (expires_at, result | None)
+_MEMORY_CACHE: "OrderedDict[tuple[str, str], tuple[float, Optional[dict]]]" = OrderedDict()
+
+
+def normalize_geocode_query(query: str | None) -> str:
+    return re.sub(r"\s+", " ", query or "").strip().casefold()
+
+
+def _memory_get(key: tuple[str, str]) -> tuple[bool, Optional[dict]]:
+    entry = _MEMORY_CACHE.get(key)
+    if entry is None:
+        return False, None
+    expires_at, value = entry
+    if expires_at < time.time():
+        _MEMORY_CACHE.pop(key, None)
+        return False, None
+    _MEMORY_CACHE.move_to_end(key)
+    return True, value
+
+
+def _memory_put(key: tuple[str, str], value: Optional[dict], ttl_seconds: float) -> None:
+    _MEMORY_CACHE[key] = (time.time() + ttl_seconds, value)
+    _MEMORY_CACHE.move_to_end(key)
+    while len(_MEMORY_CACHE) > GEOCODE_MEMORY_CACHE_SIZE:
+        _MEMORY_CACHE.popitem(last=False)
+
+
+def _row_to_result(row) -> dict:
+    address = row.address or {}
+    return {
+        "lat": row.lat,
+        "lon": row.lon,
+        "country_code": row.country_code or "",
+        "country": address.get("country"),
+        "display_name": row.display_name,
+        "address": address,
+    }
+
+
+def _parse_nominatim_item(item: dict) -> dict:
+    address = item.get("address") or {}
+    return {
+        "lat": float(item["lat"]),
+        "lon": float(item["lon"]),
+        "country_code": str(address.get("country_code") or "").upper(),
+        "country": address.get("country"),
+        "display_name": item.get("display_name"),
+        "address": address,
+    }
+
+
+async def _load_from_db(query: str, language: str) -> Optional[dict]:
+    try:
+        async with SessionLocal() as session:
+            row = await crud.get_geocode_cache(session, query, language)
+    except Exception as e:
+        print(f"Geocode cache read error: {e}")
+        return None
+    if not row:
+        return None
+    if row.updated_at and datetime.now() - row.updated_at > timedelta(days=GEOCODE_CACHE_TTL_DAYS):
+        return None
+    return _row_to_result(row)
+
+
+async def _save_to_db(query: str, language: str, result: dict) -> None:
+    try:
+        async with SessionLocal() as session:
+            await crud.save_geocode_cache(session, query, language, result)
+    except Exception as e:
+        print(f"Geocode cache write error: {e}")
+
+
+async def nominatim_search(
+    params: dict,
+    priority: int = PRIORITY_INTERACTIVE,
+    timeout: float | None = None,
+    client: httpx.AsyncClient | None = None,
+) -> httpx.Response:
+    """GET /search через общий планировщик: лимит запросов, склейка одинаковых, приоритеты."""
+    client = client or get_http_client("nominatim")
+    key = tuple(sorted((name, str(value)) for name, value in params.items()))
+    return await NOMINATIM_SCHEDULER.submit(
+        key,
+        lambda: client.get(NOMINATIM_URL, params=params, headers=NOMINATIM_HEADERS),
+        priority=priority,
+        timeout=timeout,
+    )
+
+
+async def _fetch_from_nominatim(
+    query: str,
+    language: str,
+    priority: int,
+    client: httpx.AsyncClient | None,
+) -> tuple[bool, Optional[dict]]:
+    """Возвращает (ответ получен, результат). Сетевые ошибки не кэшируем."""
+    params = {
+        "q": query,
+        "format": "json",
+        "limit": 1,
+        "addressdetails": 1,
+    }
+    if language:
+        params["accept-language"] = language
+    try:
+        resp = await nominatim_search(params, priority=priority, client=client)
+    except Exception as e:
+        print(f"Nominatim error for {query}: {e}")
+        return False, None
+    if resp.status_code != 200:
+        print(f"Nominatim returned {resp.status_code} for {query}")
+        return False, None
+    data = resp.json()
+    if not data:
+        return True, None
+    return True, _parse_nominatim_item(data[0])
+
+
+async def geocode_city(
+    query: str,
+    language: str | None = None,
+    client: httpx.AsyncClient | None = None,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> Optional[dict]:
+    """Геокодинг города: LRU в памяти -> таблица geocode_cache -> Nominatim.
+
+    Фоновые задачи (статистика и т.п.) передают PRIORITY_BACKGROUND, чтобы не
+    задерживать генерацию списков в общей очереди к Nominatim.
+
+    Результат: {"lat", "lon", "country_code", "country", "display_name", "address"} или None.
+    """
+    normalized_query = normalize_geocode_query(query)
+    if not normalized_query:
+        return None
+    normalized_language = (language or "").strip().lower()
+    key = (normalized_query, normalized_language)
+
+    found, cached = _memory_get(key)
+    if found:
+        return cached
+
+    stored = await _load_from_db(normalized_query, normalized_language)
+    if stored:
+        _memory_put(key, stored, GEOCODE_CACHE_TTL_DAYS * 86400)
+        return stored
+
+    answered, result = await _fetch_from_nominatim(
+        normalized_query,
+        normalized_language,
+        priority,
+        client,
+    )
+
+    if result:
+        _memory_put(key, result, GEOCODE_CACHE_TTL_DAYS * 86400)
+        await _save_to_db(normalized_query, normalized_language, result)
+    elif answered:
+        _memory_put(key, None, GEOCODE_NEGATIVE_TTL_SECONDS)
+    return result
@@ -0,0 +1,123 @@
+import os
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import crud
+from database import SessionLocal
+from memory_cache import LRUCache
+from quota import QUOTAS
+
+
+# У booking-com18 ~530 запросов в месяц на весь кластер, поэтому результаты живут в Postgres
+# (переживают деплой и общие для воркеров), а LRU в памяти снимает с БД горячие ключи.
+# Расход запросов считает quota.py (api_usage)
+BOOKING_PROVIDER = "booking"
+HOTELS_CACHE_TTL = int(os.getenv("HOTELS_CACHE_TTL_SECONDS", "604800"))  # 7 дней
+HOTELS_MEMORY_CACHE_SIZE = int(os.getenv("HOTELS_MEMORY_CACHE_SIZE", "500"))
+
+
+class HotelCache:
+    """Двухуровневый кэш отелей: LRU в памяти -> таблицы hotel_locations / hotel_searches.
+
+    Хранится сырой ответ провайдера на (locationId, заезд, выезд): фильтры по цене и
+    рейтингу, сортировка и пересчёт в рубли делаются из него локально на каждый запрос.
+    """
+
+    def __init__(self, memory_size: int = HOTELS_MEMORY_CACHE_SIZE):
+        self._locations = LRUCache(memory_size)
+        self._searches = LRUCache(memory_size)
+        self._counters = {
+            "memory_hits": 0,
+            "db_hits": 0,
+            "misses": 0,
+            "location_hits": 0,
+            "location_misses": 0,
+        }
+
+    async def get_location(self, query: str) -> Optional[str]:
+        key = query.strip().lower()
+        location_id = self._locations.get(key)
+        if location_id is None:
+            try:
+                async with SessionLocal() as session:
+                    location_id = await crud.get_hotel_location(session, key)
+            except Exception as e:
+                print(f"Hotel location cache read error: {e}")
+            if location_id:
+                self._locations.put(key, location_id)
+        self._counters["location_hits" if location_id else "location_misses"] += 1
+        return location_id
+
+    async def put_location(self, query: str, location_id: str, label: str = "") -> None:
+        key = query.strip().lower()
+        self._locations.put(key, location_id)
+        try:
+            async with SessionLocal() as session:
+                await crud.save_hotel_location(session, key, location_id, label)
+        except Exception as e:
+            print(f"Hotel location cache save error: {e}")
+
+    async def get_results(self, location_id: str, check_in: date, check_out: date) -> Optional[list[dict]]:
+        key = (location_id, check_in, check_out)
+        results = self._searches.get(key, ttl=HOTELS_CACHE_TTL)
+        if results is not None:
+            self._counters["memory_hits"] += 1
+            return results
+        try:
+            async with SessionLocal() as session:
+                row = await crud.get_hotel_search(
+                    session,
+                    location_id,
+                    check_in,
+                    check_out,
+                    fresh_after=datetime.now() - timedelta(seconds=HOTELS_CACHE_TTL),
+                )
+        except Exception as e:
+            print(f"Hotel search cache read error: {e}")
+            row = None
+        if row is None:
+            self._counters["misses"] += 1
+            return None
+        self._counters["db_hits"] += 1
+        # В LRU кладём с исходным временем получения, чтобы TTL не продлевался
+        self._searches.put(key, row.results, stored_at=row.fetched_at.timestamp())
+        return row.results
+
+    async def get_stale_results(self, location_id: str, check_in: date, check_out: date) -> Optional[list[dict]]:
+        """Результаты любой давности: провайдер не успел, а старый список лучше пустого."""
+        results = self._searches.get_stale((location_id, check_in, check_out))
+        if results is not None:
+            return results
+        try:
+            async with SessionLocal() as session:
+                row = await crud.get_hotel_search(session, location_id, check_in, check_out)
+        except Exception as e:
+            print(f"Hotel search cache read error: {e}")
+            return None
+        return row.results if row is not None else None
+
+    async def put_results(self, location_id: str, check_in: date, check_out: date, results: list[dict]) -> None:
+        self._searches.put((location_id, check_in, check_out), results)
+        try:
+            async with SessionLocal() as session:
+                await crud.save_hotel_search(session, location_id, check_in, check_out, results)
+        except Exception as e:
+            print(f"Hotel search cache save error: {e}")
+
+    async def _budget(self) -> dict:
+        quota = QUOTAS[BOOKING_PROVIDER]
+        await quota.sync_usage()
+        return {key: quota.metrics()[key] for key in ("period", "used", "monthly_budget", "remaining")}
+
+    async def metrics(self) -> dict:
+        lookups = self._counters["memory_hits"] + self._counters["db_hits"] + self._counters["misses"]
+        hits = lookups - self._counters["misses"]
+        return {
+            **self._counters,
+            "memory_size": len(self._searches),
+            "hit_ratio": round(hits / lookups, 3) if lookups else 0.0,
+            "budget": await self._budget(),
+        }
+
+
+HOTEL_CACHE = HotelCache()
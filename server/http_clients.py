@@ -0,0 +1,67 @@
+from dataclasses import dataclass
+
+import httpx
+
+
+@dataclass(frozen=True)
+class ProviderClientSettings:
+    timeout: float
+    max_connections: int
+    http2: bool = False
+
+
+# Один пул соединений на внешнего провайдера: keep-alive вместо TCP+TLS на каждый запрос.
+# Nominatim держим на паре соединений — политика сервиса 1 запрос/сек.
+PROVIDER_SETTINGS: dict[str, ProviderClientSettings] = {
+    "nominatim": ProviderClientSettings(timeout=10.0, max_connections=2),
+    "open_meteo": ProviderClientSettings(timeout=15.0, max_connections=20, http2=True),
+    "google_places": ProviderClientSettings(timeout=30.0, max_connections=10, http2=True),
+    "booking": ProviderClientSettings(timeout=20.0, max_connections=5, http2=True),
+    "travelpayouts": ProviderClientSettings(timeout=15.0, max_connections=10, http2=True),
+    "gemini": ProviderClientSettings(timeout=15.0, max_connections=10, http2=True),
+    "wikipedia": ProviderClientSettings(timeout=10.0, max_connections=10, http2=True),
+    "exchange_rates": ProviderClientSettings(timeout=10.0, max_connections=2),
+    "images": ProviderClientSettings(timeout=20.0, max_connections=10, http2=True),
+}
+KEEPALIVE_EXPIRY_SECONDS = 60.0
+
+try:
+    import h2  # noqa: F401 — httpx включает HTTP/2 только при установленном пакете h2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+_CLIENTS: dict[str, httpx.AsyncClient] = {}
+
+
+def _build_client(settings: ProviderClientSettings) -> httpx.AsyncClient:
+    return httpx.AsyncClient(
+        timeout=settings.timeout,
+        limits=httpx.Limits(
+            max_connections=settings.max_connections,
+            max_keepalive_connections=settings.max_connections,
+            keepalive_expiry=KEEPALIVE_EXPIRY_SECONDS,
+        ),
+        http2=settings.http2 and HTTP2_AVAILABLE,
+    )
+
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    """Общий клиент провайдера. Создаётся лениво, чтобы работать и вне lifespan (бот, скрипты)."""
+    client = _CLIENTS.get(provider)
+    if client is None or client.is_closed:
+        client = _build_client(PROVIDER_SETTINGS[provider])
+        _CLIENTS[provider] = client
+    return client
+
+
+def open_http_clients() -> None:
+    for provider in PROVIDER_SETTINGS:
+        get_http_client(provider)
+
+
+async def close_http_clients() -> None:
+    clients = list(_CLIENTS.values())
+    _CLIENTS.clear()
+    for client in clients:
+        await client.aclose()
@@ -0,0 +1,247 @@
+import asyncio
+import hashlib
+import io
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Optional
+from urllib.parse import urljoin, urlparse
+
+from db_instrumentation import create_untracked_task
+from http_clients import get_http_client
+
+
+# Фото достопримечательностей: оригинал скачивается один раз, уменьшенные копии лежат на диске.
+# Файлы адресуются хэшем содержимого: одинаковые фото с разных URL хранятся один раз.
+IMAGE_CACHE_DIR = os.getenv("IMAGE_CACHE_DIR") or os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "image_cache"
+)
+IMAGE_RESIZE_WORKERS = int(os.getenv("IMAGE_RESIZE_WORKERS", "2"))
+IMAGE_PROXY_WIDTHS = (400, 800)
+IMAGE_PROXY_DEFAULT_WIDTH = 800
+IMAGE_JPEG_QUALITY = 82
+IMAGE_MAX_SOURCE_BYTES = 15 * 1024 * 1024
+IMAGE_MAX_REDIRECTS = 5
+# Проксируем только фото провайдеров, которые реально отдаёт /attractions (защита от SSRF)
+IMAGE_PROXY_ALLOWED_HOSTS = ("googleusercontent.com", "ggpht.com", "upload.wikimedia.org")
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+# Потолок размера кэша на диске: сверх него фоновая чистка удаляет самые старые файлы
+IMAGE_CACHE_MAX_BYTES = int(os.getenv("IMAGE_CACHE_MAX_MB", "2048")) * 1024 * 1024
+IMAGE_CACHE_PRUNE_INTERVAL_SECONDS = int(os.getenv("IMAGE_CACHE_PRUNE_INTERVAL_SECONDS", "3600"))
+# Недописанные .tmp моложе этого не трогаем: их прямо сейчас пишет другой запрос
+IMAGE_CACHE_TMP_GRACE_SECONDS = 600
+
+_POOL: Optional[ProcessPoolExecutor] = None
+_INFLIGHT: dict[tuple[str, int], asyncio.Task] = {}
+
+
+class ImageProxyError(Exception):
+    pass
+
+
+def is_proxyable_image(url: str | None) -> bool:
+    try:
+        parsed = urlparse(str(url or "").strip())
+    except ValueError:
+        return False
+    host = (parsed.hostname or "").lower()
+    return parsed.scheme == "https" and any(
+        host == allowed or host.endswith(f".{allowed}") for allowed in IMAGE_PROXY_ALLOWED_HOSTS
+    )
+
+
+def resize_image(data: bytes, width: int) -> bytes:
+    """JPEG шириной не больше width. Выполняется в процессе пула, поэтому на уровне модуля."""
+    from PIL import Image
+
+    with Image.open(io.BytesIO(data)) as image:
+        image = image.convert("RGB")
+        if image.width > width:
+            image.thumbnail((width, width * 10), Image.LANCZOS)
+        output = io.BytesIO()
+        image.save(output, format="JPEG", quality=IMAGE_JPEG_QUALITY, optimize=True, progressive=True)
+        return output.getvalue()
+
+
+def _pool() -> ProcessPoolExecutor:
+    global _POOL
+    if _POOL is None:
+        _POOL = ProcessPoolExecutor(max_workers=IMAGE_RESIZE_WORKERS)
+    return _POOL
+
+
+def close_image_pool() -> None:
+    global _POOL
+    if _POOL is not None:
+        _POOL.shutdown(wait=False, cancel_futures=True)
+        _POOL = None
+
+
+def _sha256(value: bytes) -> str:
+    return hashlib.sha256(value).hexdigest()
+
+
+def _ref_path(url: str) -> str:
+    # URL -> хэш содержимого оригинала
+    url_hash = _sha256(url.encode("utf-8"))
+    return os.path.join(IMAGE_CACHE_DIR, "refs", url_hash[:2], url_hash)
+
+
+def _original_path(content_hash: str) -> str:
+    return os.path.join(IMAGE_CACHE_DIR, "originals", content_hash[:2], content_hash)
+
+
+def _variant_path(content_hash: str, width: int) -> str:
+    return os.path.join(IMAGE_CACHE_DIR, "variants", content_hash[:2], f"{content_hash}_w{width}.jpg")
+
+
+def _write_atomic(path: str, data: bytes) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def _read_ref(url: str) -> Optional[str]:
+    try:
+        with open(_ref_path(url), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def variant_etag(content_hash: str, width: int) -> str:
+    return f'"{content_hash[:32]}-w{width}"'
+
+
+async def _read_limited(response) -> bytes:
+    # Тело читается потоком и обрывается на лимите, а не после загрузки целиком в память
+    declared = response.headers.get("content-length", "")
+    if declared.isdigit() and int(declared) > IMAGE_MAX_SOURCE_BYTES:
+        raise ImageProxyError("source image is too large")
+    chunks = []
+    size = 0
+    async for chunk in response.aiter_bytes():
+        size += len(chunk)
+        if size > IMAGE_MAX_SOURCE_BYTES:
+            raise ImageProxyError("source image is too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+async def _download(url: str) -> bytes:
+    client = get_http_client("images")
+    # Редиректы проходим вручную: каждый адрес снова проверяется по списку хостов,
+    # иначе разрешённый хост мог бы увести запрос куда угодно
+    for _ in range(IMAGE_MAX_REDIRECTS + 1):
+        try:
+            async with client.stream("GET", url, follow_redirects=False) as response:
+                if not response.is_redirect:
+                    if response.status_code != 200 or not response.headers.get("content-type", "").startswith("image/"):
+                        raise ImageProxyError(f"download failed: HTTP {response.status_code}")
+                    return await _read_limited(response)
+                location = response.headers.get("location", "")
+        except ImageProxyError:
+            raise
+        except Exception as e:
+            raise ImageProxyError(f"download failed: {e}") from e
+        url = urljoin(url, location)
+        if not is_proxyable_image(url):
+            raise ImageProxyError("redirect to a host that is not allowed")
+    raise ImageProxyError("too many redirects")
+
+
+def _read_original(content_hash: str) -> Optional[bytes]:
+    try:
+        with open(_original_path(content_hash), "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+
+async def _build_variant(url: str, width: int) -> tuple[str, str]:
+    # Оригиналы — мегабайты: чтение и запись с диска уходят в поток, event loop не блокируется
+    content_hash = await asyncio.to_thread(_read_ref, url)
+    source = await asyncio.to_thread(_read_original, content_hash) if content_hash else None
+    if source is None:
+        source = await _download(url)
+        content_hash = _sha256(source)
+        await asyncio.to_thread(_write_atomic, _original_path(content_hash), source)
+
+    path = _variant_path(content_hash, width)
+    if not os.path.exists(path):
+        loop = asyncio.get_running_loop()
+        try:
+            variant = await loop.run_in_executor(_pool(), resize_image, source, width)
+        except Exception as e:
+            raise ImageProxyError(f"resize failed: {e}") from e
+        await asyncio.to_thread(_write_atomic, path, variant)
+    await asyncio.to_thread(_write_atomic, _ref_path(url), content_hash.encode("utf-8"))
+    return path, variant_etag(content_hash, width)
+
+
+async def get_image_variant(url: str, width: int) -> tuple[str, str]:
+    """Путь к уменьшенной копии и её ETag; скачивание и ресайз — один раз на (url, width)."""
+    content_hash = _read_ref(url)
+    if content_hash:
+        path = _variant_path(content_hash, width)
+        if os.path.exists(path):
+            return path, variant_etag(content_hash, width)
+
+    key = (url, width)
+    task = _INFLIGHT.get(key)
+    if task is None:
+        task = create_untracked_task(_build_variant(url, width))
+        _INFLIGHT[key] = task
+        task.add_done_callback(lambda _: _INFLIGHT.pop(key, None))
+    return await asyncio.shield(task)
+
+
+def prune_image_cache(max_bytes: int = IMAGE_CACHE_MAX_BYTES) -> int:
+    """Удалить самые старые файлы кэша, пока он больше max_bytes; возвращает число удалённых.
+
+    Удалённый оригинал или ссылка просто скачаются заново при следующем запросе фото.
+    """
+    now = time.time()
+    files = []
+    total = 0
+    for root, _, names in os.walk(IMAGE_CACHE_DIR):
+        for name in names:
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if name.endswith(".tmp") and now - stat.st_mtime < IMAGE_CACHE_TMP_GRACE_SECONDS:
+                continue
+            files.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+    if total <= max_bytes:
+        return 0
+
+    # Чистим с запасом до 90% лимита, чтобы не запускаться снова на каждом новом файле
+    target = max_bytes * 0.9
+    removed = 0
+    for _, size, path in sorted(files):
+        if total <= target:
+            break
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+    return removed
+
+
+async def run_image_cache_janitor() -> None:
+    """Фоновый цикл для lifespan: держит кэш фото в пределах IMAGE_CACHE_MAX_MB."""
+    while True:
+        try:
+            removed = await asyncio.to_thread(prune_image_cache)
+            if removed:
+                print(f"Image cache pruned: {removed} files")
+        except Exception as e:
+            print(f"Image cache prune error: {e}")
+        await asyncio.sleep(IMAGE_CACHE_PRUNE_INTERVAL_SECONDS)
@@ -1,3 +1,4 @@
+import json
 import os
 import re
 from datetime import datetime, timedelta, date
@@ -8,24 +9,57 @@ from env_utils import load_app_env
 load_app_env()
 
 import httpx
-from fastapi import FastAPI, Query, Depends, HTTPException, Body, status
+from fastapi import FastAPI, Query, Depends, HTTPException, Body, Request, status
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import Response
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import FileResponse, RedirectResponse, Response, StreamingResponse
 import time
 import asyncio
+from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update
 from sqlalchemy.orm import selectinload
 import crud, models, schemas
-from database import SessionLocal, async_engine, get_db
-from typing import List, Optional
+from database import DATABASE_URL, SessionLocal, get_db, lock_engine
+from typing import Awaitable, Callable, List, Optional
 from auth import (
     verify_password, create_access_token,
     get_current_user, require_current_user
 )
 from telegram_auth import TelegramAuthError, parse_telegram_auth_payload
 from telegram_link import create_telegram_link_token
+from geocoding_service import NOMINATIM_SCHEDULER, geocode_city, nominatim_search
+from http_clients import close_http_clients, get_http_client, open_http_clients
+from rate_limit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE
+from quota import QUOTAS, acquire_quota, quota_metrics
+from city_index import CITY_INDEX, City, CityIndex
+from autocomplete_cache import AUTOCOMPLETE_CACHE
+from single_flight import ClusterSingleFlight
+from db_instrumentation import QueryStatsMiddleware, create_untracked_task
+from read_replica import (
+    ReadYourWritesMiddleware,
+    get_current_read_user,
+    get_read_db,
+    read_replica_metrics,
+    require_current_read_user,
+)
+from hotel_cache import HOTEL_CACHE
+from flight_cache import FLIGHT_CACHE
+from exchange_rates import EXCHANGE_RATES, convert_many
+from image_proxy import (
+    IMAGE_CACHE_CONTROL,
+    IMAGE_PROXY_DEFAULT_WIDTH,
+    IMAGE_PROXY_WIDTHS,
+    ImageProxyError,
+    close_image_pool,
+    get_image_variant,
+    is_proxyable_image,
+    run_image_cache_janitor,
+)
+from weather_service import describe_weather_code, get_daily_weather_batch
+from packing_rules import PACKING_RULES, TripFacts, summarize_weather
+from forecast_jobs import FORECAST_REFRESHER_ENABLED, fetch_checklist_forecasts, run_forecast_refresher
 
 
 def _parse_csv_env(name: str, defaults: list[str]) -> list[str]:
@@ -34,12 +68,7 @@ def _parse_csv_env(name: str, defaults: list[str]) -> list[str]:
     return parsed or defaults
 
 
-# Open-Meteo API (бесплатный, без ключа)
-OPEN_METEO_FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
-OPEN_METEO_HISTORICAL_URL = "https://archive-api.open-meteo.com/v1/archive"
-NOMINATIM_URL = "https://nominatim.openstreetmap.org/search"
-LOCATION_COUNTRY_CACHE: dict[str, Optional[str]] = {}
-from translations import WMO_CODES, get_item, get_category_map
+from translations import get_item, get_category_map
 
 default_cors_origins = [
     "http://localhost:5173",
@@ -53,7 +82,31 @@ cors_allowed_origin_regex = os.getenv(
     r"https://.*\.(vercel\.app|up\.railway\.app)",
 )
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    open_http_clients()
+    # Обновление прогнозов идёт в фоне, просмотр чеклиста погоду не ждёт
+    forecast_refresher = asyncio.create_task(run_forecast_refresher()) if FORECAST_REFRESHER_ENABLED else None
+    # Курсы валют обновляются заранее, поиск отелей провайдера курсов не ждёт
+    exchange_rates_refresher = asyncio.create_task(EXCHANGE_RATES.run_refresher())
+    image_cache_janitor = asyncio.create_task(run_image_cache_janitor())
+    try:
+        yield
+    finally:
+        if forecast_refresher:
+            forecast_refresher.cancel()
+        exchange_rates_refresher.cancel()
+        image_cache_janitor.cancel()
+        close_image_pool()
+        await close_http_clients()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Server-Timing: число запросов к БД и время в БД на каждый HTTP-запрос, лог N+1
+app.add_middleware(QueryStatsMiddleware)
+# X-DB-LSN после записей: чтения с реплики видят собственные изменения пользователя
+app.add_middleware(ReadYourWritesMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -115,39 +168,10 @@ def _extract_city_and_country(segment: str) -> tuple[Optional[str], Optional[str
     return city, country.casefold() if country else None
 
 
-async def _resolve_country_for_city(city_name: str, client: httpx.AsyncClient) -> Optional[str]:
-    normalized_city = re.sub(r"\s+", " ", city_name or "").strip()
-    if not normalized_city:
-        return None
-
-    cache_key = normalized_city.casefold()
-    if cache_key in LOCATION_COUNTRY_CACHE:
-        return LOCATION_COUNTRY_CACHE[cache_key]
-
-    headers = {"User-Agent": "Luggify/1.0"}
-    try:
-        resp = await client.get(
-            NOMINATIM_URL,
-            params={
-                "q": normalized_city,
-                "format": "json",
-                "limit": 1,
-                "addressdetails": 1,
-            },
-            headers=headers,
-            timeout=10.0,
-        )
-        if resp.status_code == 200:
-            data = resp.json()
-            if data:
-                country = (data[0].get("address", {}) or {}).get("country")
-                LOCATION_COUNTRY_CACHE[cache_key] = country.casefold() if country else None
-                return LOCATION_COUNTRY_CACHE[cache_key]
-    except Exception:
-        pass
-
-    LOCATION_COUNTRY_CACHE[cache_key] = None
-    return None
+async def _resolve_country_for_city(city_name: str) -> Optional[str]:
+    geo = await geocode_city(city_name, priority=PRIORITY_BACKGROUND)
+    country = (geo or {}).get("country")
+    return country.casefold() if country else None
 
 
 async def collect_location_stats(checklists) -> tuple[set[str], set[str]]:
@@ -166,10 +190,9 @@ async def collect_location_stats(checklists) -> tuple[set[str], set[str]]:
                 unresolved_cities.add(city)
 
     if unresolved_cities:
-        async with httpx.AsyncClient() as client:
-            resolved = await asyncio.gather(
-                *[_resolve_country_for_city(city, client) for city in sorted(unresolved_cities)]
-            )
+        resolved = await asyncio.gather(
+            *[_resolve_country_for_city(city) for city in sorted(unresolved_cities)]
+        )
         for country in resolved:
             if country:
                 countries.add(country)
@@ -293,31 +316,6 @@ def get_map_quantity(quantity_map: dict | None, item: str, fallback: int = 0) ->
     return parsed
 
 
-def set_map_quantity(quantity_map: dict | None, item: str, value: int, *, keep_zero: bool = False) -> dict:
-    normalized_key = normalize_item_key(item)
-    next_map = dict(quantity_map or {})
-    if not normalized_key:
-        return next_map
-    try:
-        parsed = int(value)
-    except (TypeError, ValueError):
-        parsed = 0
-    if parsed <= 0 and not keep_zero:
-        next_map.pop(normalized_key, None)
-        return next_map
-    next_map[normalized_key] = parsed
-    return next_map
-
-
-def rebuild_checked_items(items: list[str] | None, item_quantities: dict | None, packed_quantities: dict | None) -> list[str]:
-    checked_items: list[str] = []
-    for item in items or []:
-        needed = max(1, get_map_quantity(item_quantities, item, 1))
-        packed = max(0, get_map_quantity(packed_quantities, item, 0))
-        if packed >= needed:
-            checked_items.append(item)
-    return checked_items
-
 # Словарь переводов погодных условий
 
 
@@ -367,17 +365,16 @@ def build_runtime_packing_profile(profile: dict | None = None, overrides: dict |
     return normalized
 
 
-async def build_personal_baggage_items_for_segments(
+def build_personal_baggage_items_for_segments(
     segments: list[dict[str, str]],
+    segment_contexts: list[dict],
     profile: dict,
     language: str,
 ) -> set[str]:
     items: set[str] = set()
-    for segment in segments:
-        data = await calculate_packing_data(
-            segment["city"],
-            segment["start_date"],
-            segment["end_date"],
+    for segment, context in zip(segments, segment_contexts):
+        data = build_packing_data(
+            context,
             segment["trip_type"],
             segment["transport"],
             profile.get("gender", "unspecified"),
@@ -396,9 +393,11 @@ async def build_participant_baggage_payloads(
     current_user,
     participant_user_ids: list[int],
     segments: list[dict[str, str]],
+    segment_contexts: list[dict],
     owner_overrides: dict,
     language: str,
 ) -> dict[int, list[str]] | None:
+    """Личный багаж владельца и участников по уже посчитанному контексту поездки (fetch_segment_contexts)."""
     unique_participant_ids: list[int] = []
     for raw_value in participant_user_ids or []:
         try:
@@ -418,16 +417,20 @@ async def build_participant_baggage_payloads(
     payloads: dict[int, list[str]] = {}
     owner_profile = build_runtime_packing_profile(current_user.packing_profile, owner_overrides)
     payloads[current_user.id] = sorted(
-        await build_personal_baggage_items_for_segments(segments, owner_profile, language)
+        build_personal_baggage_items_for_segments(segments, segment_contexts, owner_profile, language)
     )
 
+    participants_by_id = {
+        participant.id: participant
+        for participant in await crud.get_users_by_ids(db, unique_participant_ids)
+    }
     for participant_user_id in unique_participant_ids:
-        participant_user = await crud.get_user_by_id(db, participant_user_id)
+        participant_user = participants_by_id.get(participant_user_id)
         if not participant_user:
             raise HTTPException(status_code=404, detail=f"Пользователь {participant_user_id} не найден")
         participant_profile = build_runtime_packing_profile(participant_user.packing_profile)
         payloads[participant_user_id] = sorted(
-            await build_personal_baggage_items_for_segments(segments, participant_profile, language)
+            build_personal_baggage_items_for_segments(segments, segment_contexts, participant_profile, language)
         )
 
     return payloads
@@ -683,12 +686,11 @@ async def verify_device_login(data: schemas.VerifyDeviceLogin, db: AsyncSession
 @app.get("/auth/me", response_model=schemas.UserOut)
 async def get_me(user=Depends(require_current_user), db: AsyncSession = Depends(get_db)):
     """Получение профиля текущего пользователя"""
-    followers = await crud.get_followers(db, user.id)
-    following = await crud.get_following(db, user.id)
+    followers_count, following_count = await crud.get_follow_counts(db, user.id)
     
     user_out = schemas.UserOut.model_validate(user)
-    user_out.followers_count = len(followers)
-    user_out.following_count = len(following)
+    user_out.followers_count = followers_count
+    user_out.following_count = following_count
     return user_out
 
 
@@ -702,12 +704,11 @@ async def update_me(update_data: schemas.UserUpdate, user=Depends(require_curren
             detail="Пользователь не найден"
         )
     
-    followers = await crud.get_followers(db, user.id)
-    following = await crud.get_following(db, user.id)
+    followers_count, following_count = await crud.get_follow_counts(db, user.id)
     
     user_out = schemas.UserOut.model_validate(updated_user)
-    user_out.followers_count = len(followers)
-    user_out.following_count = len(following)
+    user_out.followers_count = followers_count
+    user_out.following_count = following_count
     return user_out
 
 
@@ -734,12 +735,11 @@ async def unlink_telegram(user=Depends(require_current_user), db: AsyncSession =
             detail="Пользователь не найден",
         )
 
-    followers = await crud.get_followers(db, user.id)
-    following = await crud.get_following(db, user.id)
+    followers_count, following_count = await crud.get_follow_counts(db, user.id)
 
     user_out = schemas.UserOut.model_validate(updated_user)
-    user_out.followers_count = len(followers)
-    user_out.following_count = len(following)
+    user_out.followers_count = followers_count
+    user_out.following_count = following_count
     return user_out
 
 
@@ -814,16 +814,20 @@ async def search_users(
 @app.get("/users/{username}", response_model=dict)
 async def get_public_profile(
     username: str,
-    db: AsyncSession = Depends(get_db),
-    current_user: Optional[models.User] = Depends(get_current_user)  # Optional, to check friend status later
+    db: AsyncSession = Depends(get_read_db),
+    current_user: Optional[models.User] = Depends(get_current_read_user)  # Optional, to check friend status later
 ):
     """Публичный профиль пользователя"""
     user = await crud.get_user_by_username(db, username)
     if not user:
         raise HTTPException(status_code=404, detail="Пользователь не найден")
 
-    # Получаем чеклисты
-    checklists = await crud.get_checklists_by_user_id(db, user.id)
+    # Получаем чеклисты: при открытой статистике — вместе с совместными, одним запросом
+    if user.is_stats_public:
+        all_stats_checklists = await get_all_user_checklists(db, user.id)
+        checklists = [c for c in all_stats_checklists if c.user_id == user.id]
+    else:
+        checklists = await crud.get_checklists_by_user_id(db, user.id)
     public_checklists = [
         schemas.ChecklistOut.model_validate(c) 
         for c in checklists 
@@ -836,7 +840,6 @@ async def get_public_profile(
         # Или полную, если user разрешил? Обычно полную, но флаг 'is_stats_public' это и значит)
         
         # Лучше считать полную статистику, раз пользователь разрешил её показывать
-        all_stats_checklists = await get_all_user_checklists(db, user.id)
         cities, countries = await collect_location_stats(all_stats_checklists)
         total_days = 0
         trips_with_dates = 0
@@ -857,13 +860,12 @@ async def get_public_profile(
             "upcoming_trips": sum(1 for c in all_stats_checklists if c.start_date and c.start_date > datetime.now().date())
         }
 
-    followers = await crud.get_followers(db, user.id)
-    following = await crud.get_following(db, user.id)
+    followers_count, following_count = await crud.get_follow_counts(db, user.id)
     
     is_following = False
     follow_status = None  # null, "following", "requested"
     if current_user:
-        is_following = any(f.id == current_user.id for f in followers)
+        is_following = await crud.is_following(db, current_user.id, user.id)
         if is_following:
             follow_status = "following"
         else:
@@ -881,10 +883,10 @@ async def get_public_profile(
         "bio": user.bio,
         "social_links": user.social_links,
         "is_stats_public": user.is_stats_public,
-        "followers_count": len(followers),
-        "following_count": len(following),
-        "is_following": is_following,
-        "follow_status": follow_status,
+        "followers_count": followers_count,
+        "following_count": following_count,
+        "is_following": is_following,
+        "follow_status": follow_status,
         "stats": stats,
         "checklists": public_checklists,
         "reviews": [build_trip_review_payload(review) for review in public_reviews],
@@ -903,8 +905,7 @@ async def follow_user_endpoint(username: str, user=Depends(require_current_user)
     # If target profile is private, create a follow request instead of direct follow
     if not target_user.is_stats_public:
         # Check if already following
-        followers = await crud.get_followers(db, target_user.id)
-        if any(f.id == user.id for f in followers):
+        if await crud.is_following(db, user.id, target_user.id):
             raise HTTPException(status_code=400, detail="Вы уже подписаны на этого пользователя")
         
         req = await crud.create_follow_request(db, user.id, target_user.id)
@@ -1070,8 +1071,8 @@ async def decline_follow_request_endpoint(request_id: int, user=Depends(require_
 
 @app.get("/my-checklists", response_model=List[schemas.ChecklistOut])
 async def get_my_checklists(
-    user=Depends(require_current_user),
-    db: AsyncSession = Depends(get_db),
+    user=Depends(require_current_read_user),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Получение всех чеклистов текущего пользователя (собственные + совместные)"""
     own_checklists = await crud.get_checklists_by_user_id(db, user.id)
@@ -1202,19 +1203,13 @@ async def compute_achievements(checklists):
 
 async def get_all_user_checklists(db: AsyncSession, user_id: int):
     """Возвращает список всех чеклистов: и собственные, и те, куда добавили"""
-    owned = await crud.get_checklists_by_user_id(db, user_id)
-    shared = await crud.get_shared_checklists_by_user_id(db, user_id)
-    # Объединяем и убираем дубликаты (хотя их быть не должно по логике)
-    all_checklists = {c.id: c for c in owned}
-    for c in shared:
-        all_checklists[c.id] = c
-    return list(all_checklists.values())
+    return list(await crud.get_all_checklists_for_user(db, user_id))
 
 
 @app.get("/my-achievements")
 async def get_my_achievements(
-    user=Depends(require_current_user),
-    db: AsyncSession = Depends(get_db),
+    user=Depends(require_current_read_user),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Достижения и уровень пользователя (включая совместные чеклисты)"""
     checklists = await get_all_user_checklists(db, user.id)
@@ -1251,8 +1246,8 @@ async def get_my_feedback_stats(
 
 @app.get("/my-stats", response_model=StatsResponse)
 async def get_my_stats(
-    user=Depends(require_current_user),
-    db: AsyncSession = Depends(get_db),
+    user=Depends(require_current_read_user),
+    db: AsyncSession = Depends(get_read_db),
 ):
     """Статистика путешествий пользователя (включая совместные)"""
     checklists = await get_all_user_checklists(db, user.id)
@@ -1325,9 +1320,23 @@ END:VCALENDAR"""
 
 # === Feature: Attractions (Google Places + Curated Fallback) ===
 
-ATTRACTIONS_LOCKS = {}
+# Сборка списка (запрос в RapidAPI) — одна на ключ во всех воркерах, см. single_flight.py
+ATTRACTIONS_SINGLE_FLIGHT = ClusterSingleFlight(
+    "attractions",
+    lock_engine if DATABASE_URL.startswith("postgresql") else None,
+    lock_timeout_seconds=float(os.getenv("ATTRACTIONS_LOCK_TIMEOUT_SECONDS", "30")),
+)
+# cache_key -> фоновое обновление (stale-while-revalidate), не больше одного на ключ
+ATTRACTIONS_REFRESH_TASKS: dict[str, asyncio.Task] = {}
 ATTRACTIONS_CACHE_MAX_AGE_DAYS = 60
-ATTRACTION_NAME_CACHE: dict[str, Optional[str]] = {}
+# Локализация названий через Википедию: параллельные поиски и заголовков в одном langlinks-запросе
+WIKIPEDIA_LOCALIZATION_CONCURRENCY = int(os.getenv("WIKIPEDIA_LOCALIZATION_CONCURRENCY", "4"))
+WIKIPEDIA_TITLES_PER_REQUEST = 50
+# «Не найдено» в attraction_name_localizations живёт столько дней, потом имя ищется снова
+NAME_LOCALIZATION_NEGATIVE_TTL_DAYS = int(os.getenv("NAME_LOCALIZATION_NEGATIVE_TTL_DAYS", "30"))
+GOOGLE_PHOTO_HYDRATION_CONCURRENCY = int(os.getenv("GOOGLE_PHOTO_HYDRATION_CONCURRENCY", "4"))
+# Публичный адрес API для ссылок на прокси фото (если сервер за обратным прокси)
+PUBLIC_API_URL = os.getenv("PUBLIC_API_URL", "").strip().rstrip("/")
 
 
 # Топ достопримечательности для популярных городов (en.wikipedia article titles)
@@ -1764,25 +1773,18 @@ async def _restore_google_images_from_cache(
     if not attractions:
         return attractions, False
 
-    normalized_city = city_name.strip().lower()
-    rows = await db.execute(
-        select(models.CityAttraction).where(models.CityAttraction.city_name.like(f"{normalized_city}_%"))
-    )
-    cached_variants = rows.scalars().all()
+    links = [str(attraction.get("link") or "").strip() for attraction in attractions]
+    known_places = await crud.get_attraction_places(db, city_name, [link for link in links if link])
 
     google_by_link: dict[str, str] = {}
     google_by_name: dict[str, str] = {}
-    for variant in cached_variants:
-        if not variant or not variant.data:
+    for place in known_places:
+        image = str(place.image or "").strip()
+        if not _is_google_attraction_image(image):
             continue
-        for item in variant.data:
-            image = str((item or {}).get("image") or "").strip()
-            if not _is_google_attraction_image(image):
-                continue
-            link = str((item or {}).get("link") or "").strip()
-            name = re.sub(r"\s+", " ", str((item or {}).get("name") or "").casefold()).strip()
-            if link and link not in google_by_link:
-                google_by_link[link] = image
+        google_by_link.setdefault(place.link, image)
+        for place_name in (place.names or {}).values():
+            name = re.sub(r"\s+", " ", str(place_name or "").casefold()).strip()
             if name and name not in google_by_name:
                 google_by_name[name] = image
 
@@ -1815,27 +1817,26 @@ async def _restore_localized_names_from_cache(
     if lang != "ru" or not attractions:
         return attractions, False
 
-    normalized_city = city_name.strip().lower()
-    rows = await db.execute(
-        select(models.CityAttraction).where(models.CityAttraction.city_name.like(f"{normalized_city}_%"))
-    )
-    cached_variants = rows.scalars().all()
+    links = [str(attraction.get("link") or "").strip() for attraction in attractions]
+    known_places = await crud.get_attraction_places(db, city_name, [link for link in links if link])
 
     localized_by_cid: dict[str, str] = {}
     localized_by_link: dict[str, str] = {}
-    for variant in cached_variants:
-        if not variant or not variant.data:
+    for place in known_places:
+        names = place.names or {}
+        cached_name = next(
+            (
+                str(name).strip()
+                for name in (names.get("ru"), *names.values())
+                if name and not _needs_ru_attraction_name_localization(str(name).strip(), "ru")
+            ),
+            "",
+        )
+        if not cached_name:
             continue
-        for item in variant.data:
-            cached_name = str((item or {}).get("name") or "").strip()
-            if not cached_name or _needs_ru_attraction_name_localization(cached_name, "ru"):
-                continue
-            cached_link = str((item or {}).get("link") or "").strip()
-            cached_cid = _extract_google_maps_cid(cached_link)
-            if cached_cid and cached_cid not in localized_by_cid:
-                localized_by_cid[cached_cid] = cached_name
-            if cached_link and cached_link not in localized_by_link:
-                localized_by_link[cached_link] = cached_name
+        if place.cid and place.cid not in localized_by_cid:
+            localized_by_cid[place.cid] = cached_name
+        localized_by_link.setdefault(place.link, cached_name)
 
     updated_items: list[dict] = []
     changed = False
@@ -1869,10 +1870,12 @@ def _build_google_places_headers(rapidapi_key: str, field_mask: str) -> dict[str
 async def _search_wikipedia_title(
     query: str,
     wiki_lang: str,
-    client: httpx.AsyncClient,
+    client: httpx.AsyncClient | None = None,
 ) -> Optional[str]:
+    """Заголовок первой статьи из поиска; "" — поиск ничего не нашёл, None — ошибка запроса."""
     if not query:
-        return None
+        return ""
+    client = client or get_http_client("wikipedia")
     try:
         response = await client.get(
             f"https://{wiki_lang}.wikipedia.org/w/api.php",
@@ -1890,24 +1893,128 @@ async def _search_wikipedia_title(
             return None
         pages = (response.json().get("query") or {}).get("search") or []
         if not pages:
-            return None
-        return str(pages[0].get("title") or "").strip() or None
+            return ""
+        return str(pages[0].get("title") or "").strip()
     except Exception:
         return None
 
 
+async def _resolve_ru_titles_via_langlinks(
+    titles: list[str],
+    client: httpx.AsyncClient,
+) -> dict[str, str]:
+    """Русские заголовки статей для английских названий: до 50 заголовков за запрос (langlinks)."""
+    resolved: dict[str, str] = {}
+    for offset in range(0, len(titles), WIKIPEDIA_TITLES_PER_REQUEST):
+        batch = titles[offset:offset + WIKIPEDIA_TITLES_PER_REQUEST]
+        try:
+            response = await client.get(
+                "https://en.wikipedia.org/w/api.php",
+                params={
+                    "action": "query",
+                    "titles": "|".join(batch),
+                    "prop": "langlinks",
+                    "lllang": "ru",
+                    "lllimit": "max",
+                    "redirects": 1,
+                    "format": "json",
+                    "formatversion": 2,
+                    "utf8": 1,
+                },
+                headers={"User-Agent": "Luggify/1.0"},
+            )
+            if response.status_code != 200:
+                continue
+            query = response.json().get("query") or {}
+        except Exception:
+            continue
+
+        # Исходный заголовок -> нормализованный -> после редиректа -> страница
+        renamed = {
+            item.get("from"): item.get("to")
+            for item in (query.get("normalized") or []) + (query.get("redirects") or [])
+        }
+        ru_by_page = {
+            page.get("title"): (page.get("langlinks") or [{}])[0].get("title")
+            for page in query.get("pages") or []
+        }
+        for title in batch:
+            current = title
+            for _ in range(3):
+                if current not in renamed:
+                    break
+                current = renamed[current]
+            ru_title = str(ru_by_page.get(current) or "").strip()
+            if ru_title:
+                resolved[title] = ru_title
+    return resolved
+
+
 async def _localize_attraction_names_with_wikipedia(
+    db: AsyncSession,
     attractions: list[dict],
     city_name: str,
     lang: str,
-    client: httpx.AsyncClient,
+    client: httpx.AsyncClient | None = None,
 ) -> tuple[list[dict], bool]:
     if lang != "ru" or not attractions:
         return attractions, False
 
+    client = client or get_http_client("wikipedia")
+    pending: set[str] = set()
+    for attraction in attractions:
+        current_name = str(attraction.get("name") or "").strip()
+        if _needs_ru_attraction_name_localization(current_name, lang) and not _ATTRACTION_RU_NAME_OVERRIDES.get(
+            current_name.casefold()
+        ):
+            pending.add(current_name)
+
+    # Постоянный кэш: "" — Википедия ничего не нашла, повторно не ищем до истечения TTL
+    localized_by_name = await crud.get_name_localizations(
+        db,
+        "ru",
+        city_name,
+        list(pending),
+        negative_fresh_after=datetime.now() - timedelta(days=NAME_LOCALIZATION_NEGATIVE_TTL_DAYS),
+    ) if pending else {}
+    missing = sorted(pending - localized_by_name.keys())
+    if missing:
+        found: dict[str, str] = {}
+        for name, ru_title in (await _resolve_ru_titles_via_langlinks(missing, client)).items():
+            if not _needs_ru_attraction_name_localization(ru_title, "ru"):
+                found[name] = ru_title
+
+        semaphore = asyncio.Semaphore(WIKIPEDIA_LOCALIZATION_CONCURRENCY)
+
+        async def _search(name: str) -> Optional[str]:
+            failed = False
+            async with semaphore:
+                for query in (
+                    f"intitle:{name} {city_name}",
+                    f"{name} {city_name}",
+                    name,
+                ):
+                    title = await _search_wikipedia_title(query, "ru", client)
+                    if title is None:
+                        failed = True
+                    elif title and not _needs_ru_attraction_name_localization(title, "ru"):
+                        return title
+            # "" сохраняем, только если все поиски честно ответили; после ошибки — None, не кэшируем
+            return None if failed else ""
+
+        searched = [name for name in missing if name not in found]
+        for name, title in zip(searched, await asyncio.gather(*(_search(name) for name in searched))):
+            if title is not None:
+                found[name] = title
+        try:
+            await crud.save_name_localizations(db, "ru", city_name, found)
+        except Exception as e:
+            print(f"Name localization cache save error: {e}")
+            await db.rollback()
+        localized_by_name.update(found)
+
     updated_items: list[dict] = []
     changed = False
-
     for attraction in attractions:
         next_item = dict(attraction)
         current_name = str(attraction.get("name") or "").strip()
@@ -1922,22 +2029,7 @@ async def _localize_attraction_names_with_wikipedia(
             updated_items.append(next_item)
             continue
 
-        cache_key = f"ru:{city_name}:{current_name}".casefold()
-        localized_name = ATTRACTION_NAME_CACHE.get(cache_key)
-        if localized_name is None:
-            for query in (
-                f"intitle:{current_name} {city_name}",
-                f"{current_name} {city_name}",
-                current_name,
-            ):
-                localized_name = await _search_wikipedia_title(query, "ru", client)
-                if localized_name and not _needs_ru_attraction_name_localization(localized_name, "ru"):
-                    break
-            ATTRACTION_NAME_CACHE[cache_key] = localized_name or ""
-
-        if localized_name == "":
-            localized_name = None
-
+        localized_name = localized_by_name.get(current_name)
         if localized_name and not _needs_ru_attraction_name_localization(localized_name, "ru"):
             next_item["name"] = localized_name
             changed = localized_name != current_name or changed
@@ -1952,11 +2044,13 @@ async def _localize_attraction_names_with_google(
     city_name: str,
     lang: str,
     rapidapi_key: str,
-    client: httpx.AsyncClient,
+    client: httpx.AsyncClient | None = None,
+    priority: int = PRIORITY_INTERACTIVE,
 ) -> tuple[list[dict], bool]:
     if lang != "ru" or not rapidapi_key or not attractions:
         return attractions, False
 
+    client = client or get_http_client("google_places")
     search_url = "https://google-map-places-new-v2.p.rapidapi.com/v1/places:searchText"
     headers = _build_google_places_headers(
         rapidapi_key,
@@ -1972,6 +2066,11 @@ async def _localize_attraction_names_with_google(
             updated_items.append(next_item)
             continue
 
+        if not await acquire_quota("google_places", priority):
+            # Бюджет исчерпан: остальные имена переведёт Википедия/словарь
+            updated_items.append(next_item)
+            continue
+
         current_link = str(attraction.get("link") or "").strip()
         current_cid = _extract_google_maps_cid(current_link)
         try:
@@ -1984,6 +2083,8 @@ async def _localize_attraction_names_with_google(
                 },
                 headers=headers,
             )
+            if response.status_code == 429:
+                QUOTAS["google_places"].backoff(60)
             if response.status_code != 200:
                 updated_items.append(next_item)
                 continue
@@ -2037,46 +2138,51 @@ async def _hydrate_google_photos_for_final_attractions(
     attractions: list[dict],
     photo_ref_by_link: dict[str, str],
     rapidapi_key: str,
-    client: httpx.AsyncClient,
+    client: httpx.AsyncClient | None = None,
+    priority: int = PRIORITY_INTERACTIVE,
 ) -> tuple[list[dict], bool]:
     if not attractions or not rapidapi_key or not photo_ref_by_link:
         return attractions, False
 
-    updated_items: list[dict] = []
-    changed = False
-    for attraction in attractions:
+    client = client or get_http_client("google_places")
+    semaphore = asyncio.Semaphore(GOOGLE_PHOTO_HYDRATION_CONCURRENCY)
+
+    async def _hydrate(attraction: dict) -> tuple[dict, bool]:
         next_item = dict(attraction)
         current_image = str(attraction.get("image") or "").strip()
         if _is_google_attraction_image(current_image):
-            updated_items.append(next_item)
-            continue
+            return next_item, False
 
         link = str(attraction.get("link") or "").strip()
         photo_ref = str(photo_ref_by_link.get(link) or "").strip()
         if not photo_ref:
-            updated_items.append(next_item)
-            continue
+            return next_item, False
 
         try:
-            photo_resp = await client.get(
-                f"https://google-map-places-new-v2.p.rapidapi.com/v1/{photo_ref}/media",
-                headers={
-                    "x-rapidapi-key": rapidapi_key,
-                    "x-rapidapi-host": "google-map-places-new-v2.p.rapidapi.com",
-                },
-                params={"maxWidthPx": "800", "skipHttpRedirect": "true"},
-            )
+            async with semaphore:
+                if not await acquire_quota("google_places", priority):
+                    return next_item, False
+                photo_resp = await client.get(
+                    f"https://google-map-places-new-v2.p.rapidapi.com/v1/{photo_ref}/media",
+                    headers={
+                        "x-rapidapi-key": rapidapi_key,
+                        "x-rapidapi-host": "google-map-places-new-v2.p.rapidapi.com",
+                    },
+                    params={"maxWidthPx": "800", "skipHttpRedirect": "true"},
+                )
+            if photo_resp.status_code == 429:
+                QUOTAS["google_places"].backoff(60)
             if photo_resp.status_code == 200:
                 image_url = str(photo_resp.json().get("photoUri") or "").strip()
                 if image_url and image_url != current_image:
                     next_item["image"] = image_url
-                    changed = True
+                    return next_item, True
         except Exception:
             pass
+        return next_item, False
 
-        updated_items.append(next_item)
-
-    return updated_items, changed
+    hydrated = await asyncio.gather(*(_hydrate(attraction) for attraction in attractions))
+    return [item for item, _ in hydrated], any(changed for _, changed in hydrated)
 
 
 def _select_best_google_photo_ref(photos: list[dict] | None) -> str:
@@ -2126,276 +2232,477 @@ def _build_curated_attractions(city_name: str, limit: int) -> list[dict]:
         )
     return results
 
+async def _rebuild_cached_attractions(
+    db: AsyncSession,
+    city_name: str,
+    cache_key: str,
+    attractions: list[dict],
+    curated_results: list[dict],
+    lang: str,
+    limit: int,
+    rapidapi_key: str,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> tuple[list[dict], bool]:
+    """Привести закэшированный список к финальному виду (фильтры, курируемые, имена, фото)."""
+    merge_limit = max(limit * 2, limit)
+    sanitized_cached, changed = _sanitize_attractions(attractions or [], limit)
+    merged_cached = _merge_attractions(sanitized_cached, curated_results, merge_limit)
+    changed = changed or len(merged_cached) != len(sanitized_cached)
+    merged_cached, restored_names = await _restore_localized_names_from_cache(
+        db,
+        city_name,
+        merged_cached,
+        lang,
+    )
+    changed = changed or restored_names
+    merged_cached, restored_google = await _restore_google_images_from_cache(
+        db,
+        city_name,
+        cache_key,
+        merged_cached,
+    )
+    changed = changed or restored_google
+    needs_name_refresh = bool(rapidapi_key) and _cached_attractions_need_name_refresh(merged_cached, lang)
+    if needs_name_refresh:
+        merged_cached, localized_changed = await _localize_attraction_names_with_google(
+            merged_cached,
+            city_name,
+            lang,
+            rapidapi_key,
+            priority=priority,
+        )
+        changed = changed or localized_changed
+        merged_cached, wiki_changed = await _localize_attraction_names_with_wikipedia(
+            db,
+            merged_cached,
+            city_name,
+            lang,
+        )
+        changed = changed or wiki_changed
+        merged_cached, fallback_changed = _apply_fallback_ru_name_translation(merged_cached, lang)
+        changed = changed or fallback_changed
+    return _finalize_attractions(merged_cached, limit), changed
+
+
+def _attractions_need_refresh(attractions: list[dict], lang: str) -> bool:
+    return _cached_attractions_need_google_refresh(attractions or []) or _cached_attractions_need_name_refresh(
+        attractions or [], lang
+    )
+
+
+async def _get_cached_attractions(db: AsyncSession, cache_key: str, lang: str):
+    """Запись кэша и её список мест: поиск по ключу + один IN-запрос по id мест."""
+    cached_obj = await crud.get_city_attractions(db, cache_key)
+    if not cached_obj:
+        return None, []
+    places = await crud.get_attraction_places_by_ids(db, cached_obj.place_ids or [])
+    attractions = []
+    for place_id in cached_obj.place_ids or []:
+        place = places.get(place_id)
+        if not place:
+            continue
+        names = place.names or {}
+        attractions.append({
+            "name": names.get(lang) or next(iter(names.values()), ""),
+            "image": place.image,
+            "link": place.link,
+        })
+    return cached_obj, attractions
+
+
+async def _save_attractions(
+    db: AsyncSession,
+    cache_key: str,
+    city_name: str,
+    attractions: list[dict],
+    lang: str,
+    place_details: dict[str, dict] | None = None,
+):
+    """Сохранить места в attraction_places и их порядок в city_attractions.
+
+    place_details — дополнительные поля мест по ссылке (photo_ref, rating) из Google Places.
+    """
+    place_details = place_details or {}
+    attractions = [
+        {
+            **attraction,
+            "link": str(attraction.get("link") or "").strip()
+            or f"https://www.google.com/maps/search/?api=1&query={url_quote(str(attraction.get('name')) + ', ' + city_name)}",
+        }
+        for attraction in attractions
+    ]
+    place_ids_by_link = await crud.upsert_attraction_places(
+        db,
+        city_name,
+        lang,
+        [
+            {
+                **place_details.get(attraction["link"], {}),
+                "link": attraction["link"],
+                "cid": _extract_google_maps_cid(attraction["link"]),
+                "name": attraction["name"],
+                "image": attraction.get("image"),
+            }
+            for attraction in attractions
+        ],
+    )
+    # Флаг считаем при записи, чтобы на чтении не разбирать список
+    cached_obj = await crud.save_city_attractions(
+        db,
+        cache_key,
+        [place_ids_by_link[attraction["link"]] for attraction in attractions],
+        needs_refresh=_attractions_need_refresh(attractions, lang),
+    )
+    return cached_obj, attractions
+
+
+def _attractions_cache_is_stale(cached_obj, rapidapi_key: str) -> bool:
+    if (datetime.now() - cached_obj.updated_at).days >= ATTRACTIONS_CACHE_MAX_AGE_DAYS:
+        return True
+    return bool(rapidapi_key) and bool(cached_obj.needs_refresh)
+
+
+def _schedule_attractions_refresh(city_name: str, lang: str, limit: int, cache_key: str) -> None:
+    """Stale-while-revalidate: обновить запись в фоне, ответ отдаётся из кэша сразу."""
+    if cache_key in ATTRACTIONS_REFRESH_TASKS:
+        return
+
+    async def _refresh():
+        try:
+            await _load_attractions(city_name, lang, limit, PRIORITY_BACKGROUND)
+        except Exception as e:
+            print(f"Attractions refresh error ({cache_key}): {e}")
+        finally:
+            ATTRACTIONS_REFRESH_TASKS.pop(cache_key, None)
+
+    ATTRACTIONS_REFRESH_TASKS[cache_key] = create_untracked_task(_refresh())
+
+
+def _proxied_attraction_images(attractions: list[dict], base_url: str) -> list[dict]:
+    """Ссылки на фото провайдеров -> наш прокси (фото с диска, не протухают)."""
+    proxied = []
+    for attraction in attractions:
+        image = attraction.get("image")
+        if is_proxyable_image(image):
+            attraction = {
+                **attraction,
+                "image": f"{base_url}/attractions/image?src={url_quote(image, safe='')}&w={IMAGE_PROXY_DEFAULT_WIDTH}",
+            }
+        proxied.append(attraction)
+    return proxied
+
+
 @app.get("/attractions")
 async def get_attractions(
+    request: Request,
     city: str = Query(...),
     lang: str = Query("ru"),
     limit: int = Query(10),
     db: AsyncSession = Depends(get_db)  # Add DB dependency
 ):
     """Достопримечательности (Google Places API V2 + DB cache)."""
-    city_name = city.split(",")[0].strip()
+    base_url = PUBLIC_API_URL or str(request.base_url).rstrip("/")
+    return await _attractions_payload(db, city.split(",")[0].strip(), lang, limit, base_url)
+
+
+async def _attractions_payload(db: AsyncSession, city_name: str, lang: str, limit: int, base_url: str) -> dict:
+    cache_key = f"{city_name}_{lang}_{limit}".lower()
+    rapidapi_key = os.getenv("RAPIDAPI_KEY", "").strip()
+
+    # 1. Кэш: в записи уже финальный список, один поиск по уникальному индексу
+    cached_obj, cached_attractions = await _get_cached_attractions(db, cache_key, lang)
+    if cached_obj:
+        if _attractions_cache_is_stale(cached_obj, rapidapi_key):
+            _schedule_attractions_refresh(city_name, lang, limit, cache_key)
+        return {"attractions": _proxied_attraction_images(cached_attractions, base_url)}
+
+    result = await _load_attractions(city_name, lang, limit)
+    return {"attractions": _proxied_attraction_images(result["attractions"], base_url)}
+
+
+@app.get("/attractions/image")
+async def get_attraction_image(
+    request: Request,
+    src: str = Query(...),
+    w: int = Query(IMAGE_PROXY_DEFAULT_WIDTH),
+):
+    """Уменьшенное фото достопримечательности из локального кэша (скачивается один раз)."""
+    if not is_proxyable_image(src):
+        raise HTTPException(status_code=400, detail="Unsupported image source")
+    width = min(IMAGE_PROXY_WIDTHS, key=lambda allowed: abs(allowed - w))
+    try:
+        path, etag = await get_image_variant(src, width)
+    except ImageProxyError as e:
+        print(f"Image proxy error: {e}")
+        # Отдаём хотя бы оригинал — клиент загрузит его напрямую
+        return RedirectResponse(src, status_code=307)
+
+    headers = {"Cache-Control": IMAGE_CACHE_CONTROL, "ETag": etag}
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return FileResponse(path, media_type="image/jpeg", headers=headers)
+
+
+async def _load_attractions(city_name: str, lang: str, limit: int, priority: int = PRIORITY_INTERACTIVE) -> dict:
+    """Собрать список заново, не больше одного сборщика на ключ во всём кластере."""
+    cache_key = f"{city_name}_{lang}_{limit}".lower()
+    requested_at = datetime.now()
+
+    async def _build():
+        async with SessionLocal() as session:
+            return await _build_attractions(session, city_name, lang, limit, requested_at, priority)
+
+    return await ATTRACTIONS_SINGLE_FLIGHT.run(cache_key, _build)
+
+
+async def _build_attractions(
+    db: AsyncSession,
+    city_name: str,
+    lang: str,
+    limit: int,
+    requested_at: datetime,
+    priority: int = PRIORITY_INTERACTIVE,
+) -> dict:
+    """Собрать список заново (Google Places / курируемые) и сохранить финальный вариант в кэш."""
     cache_key = f"{city_name}_{lang}_{limit}".lower()
     merge_limit = max(limit * 2, limit)
     rapidapi_key = os.getenv("RAPIDAPI_KEY", "").strip()
     curated_results = _build_curated_attractions(city_name, merge_limit) if lang == "en" else []
-    
-    # 1. Поиск в БД (Кэш)
-    cached_obj = await crud.get_city_attractions(db, cache_key)
+
+    # Двойная проверка: пока ждали блокировку, другой воркер мог уже сохранить результат
+    cached_obj, cached_attractions = await _get_cached_attractions(db, cache_key, lang)
+    if cached_obj and (
+        not _attractions_cache_is_stale(cached_obj, rapidapi_key) or cached_obj.updated_at >= requested_at
+    ):
+        return {"attractions": cached_attractions}
     if cached_obj:
-        sanitized_cached, changed = _sanitize_attractions(cached_obj.data or [], limit)
-        merged_cached = _merge_attractions(sanitized_cached, curated_results, merge_limit)
-        changed = changed or len(merged_cached) != len(sanitized_cached)
-        merged_cached, restored_names = await _restore_localized_names_from_cache(
-            db,
-            city_name,
-            merged_cached,
-            lang,
+        hydrated_cached, changed = await _rebuild_cached_attractions(
+            db, city_name, cache_key, cached_attractions, curated_results, lang, limit, rapidapi_key, priority
         )
-        changed = changed or restored_names
-        merged_cached, restored_google = await _restore_google_images_from_cache(
-            db,
-            city_name,
-            cache_key,
-            merged_cached,
-        )
-        changed = changed or restored_google
-        needs_name_refresh = bool(rapidapi_key) and _cached_attractions_need_name_refresh(merged_cached, lang)
-        if needs_name_refresh:
-            async with httpx.AsyncClient(timeout=30) as client:
-                merged_cached, localized_changed = await _localize_attraction_names_with_google(
-                    merged_cached,
-                    city_name,
-                    lang,
-                    rapidapi_key,
-                    client,
-                )
-                changed = changed or localized_changed
-                merged_cached, wiki_changed = await _localize_attraction_names_with_wikipedia(
-                    merged_cached,
-                    city_name,
-                    lang,
-                    client,
-                )
-                changed = changed or wiki_changed
-            merged_cached, fallback_changed = _apply_fallback_ru_name_translation(merged_cached, lang)
-            changed = changed or fallback_changed
-        hydrated_cached = _finalize_attractions(merged_cached, limit)
         if changed:
-            cached_obj = await crud.save_city_attractions(db, cache_key, hydrated_cached)
-        should_refresh_from_google = bool(rapidapi_key) and (
-            _cached_attractions_need_google_refresh(cached_obj.data or [])
-            or _cached_attractions_need_name_refresh(cached_obj.data or [], lang)
-        )
-        if (datetime.now() - cached_obj.updated_at).days < ATTRACTIONS_CACHE_MAX_AGE_DAYS and not should_refresh_from_google:
-            return {"attractions": cached_obj.data}
-
-    # Lock для ин-мемори (если несколько юзеров одновременно запросили новый город)
-    if cache_key not in ATTRACTIONS_LOCKS:
-        ATTRACTIONS_LOCKS[cache_key] = asyncio.Lock()
-
-    async with ATTRACTIONS_LOCKS[cache_key]:
-        # Двойная проверка на случай, если другой таск уже сохранил
-        cached_obj = await crud.get_city_attractions(db, cache_key)
-        if cached_obj:
-            sanitized_cached, changed = _sanitize_attractions(cached_obj.data or [], limit)
-            merged_cached = _merge_attractions(sanitized_cached, curated_results, merge_limit)
-            changed = changed or len(merged_cached) != len(sanitized_cached)
-            merged_cached, restored_names = await _restore_localized_names_from_cache(
+            cached_obj, cached_attractions = await _save_attractions(
+                db, cache_key, city_name, hydrated_cached, lang
+            )
+        if not _attractions_cache_is_stale(cached_obj, rapidapi_key):
+            return {"attractions": cached_attractions}
+
+    results = []
+
+    async def return_fallback_results():
+        _, fallback_attractions = await _get_cached_attractions(db, cache_key, lang)
+        if fallback_attractions:
+            hydrated_cached, changed = await _rebuild_cached_attractions(
+                db, city_name, cache_key, fallback_attractions, curated_results, lang, limit, rapidapi_key, priority
+            )
+            if changed:
+                _, fallback_attractions = await _save_attractions(
+                    db, cache_key, city_name, hydrated_cached, lang
+                )
+            return {"attractions": fallback_attractions}
+        if curated_results:
+            fallback_curated_results, _ = _sanitize_attractions(curated_results, limit)
+            fallback_curated_results, _ = await _restore_localized_names_from_cache(
                 db,
                 city_name,
-                merged_cached,
+                fallback_curated_results,
                 lang,
             )
-            changed = changed or restored_names
-            merged_cached, restored_google = await _restore_google_images_from_cache(
+            fallback_curated_results, _ = await _restore_google_images_from_cache(
                 db,
                 city_name,
                 cache_key,
-                merged_cached,
+                fallback_curated_results,
             )
-            changed = changed or restored_google
-            needs_name_refresh = bool(rapidapi_key) and _cached_attractions_need_name_refresh(merged_cached, lang)
-            if needs_name_refresh:
-                async with httpx.AsyncClient(timeout=30) as client:
-                    merged_cached, localized_changed = await _localize_attraction_names_with_google(
-                        merged_cached,
-                        city_name,
-                        lang,
-                        rapidapi_key,
-                        client,
-                    )
-                    changed = changed or localized_changed
-                    merged_cached, wiki_changed = await _localize_attraction_names_with_wikipedia(
-                        merged_cached,
-                        city_name,
-                        lang,
-                        client,
-                    )
-                    changed = changed or wiki_changed
-                merged_cached, fallback_changed = _apply_fallback_ru_name_translation(merged_cached, lang)
-                changed = changed or fallback_changed
-            hydrated_cached = _finalize_attractions(merged_cached, limit)
-            if changed:
-                cached_obj = await crud.save_city_attractions(db, cache_key, hydrated_cached)
-        should_refresh_from_google = bool(rapidapi_key) and (
-            _cached_attractions_need_google_refresh((cached_obj.data if cached_obj else []) or [])
-            or _cached_attractions_need_name_refresh((cached_obj.data if cached_obj else []) or [], lang)
+            hydrated_curated = _finalize_attractions(fallback_curated_results, limit)
+            _, hydrated_curated = await _save_attractions(db, cache_key, city_name, hydrated_curated, lang)
+            return {"attractions": hydrated_curated}
+        return {"attractions": []}
+
+    try:
+        if not rapidapi_key:
+            return await return_fallback_results()
+        if not await acquire_quota("google_places", priority):
+            # Месячный бюджет RapidAPI на исходе: отдаём кэш/курируемые, запись останется устаревшей
+            print(f"Google Places quota exhausted, serving cached attractions for {city_name}")
+            return await return_fallback_results()
+
+        url = "https://google-map-places-new-v2.p.rapidapi.com/v1/places:searchText"
+        max_result_count = min(max(limit * 3, limit), 20)
+        payload = {
+            "textQuery": f"top landmarks and tourist attractions in {city_name}",
+            "languageCode": lang,
+            "maxResultCount": max_result_count
+        }
+        headers = _build_google_places_headers(
+            rapidapi_key,
+            "places.displayName,places.rating,places.googleMapsUri,places.userRatingCount,places.photos",
         )
-        if cached_obj and (datetime.now() - cached_obj.updated_at).days < ATTRACTIONS_CACHE_MAX_AGE_DAYS and not should_refresh_from_google:
-            return {"attractions": cached_obj.data}
-
-        results = []
-
-        async def return_fallback_results():
-            cached_fallback = await crud.get_city_attractions(db, cache_key)
-            if cached_fallback and cached_fallback.data:
-                sanitized_cached, changed = _sanitize_attractions(cached_fallback.data or [], limit)
-                merged_cached = _merge_attractions(sanitized_cached, curated_results, merge_limit)
-                changed = changed or len(merged_cached) != len(sanitized_cached)
-                merged_cached, restored_names = await _restore_localized_names_from_cache(
-                    db,
-                    city_name,
-                    merged_cached,
-                    lang,
-                )
-                changed = changed or restored_names
-                merged_cached, restored_google = await _restore_google_images_from_cache(
-                    db,
-                    city_name,
-                    cache_key,
-                    merged_cached,
-                )
-                changed = changed or restored_google
-                needs_name_refresh = bool(rapidapi_key) and _cached_attractions_need_name_refresh(merged_cached, lang)
-                if needs_name_refresh:
-                    async with httpx.AsyncClient(timeout=30) as client:
-                        merged_cached, localized_changed = await _localize_attraction_names_with_google(
-                            merged_cached,
-                            city_name,
-                            lang,
-                            rapidapi_key,
-                            client,
-                        )
-                        changed = changed or localized_changed
-                        merged_cached, wiki_changed = await _localize_attraction_names_with_wikipedia(
-                            merged_cached,
-                            city_name,
-                            lang,
-                            client,
-                        )
-                        changed = changed or wiki_changed
-                    merged_cached, fallback_changed = _apply_fallback_ru_name_translation(merged_cached, lang)
-                    changed = changed or fallback_changed
-                hydrated_cached = _finalize_attractions(merged_cached, limit)
-                if changed:
-                    cached_fallback = await crud.save_city_attractions(db, cache_key, hydrated_cached)
-                return {"attractions": cached_fallback.data}
-            if curated_results:
-                fallback_curated_results, _ = _sanitize_attractions(curated_results, limit)
-                fallback_curated_results, _ = await _restore_localized_names_from_cache(
-                    db,
-                    city_name,
-                    fallback_curated_results,
-                    lang,
-                )
-                fallback_curated_results, _ = await _restore_google_images_from_cache(
-                    db,
-                    city_name,
-                    cache_key,
-                    fallback_curated_results,
-                )
-                hydrated_curated = _finalize_attractions(fallback_curated_results, limit)
-                await crud.save_city_attractions(db, cache_key, hydrated_curated)
-                return {"attractions": hydrated_curated}
-            return {"attractions": []}
+        photo_ref_by_link: dict[str, str] = {}
+        place_details_by_link: dict[str, dict] = {}
 
-        try:
-            if not rapidapi_key:
-                return await return_fallback_results()
-
-            url = "https://google-map-places-new-v2.p.rapidapi.com/v1/places:searchText"
-            max_result_count = min(max(limit * 3, limit), 20)
-            payload = {
-                "textQuery": f"top landmarks and tourist attractions in {city_name}",
-                "languageCode": lang,
-                "maxResultCount": max_result_count
-            }
-            headers = _build_google_places_headers(
+        client = get_http_client("google_places")
+        resp = await client.post(url, json=payload, headers=headers)
+        if resp.status_code == 429:
+            QUOTAS["google_places"].backoff(60)
+        if resp.status_code == 200:
+            places = resp.json().get("places", [])
+        else:
+            print(f"RapidAPI returned {resp.status_code}: {resp.text}")
+            places = []
+
+        if not places:
+            return await return_fallback_results()
+            
+        for p in places:
+            name = p.get("displayName", {}).get("text", "")
+            if not name:
+                continue
+                
+            maps_url = p.get("googleMapsUri", f"https://www.google.com/maps/search/?api=1&query={url_quote(name + ', ' + city_name)}")
+
+            photos = p.get("photos", [])
+            if photos:
+                photo_ref = _select_best_google_photo_ref(photos)
+                if photo_ref and maps_url and maps_url not in photo_ref_by_link:
+                    photo_ref_by_link[maps_url] = photo_ref
+            place_details_by_link.setdefault(maps_url, {
+                "photo_ref": photo_ref_by_link.get(maps_url),
+                "rating": p.get("rating"),
+            })
+
+            results.append({
+                "name": name,
+                "image": None,
+                "link": maps_url,
+            })
+
+        if results:
+            results, _ = _sanitize_attractions(results, limit)
+            results = _merge_attractions(results, curated_results, merge_limit)
+            results, _ = await _restore_localized_names_from_cache(
+                db,
+                city_name,
+                results,
+                lang,
+            )
+            results, _ = await _restore_google_images_from_cache(
+                db,
+                city_name,
+                cache_key,
+                results,
+            )
+            results = _finalize_attractions(results, limit)
+            results, _ = await _localize_attraction_names_with_google(
+                results, city_name, lang, rapidapi_key, priority=priority
+            )
+            results, _ = await _localize_attraction_names_with_wikipedia(db, results, city_name, lang)
+            results, _ = _apply_fallback_ru_name_translation(results, lang)
+            results, _ = await _hydrate_google_photos_for_final_attractions(
+                results,
+                photo_ref_by_link,
                 rapidapi_key,
-                "places.displayName,places.rating,places.googleMapsUri,places.userRatingCount,places.photos",
+                priority=priority,
             )
-            photo_ref_by_link: dict[str, str] = {}
-
-            async with httpx.AsyncClient(timeout=30) as client:
-                resp = await client.post(url, json=payload, headers=headers)
-                if resp.status_code == 200:
-                    places = resp.json().get("places", [])
-                else:
-                    print(f"RapidAPI returned {resp.status_code}: {resp.text}")
-                    places = []
-
-                if not places:
-                    return await return_fallback_results()
-                
-                for p in places:
-                    name = p.get("displayName", {}).get("text", "")
-                    if not name:
-                        continue
-                    
-                    maps_url = p.get("googleMapsUri", f"https://www.google.com/maps/search/?api=1&query={url_quote(name + ', ' + city_name)}")
-
-                    photos = p.get("photos", [])
-                    if photos:
-                        photo_ref = _select_best_google_photo_ref(photos)
-                        if photo_ref and maps_url and maps_url not in photo_ref_by_link:
-                            photo_ref_by_link[maps_url] = photo_ref
-
-                    results.append({
-                        "name": name,
-                        "image": None,
-                        "link": maps_url,
-                    })
-
-            if results:
-                results, _ = _sanitize_attractions(results, limit)
-                results = _merge_attractions(results, curated_results, merge_limit)
-                results, _ = await _restore_localized_names_from_cache(
-                    db,
-                    city_name,
-                    results,
-                    lang,
-                )
-                results, _ = await _restore_google_images_from_cache(
-                    db,
-                    city_name,
-                    cache_key,
-                    results,
-                )
-                results = _finalize_attractions(results, limit)
-                async with httpx.AsyncClient(timeout=30) as client:
-                    results, _ = await _localize_attraction_names_with_google(results, city_name, lang, rapidapi_key, client)
-                    results, _ = await _localize_attraction_names_with_wikipedia(results, city_name, lang, client)
-                    results, _ = _apply_fallback_ru_name_translation(results, lang)
-                    results, _ = await _hydrate_google_photos_for_final_attractions(
-                        results,
-                        photo_ref_by_link,
-                        rapidapi_key,
-                        client,
-                    )
-                results = _finalize_attractions(results, limit)
-                await crud.save_city_attractions(db, cache_key, results)
-                return {"attractions": results}
-                
-        except Exception as e:
-            print(f"Attractions API V2 error: {e}")
+            results = _finalize_attractions(results, limit)
+            _, results = await _save_attractions(
+                db, cache_key, city_name, results, lang, place_details=place_details_by_link
+            )
+            return {"attractions": results}
             
-        return await return_fallback_results()
+    except Exception as e:
+        print(f"Attractions API V2 error: {e}")
+        
+    return await return_fallback_results()
 
 
 # === Feature: Flight Search (Travelpayouts) ===
 TRAVELPAYOUTS_TOKEN = os.getenv("TRAVELPAYOUTS_TOKEN", "")
 
+
+def _geo_city_name(geo: Optional[dict]) -> str:
+    """Название города из ответа геокодера (первая часть display_name)."""
+    return ((geo or {}).get("display_name") or "").split(",")[0].strip()
+
+
+async def _empty_iata_code() -> str:
+    return ""
+
+
+async def _empty_fares() -> list[dict]:
+    return []
+
+
+async def _lookup_iata_code(client: httpx.AsyncClient, term: str, locale: str) -> str:
+    try:
+        resp = await client.get(
+            "https://autocomplete.travelpayouts.com/places2",
+            params={"term": term, "locale": locale, "types[]": "city"}
+        )
+        if resp.status_code == 200 and resp.json():
+            return resp.json()[0].get("code", "")
+    except Exception as e:
+        print(f"IATA lookup error for {term}: {e}")
+    return ""
+
+
+async def _resolve_iata_code(
+    client: httpx.AsyncClient, city: str, alias: str = "", cached_only: bool = False
+) -> str:
+    """IATA-код города: кэш (память -> iata_codes), иначе автокомплит Travelpayouts.
+
+    alias — английское название из геокодера, пробуется, если по написанию
+    пользователя Travelpayouts ничего не нашёл.
+    """
+    term = city.split(",")[0].strip()
+    if not term:
+        return ""
+    code = await FLIGHT_CACHE.get_iata(term)
+    if code or cached_only:
+        return code or ""
+    code = await _lookup_iata_code(client, term, "ru")
+    if not code and alias and alias.lower() != term.lower():
+        code = await _lookup_iata_code(client, alias, "en")
+    if code:
+        await FLIGHT_CACHE.put_iata(term, code)
+    return code or ""
+
+
+async def _fetch_fares(
+    client: httpx.AsyncClient, origin: str, destination: str, departure_at: str, cached_only: bool = False
+) -> list[dict]:
+    """Сырые цены prices_for_dates на (откуда, куда, дата) с коротким кэшем в памяти.
+
+    cached_only — без запроса к Travelpayouts, годятся и протухшие цены.
+    """
+    if cached_only:
+        return FLIGHT_CACHE.get_stale_fares(origin, destination, departure_at) or []
+    cached = FLIGHT_CACHE.get_fares(origin, destination, departure_at)
+    if cached is not None:
+        return cached
+
+    params = {
+        "token": TRAVELPAYOUTS_TOKEN,
+        "currency": "rub",
+        "limit": 30,
+    }
+    if origin: params["origin"] = origin
+    if destination: params["destination"] = destination
+    if departure_at: params["departure_at"] = departure_at
+
+    try:
+        if not await acquire_quota("travelpayouts"):
+            return []
+        resp = await client.get("https://api.travelpayouts.com/aviasales/v3/prices_for_dates", params=params)
+        if resp.status_code == 429:
+            QUOTAS["travelpayouts"].backoff(60)
+        if resp.status_code != 200:
+            return []
+        fares = resp.json().get("data") or []
+    except Exception:
+        return []
+    FLIGHT_CACHE.put_fares(origin, destination, departure_at, fares)
+    return fares
+
 @app.get("/flights/search")
 async def search_flights(
     destination: str = Query(..., description="City name"),
@@ -2404,178 +2711,132 @@ async def search_flights(
     origin: str = Query(None, description="Origin city name"),
 ):
     """Поиск дешёвых авиабилетов через Travelpayouts API"""
+    return await _search_flights(destination, date, return_date, origin)
+
+
+async def _search_flights(
+    destination: str,
+    date: Optional[str],
+    return_date: Optional[str],
+    origin: Optional[str],
+    geo: Optional[dict] = None,
+    cached_only: bool = False,
+) -> dict:
+    """geo — результат геокодера назначения, если он уже есть у вызывающего (бандл).
+
+    cached_only — собрать ответ только из кэшей, без запросов к Travelpayouts.
+    """
     if not TRAVELPAYOUTS_TOKEN:
         return {"flights": [], "error": "API key not configured"}
 
     try:
-        async with httpx.AsyncClient(timeout=15) as client:
-            # Get IATA code for destination
-            iata_resp = await client.get(
-                "https://autocomplete.travelpayouts.com/places2",
-                params={"term": destination.split(",")[0].strip(), "locale": "ru", "types[]": "city"}
-            )
-            dest_code = ""
-            if iata_resp.status_code == 200 and iata_resp.json():
-                dest_code = iata_resp.json()[0].get("code", "")
-
-            if not dest_code:
-                return {"flights": []}
-
-            # Get IATA code for origin (if provided)
-            origin_code = ""
-            if origin:
-                origin_resp = await client.get(
-                    "https://autocomplete.travelpayouts.com/places2",
-                    params={"term": origin.split(",")[0].strip(), "locale": "ru", "types[]": "city"}
-                )
-                if origin_resp.status_code == 200 and origin_resp.json():
-                    origin_code = origin_resp.json()[0].get("code", "")
-
-            # Search cheap flights
-            params = {
-                "destination": dest_code,
-                "token": TRAVELPAYOUTS_TOKEN,
-                "currency": "rub",
-                "limit": 10,
-            }
-            def format_date_for_url(d_str: str) -> str:
-                if not d_str or len(d_str) < 10: return ""
-                parts = d_str.split("-")
-                return f"{parts[2]}{parts[1]}"
+        client = get_http_client("travelpayouts")
+        # IATA-коды назначения и вылета — параллельно и из кэша
+        dest_code, origin_code = await asyncio.gather(
+            _resolve_iata_code(client, destination, _geo_city_name(geo), cached_only),
+            _resolve_iata_code(client, origin, cached_only=cached_only) if origin else _empty_iata_code(),
+        )
+
+        if not dest_code:
+            return {"flights": []}
 
-            url_depart = format_date_for_url(date)
-            url_return = format_date_for_url(return_date)
+        # Search cheap flights
+        params = {
+            "destination": dest_code,
+            "token": TRAVELPAYOUTS_TOKEN,
+            "currency": "rub",
+            "limit": 10,
+        }
+        def format_date_for_url(d_str: str) -> str:
+            if not d_str or len(d_str) < 10: return ""
+            parts = d_str.split("-")
+            return f"{parts[2]}{parts[1]}"
 
-            generic_link = f"https://www.aviasales.ru/search/{origin_code}{url_depart}{dest_code}{url_return}1"
+        url_depart = format_date_for_url(date)
+        url_return = format_date_for_url(return_date)
 
-            # Helper: выбрать лучший рейс — приоритет прямым (без пересадок)
-            def pick_best_flights(raw_flights, f_origin_default, f_dest_default, flight_type):
-                if not raw_flights:
-                    return []
+        generic_link = f"https://www.aviasales.ru/search/{origin_code}{url_depart}{dest_code}{url_return}1"
+
+        # Helper: выбрать лучший рейс — приоритет прямым (без пересадок)
+        def pick_best_flights(raw_flights, f_origin_default, f_dest_default, flight_type):
+            if not raw_flights:
+                return []
                 
-                parsed = []
-                for f in raw_flights:
-                    f_origin = f.get("origin", f_origin_default)
-                    f_dest = f.get("destination", f_dest_default)
+            parsed = []
+            for f in raw_flights:
+                f_origin = f.get("origin", f_origin_default)
+                f_dest = f.get("destination", f_dest_default)
                     
-                    api_link = f.get("link")
-                    if api_link:
-                        link = f"https://www.aviasales.ru{api_link}"
-                    else:
-                        link = f"https://www.aviasales.ru/search/{f_origin}{url_depart}{f_dest}{url_return}1"
+                api_link = f.get("link")
+                if api_link:
+                    link = f"https://www.aviasales.ru{api_link}"
+                else:
+                    link = f"https://www.aviasales.ru/search/{f_origin}{url_depart}{f_dest}{url_return}1"
                     
-                    duration = f.get("duration_to") or f.get("duration") or 0
+                duration = f.get("duration_to") or f.get("duration") or 0
                     
-                    parsed.append({
-                        "price": f.get("price") or f.get("value") or 999999,
-                        "airline": f.get("airline"),
-                        "departure_at": f.get("departure_at"),
-                        "origin": f_origin,
-                        "destination": f_dest,
-                        "transfers": f.get("transfers", 0),
-                        "duration": duration,
-                        "link": link,
-                        "type": flight_type,
-                    })
-                
-                # Приоритет: самый дешёвый прямой, иначе самый дешёвый
-                direct = [f for f in parsed if f["transfers"] == 0]
-                if direct:
-                    best = min(direct, key=lambda x: x["price"])
-                    best_copy = dict(best)
-                    best_copy["tag"] = "Прямой рейс"
-                    return [best_copy]
-                
-                cheapest = min(parsed, key=lambda x: x["price"])
-                cheapest_copy = dict(cheapest)
-                cheapest_copy["tag"] = "Самый дешёвый"
-                return [cheapest_copy]
-
-            # 1. OUTBOUND FLIGHTS
-            out_params = {
-                "destination": dest_code,
-                "token": TRAVELPAYOUTS_TOKEN,
-                "currency": "rub",
-                "limit": 30,
-            }
-            if origin_code: out_params["origin"] = origin_code
-            if date: out_params["departure_at"] = date
-            
-            outbound = []
-            try:
-                out_resp = await client.get("https://api.travelpayouts.com/aviasales/v3/prices_for_dates", params=out_params)
-                if out_resp.status_code == 200:
-                    raw = out_resp.json().get("data") or []
-                    outbound = pick_best_flights(raw, origin_code, dest_code, "outbound")
-            except Exception: pass
-
-            # 2. INBOUND FLIGHTS
-            inbound = []
-            if return_date and dest_code:
-                # Определяем пункт назначения для обратного рейса
-                inbound_dest = origin_code
-                if not inbound_dest and outbound:
-                    # Используем origin из найденного outbound рейса
-                    inbound_dest = outbound[0].get("origin", "")
+                parsed.append({
+                    "price": f.get("price") or f.get("value") or 999999,
+                    "airline": f.get("airline"),
+                    "departure_at": f.get("departure_at"),
+                    "origin": f_origin,
+                    "destination": f_dest,
+                    "transfers": f.get("transfers", 0),
+                    "duration": duration,
+                    "link": link,
+                    "type": flight_type,
+                })
                 
-                in_params = {
-                    "origin": dest_code,
-                    "token": TRAVELPAYOUTS_TOKEN,
-                    "currency": "rub",
-                    "limit": 30,
-                    "departure_at": return_date,
-                }
-                if inbound_dest:
-                    in_params["destination"] = inbound_dest
+            # Приоритет: самый дешёвый прямой, иначе самый дешёвый
+            direct = [f for f in parsed if f["transfers"] == 0]
+            if direct:
+                best = min(direct, key=lambda x: x["price"])
+                best_copy = dict(best)
+                best_copy["tag"] = "Прямой рейс"
+                return [best_copy]
                 
-                try:
-                    in_resp = await client.get("https://api.travelpayouts.com/aviasales/v3/prices_for_dates", params=in_params)
-                    if in_resp.status_code == 200:
-                        raw = in_resp.json().get("data") or []
-                        inbound = pick_best_flights(raw, dest_code, inbound_dest or "", "inbound")
-                except Exception: pass
-
-            return {"flights": outbound + inbound, "destination_code": dest_code, "generic_link": generic_link}
+            cheapest = min(parsed, key=lambda x: x["price"])
+            cheapest_copy = dict(cheapest)
+            cheapest_copy["tag"] = "Самый дешёвый"
+            return [cheapest_copy]
+
+        # 1. OUTBOUND FLIGHTS + 2. INBOUND FLIGHTS
+        # С известным городом вылета обе стороны запрашиваются параллельно. Без него
+        # пункт назначения обратного рейса берётся из найденного outbound, поэтому по очереди.
+        outbound = []
+        inbound = []
+        if origin_code or not return_date:
+            out_raw, in_raw = await asyncio.gather(
+                _fetch_fares(client, origin_code, dest_code, date or "", cached_only),
+                _fetch_fares(client, dest_code, origin_code, return_date, cached_only) if return_date else _empty_fares(),
+            )
+            outbound = pick_best_flights(out_raw, origin_code, dest_code, "outbound")
+            inbound = pick_best_flights(in_raw, dest_code, origin_code, "inbound")
+        else:
+            outbound = pick_best_flights(
+                await _fetch_fares(client, "", dest_code, date or "", cached_only), "", dest_code, "outbound"
+            )
+            # Используем origin из найденного outbound рейса
+            inbound_dest = outbound[0].get("origin", "") if outbound else ""
+            inbound = pick_best_flights(
+                await _fetch_fares(client, dest_code, inbound_dest, return_date, cached_only), dest_code, inbound_dest, "inbound"
+            )
+
+        return {"flights": outbound + inbound, "destination_code": dest_code, "generic_link": generic_link}
     except Exception as e:
         print(f"Flights error: {e}")
         return {"flights": []}
 
 
-# === Currency Exchange Rates (free, no API key) ===
-
-EXCHANGE_RATES = {}  # currency -> RUB rate
-EXCHANGE_RATES_UPDATED = 0
-EXCHANGE_RATES_TTL = 86400  # 24 часа
-
-async def get_rub_rate(currency: str) -> float:
-    """Получить курс валюты к RUB. Бесплатный API, без ключа."""
-    global EXCHANGE_RATES, EXCHANGE_RATES_UPDATED
-    if currency == "RUB":
-        return 1.0
-    if EXCHANGE_RATES and time.time() - EXCHANGE_RATES_UPDATED < EXCHANGE_RATES_TTL:
-        return EXCHANGE_RATES.get(currency, 0)
-    try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            resp = await client.get("https://open.er-api.com/v6/latest/RUB")
-            if resp.status_code == 200:
-                data = resp.json()
-                rates = data.get("rates", {})
-                # rates содержит: сколько единиц валюты в 1 RUB
-                # Нам нужно наоборот: сколько RUB в 1 единице валюты
-                EXCHANGE_RATES = {cur: 1.0/rate for cur, rate in rates.items() if rate > 0}
-                EXCHANGE_RATES_UPDATED = time.time()
-                print(f"Exchange rates updated: EUR={EXCHANGE_RATES.get('EUR', '?'):.1f}₽, USD={EXCHANGE_RATES.get('USD', '?'):.1f}₽")
-    except Exception as e:
-        print(f"Exchange rates error: {e}")
-    return EXCHANGE_RATES.get(currency, 0)
+# Курсы валют к рублю (free, no API key) — exchange_rates.py: фоновое обновление + снимок в БД
 
 
 # === Feature: Hotel Search (RapidAPI Booking.com - ntd119/booking-com18) ===
 
 RAPIDAPI_KEY = os.getenv("RAPIDAPI_KEY", "")
-HOTELS_LOCATION_CACHE = {}  # key: city_name_lower -> locationId (permanent, city IDs don't change)
-HOTELS_CACHE = {}  # key: (city, check_in, check_out) -> (data, timestamp)
-HOTELS_CACHE_TTL = 604800  # 7 дней — экономим запросы (530/мес, ~265 поисков)
+# Кэш locationId и результатов поиска — hotel_cache.py (Postgres + LRU, ~530 запросов/мес)
+HOTELS_DEFAULT_MIN_RATING = 6.0
+HOTELS_QUOTA_ERROR = "Booking API quota exhausted. Showing mock data."
 
 @app.get("/hotels/search")
 async def search_hotels(
@@ -2586,8 +2847,28 @@ async def search_hotels(
     price_max: int = Query(None, description="Max price per night in RUB"),
     adults: int = Query(2, description="Number of adults"),
     children_ages: str = Query(None, description="Comma-separated children ages"),
+    min_rating: float = Query(None, description="Min review score (0-10)"),
 ):
     """Поиск отелей через RapidAPI booking-com18 (ntd119) — с фото, ценами, рейтингом"""
+    return await _search_hotels(city, check_in, check_out, price_min, price_max, adults, children_ages, min_rating)
+
+
+async def _search_hotels(
+    city: str,
+    check_in: Optional[str],
+    check_out: Optional[str],
+    price_min: Optional[int],
+    price_max: Optional[int],
+    adults: int,
+    children_ages: Optional[str],
+    min_rating: Optional[float],
+    geo: Optional[dict] = None,
+    cached_only: bool = False,
+) -> dict:
+    """geo — результат геокодера города, если он уже есть у вызывающего (бандл).
+
+    cached_only — собрать ответ только из кэшей (в том числе протухших), без запросов к Booking.
+    """
     # Используем полное имя города (напр. "Paris, France") для точного поиска
     city_name = city.strip()
     city_short = city.split(",")[0].strip()  # короткое имя для ссылки на Booking
@@ -2627,7 +2908,10 @@ async def search_hotels(
         "калининград", "владивосток", "анапа", "геленджик", "адлер"
     ]
     
-    is_russia = "россия" in c_lower or "russia" in c_lower or any(rc in c_lower for rc in ru_cities)
+    is_russia = (
+        (geo or {}).get("country_code") == "ru"
+        or "россия" in c_lower or "russia" in c_lower or any(rc in c_lower for rc in ru_cities)
+    )
 
     if is_russia:
         print(f"Hotels search: {city_name} is in Russia. Routing to ru_widgets.")
@@ -2688,95 +2972,75 @@ async def search_hotels(
     # Если ключа нет, возвращаем mock-данные (заглушки) чтобы UI не был пустым
     if not RAPIDAPI_KEY:
         print("No RAPIDAPI_KEY found, returning MOCK hotels data.")
-        return {
-            "hotels": [
-                {
-                    "name": f"Grand Hotel {city_name}",
-                    "stars": 5,
-                    "price_per_night": 12500,
-                    "rating": 9.2,
-                    "image": None,
-                    "review_word": "Превосходно",
-                    "link": f"https://www.booking.com/searchresults.ru.html?ss={city_name}",
-                },
-                {
-                    "name": f"City Center Apartments",
-                    "stars": 4,
-                    "price_per_night": 4500,
-                    "rating": 8.7,
-                    "image": None,
-                    "review_word": "Отлично",
-                    "link": f"https://www.booking.com/searchresults.ru.html?ss={city_name}",
-                },
-                {
-                    "name": f"Budget Hostel {city_name}",
-                    "stars": 2,
-                    "price_per_night": 1200,
-                    "rating": 7.5,
-                    "image": None,
-                    "review_word": "Хорошо",
-                    "link": f"https://www.booking.com/searchresults.ru.html?ss={city_name}",
-                }
-            ],
-            "error": "RAPIDAPI_KEY not configured. Showing mock data."
-        }
+        return _mock_hotels_response(city_name, "RAPIDAPI_KEY not configured. Showing mock data.")
 
     print(f"Hotels search: city='{city_name}', dates={t_check_in}→{t_check_out}, nights={num_nights}")
 
-    # Проверяем кеш
-    cache_key = (city_name.lower(), t_check_in, t_check_out)
-    if cache_key in HOTELS_CACHE:
-        cached_data, cached_at = HOTELS_CACHE[cache_key]
-        if time.time() - cached_at < HOTELS_CACHE_TTL:
-            print(f"Hotels cache hit for {city_name}")
-            return {"hotels": cached_data, "num_nights": num_nights}
-
     try:
-        async with httpx.AsyncClient(timeout=20) as client:
-            headers = {
-                "X-RapidAPI-Key": RAPIDAPI_KEY,
-                "X-RapidAPI-Host": "booking-com18.p.rapidapi.com"
-            }
+        client = get_http_client("booking")
+        headers = {
+            "X-RapidAPI-Key": RAPIDAPI_KEY,
+            "X-RapidAPI-Host": "booking-com18.p.rapidapi.com"
+        }
+
+        # 1. Получаем locationId — кешируем навсегда (city IDs не меняются)
+        location_id = await HOTEL_CACHE.get_location(city_name)
+        if location_id:
+            print(f"Hotels location cache hit for {city_name} -> {location_id[:30]}...")
+        elif cached_only:
+            return {"hotels": []}
+        else:
+            if not await acquire_quota("booking"):
+                print(f"Hotels: booking quota exhausted, returning MOCK hotels for {city_name}")
+                return _mock_hotels_response(city_name, HOTELS_QUOTA_ERROR)
+            ac_resp = await client.get(
+                "https://booking-com18.p.rapidapi.com/stays/auto-complete",
+                headers=headers,
+                params={"query": city_name}
+            )
+
+            if ac_resp.status_code == 429:
+                QUOTAS["booking"].backoff(60)
+            if ac_resp.status_code != 200:
+                print(f"Hotels auto-complete failed: {ac_resp.status_code}")
+                return {"hotels": []}
+
+            ac_data = ac_resp.json()
+            locations = ac_data.get("data", [])
+            if not locations:
+                print(f"No locations found for {city_name}")
+                return {"hotels": []}
 
-            # 1. Получаем locationId — кешируем навсегда (city IDs не меняются)
-            city_key = city_name.lower()
-            if city_key in HOTELS_LOCATION_CACHE:
-                location_id = HOTELS_LOCATION_CACHE[city_key]
-                print(f"Hotels location cache hit for {city_name} -> {location_id[:30]}...")
-            else:
-                ac_resp = await client.get(
-                    "https://booking-com18.p.rapidapi.com/stays/auto-complete",
-                    headers=headers,
-                    params={"query": city_name}
-                )
-
-                if ac_resp.status_code != 200:
-                    print(f"Hotels auto-complete failed: {ac_resp.status_code}")
-                    return {"hotels": []}
-
-                ac_data = ac_resp.json()
-                locations = ac_data.get("data", [])
-                if not locations:
-                    print(f"No locations found for {city_name}")
-                    return {"hotels": []}
-
-                # Фильтруем: только города (dest_type=city), а не отели/регионы
-                city_locations = [l for l in locations if l.get("dest_type") == "city" or l.get("type") == "ci"]
-                if not city_locations:
-                    city_locations = locations  # fallback на все результаты
-
-                # Выбираем город с наибольшим кол-вом отелей (избегаем мелкие города-однофамильцы)
-                best = max(city_locations, key=lambda x: x.get("nr_hotels", 0) or x.get("hotels", 0) or 0)
-                location_id = best.get("id", "")
-                if not location_id:
-                    return {"hotels": []}
-
-                chosen_label = best.get("label", best.get("name", "?"))
-                nr = best.get("nr_hotels") or best.get("hotels") or "?"
-                print(f"Hotels: chose '{chosen_label}' ({nr} hotels) for query '{city_name}'")
-                HOTELS_LOCATION_CACHE[city_key] = location_id
-
-            # 2. Ищем отели
+            # Фильтруем: только города (dest_type=city), а не отели/регионы
+            city_locations = [l for l in locations if l.get("dest_type") == "city" or l.get("type") == "ci"]
+            if not city_locations:
+                city_locations = locations  # fallback на все результаты
+
+            # Выбираем город с наибольшим кол-вом отелей (избегаем мелкие города-однофамильцы)
+            best = max(city_locations, key=lambda x: x.get("nr_hotels", 0) or x.get("hotels", 0) or 0)
+            location_id = best.get("id", "")
+            if not location_id:
+                return {"hotels": []}
+
+            chosen_label = best.get("label", best.get("name", "?"))
+            nr = best.get("nr_hotels") or best.get("hotels") or "?"
+            print(f"Hotels: chose '{chosen_label}' ({nr} hotels) for query '{city_name}'")
+            await HOTEL_CACHE.put_location(city_name, location_id, chosen_label)
+
+        # 2. Сырые результаты на (locationId, даты): из кэша или от провайдера.
+        # Фильтры по цене/рейтингу применяются ниже, поэтому кэш общий для любых фильтров.
+        if cached_only:
+            results = await HOTEL_CACHE.get_stale_results(location_id, d_in, d_out)
+            if results is None:
+                return {"hotels": []}
+        else:
+            results = await HOTEL_CACHE.get_results(location_id, d_in, d_out)
+        if results is not None:
+            print(f"Hotels cache hit for {city_name}")
+        else:
+            if not await acquire_quota("booking"):
+                print(f"Hotels: booking quota exhausted, returning MOCK hotels for {city_name}")
+                return _mock_hotels_response(city_name, HOTELS_QUOTA_ERROR)
             search_resp = await client.get(
                 "https://booking-com18.p.rapidapi.com/stays/search",
                 headers=headers,
@@ -2791,6 +3055,8 @@ async def search_hotels(
                 }
             )
 
+            if search_resp.status_code == 429:
+                QUOTAS["booking"].backoff(60)
             if search_resp.status_code != 200:
                 print(f"Hotels search failed: {search_resp.status_code}")
                 return {"hotels": []}
@@ -2800,94 +3066,12 @@ async def search_hotels(
             if not results:
                 # Попробуем альтернативную структуру
                 results = search_data.get("result", [])
+            if results:
+                await HOTEL_CACHE.put_results(location_id, d_in, d_out, results)
 
-            hotels = []
-            for h in results:  # парсим все ~20 результатов для качественной сортировки
-                # Данные на верхнем уровне (реальная структура API)
-                name = h.get("name", "")
-
-                # Фото — API возвращает square60, заменяем на square600 для качества
-                photo_urls = h.get("photoUrls", [])
-                image = photo_urls[0] if photo_urls else None
-                if image:
-                    image = image.replace("square60", "square600")
-
-                # Рейтинг
-                review_score = h.get("reviewScore")
-                review_word = h.get("reviewScoreWord", "")
-                review_count = h.get("reviewCount", 0) or 0
-
-                # Звёзды (propertyClass или qualityClass)
-                stars = h.get("propertyClass") or h.get("qualityClass") or 0
-
-                # Цена и валюта — API возвращает цену за ВЕСЬ период, делим на ночи
-                price_breakdown = h.get("priceBreakdown", {})
-                gross_price = price_breakdown.get("grossPrice", {})
-                total_price = gross_price.get("value")
-                price = round(total_price / num_nights, 2) if total_price else None
-                currency = gross_price.get("currency", "EUR")
-
-                # Ссылка — самый надежный вариант это поиск по точному имени отеля,
-                # Booking.com отлично его понимает и открывает страницу отеля или показывает его на первом месте (без 404)
-                name_encoded = url_quote(name)
-                link = f"https://www.booking.com/searchresults.html?ss={name_encoded}&checkin={t_check_in}&checkout={t_check_out}&group_adults=1"
-
-                # Конвертируем цену в рубли
-                price_rub = None
-                if price and currency and currency != "RUB":
-                    rub_rate = await get_rub_rate(currency)
-                    if rub_rate > 0:
-                        price_rub = round(price * rub_rate)
-                elif price and currency == "RUB":
-                    price_rub = round(price)
-
-                if name:
-                    hotels.append({
-                        "name": name,
-                        "stars": int(stars) if stars else 0,
-                        "price_per_night": round(price) if price else None,
-                        "price_rub": price_rub,
-                        "currency": currency,
-                        "rating": review_score,
-                        "review_word": review_word,
-                        "review_count": review_count,
-                        "image": image,
-                        "link": link,
-                    })
-
-            # --- Качественная фильтрация и сортировка ---
-            # 1. Убираем отели с рейтингом ниже 6.0 ("Bad", "Poor")
-            hotels = [h for h in hotels if not h["rating"] or h["rating"] >= 6.0]
-            # 2. Сортируем: сначала с отзывами и высоким рейтингом
-            #    (без рейтинга уходят вниз)
-            hotels.sort(key=lambda x: (
-                x["rating"] is not None,      # с рейтингом — вперёд
-                x["rating"] or 0,              # выше рейтинг — выше
-                x["review_count"] or 0,        # больше отзывов — выше
-            ), reverse=True)
-            # 3. Берём топ-10
-            hotels = hotels[:10]
-
-            # Фильтруем по цене (в рублях), если заданы границы
-            if price_min or price_max:
-                filtered = []
-                for h in hotels:
-                    pr = h.get("price_rub")
-                    if pr is None:
-                        continue
-                    if price_min and pr < price_min:
-                        continue
-                    if price_max and pr > price_max:
-                        continue
-                    filtered.append(h)
-                hotels = filtered[:10]
-
-            # Сохраняем в кеш ПОЛНЫЕ результаты (до фильтрации)
-            # Фильтрация по цене применяется каждый раз заново
-            if not (price_min or price_max) and hotels:
-                HOTELS_CACHE[cache_key] = (hotels, time.time())
-
-            return {"hotels": hotels, "num_nights": num_nights}
+        hotels = await _parse_booking_hotels(results, num_nights, t_check_in, t_check_out)
+        hotels = _select_hotels(hotels, price_min, price_max, min_rating)
+        return {"hotels": hotels, "num_nights": num_nights}
     except Exception as e:
         print(f"Hotels error: {e}")
         import traceback
@@ -2895,6 +3079,134 @@ async def search_hotels(
         return {"hotels": []}
 
 
+def _mock_hotels_response(city_name: str, error: str) -> dict:
+    return {
+        "hotels": [
+            {
+                "name": f"Grand Hotel {city_name}",
+                "stars": 5,
+                "price_per_night": 12500,
+                "rating": 9.2,
+                "image": None,
+                "review_word": "Превосходно",
+                "link": f"https://www.booking.com/searchresults.ru.html?ss={city_name}",
+            },
+            {
+                "name": f"City Center Apartments",
+                "stars": 4,
+                "price_per_night": 4500,
+                "rating": 8.7,
+                "image": None,
+                "review_word": "Отлично",
+                "link": f"https://www.booking.com/searchresults.ru.html?ss={city_name}",
+            },
+            {
+                "name": f"Budget Hostel {city_name}",
+                "stars": 2,
+                "price_per_night": 1200,
+                "rating": 7.5,
+                "image": None,
+                "review_word": "Хорошо",
+                "link": f"https://www.booking.com/searchresults.ru.html?ss={city_name}",
+            }
+        ],
+        "error": error
+    }
+
+
+async def _parse_booking_hotels(results: list[dict], num_nights: int, t_check_in: str, t_check_out: str) -> list[dict]:
+    hotels = []
+    prices = []
+    for h in results:  # парсим все ~20 результатов для качественной сортировки
+        # Данные на верхнем уровне (реальная структура API)
+        name = h.get("name", "")
+
+        # Фото — API возвращает square60, заменяем на square600 для качества
+        photo_urls = h.get("photoUrls", [])
+        image = photo_urls[0] if photo_urls else None
+        if image:
+            image = image.replace("square60", "square600")
+
+        # Рейтинг
+        review_score = h.get("reviewScore")
+        review_word = h.get("reviewScoreWord", "")
+        review_count = h.get("reviewCount", 0) or 0
+
+        # Звёзды (propertyClass или qualityClass)
+        stars = h.get("propertyClass") or h.get("qualityClass") or 0
+
+        # Цена и валюта — API возвращает цену за ВЕСЬ период, делим на ночи
+        price_breakdown = h.get("priceBreakdown", {})
+        gross_price = price_breakdown.get("grossPrice", {})
+        total_price = gross_price.get("value")
+        price = round(total_price / num_nights, 2) if total_price else None
+        currency = gross_price.get("currency", "EUR")
+
+        # Ссылка — самый надежный вариант это поиск по точному имени отеля,
+        # Booking.com отлично его понимает и открывает страницу отеля или показывает его на первом месте (без 404)
+        name_encoded = url_quote(name)
+        link = f"https://www.booking.com/searchresults.html?ss={name_encoded}&checkin={t_check_in}&checkout={t_check_out}&group_adults=1"
+
+        if name:
+            hotels.append({
+                "name": name,
+                "stars": int(stars) if stars else 0,
+                "price_per_night": round(price) if price else None,
+                "price_rub": None,
+                "currency": currency,
+                "rating": review_score,
+                "review_word": review_word,
+                "review_count": review_count,
+                "image": image,
+                "link": link,
+            })
+            prices.append(price)
+
+    # Конвертируем цены в рубли одним проходом (по текущему курсу, даже если ответ из кэша)
+    prices_rub = await convert_many(prices, [h["currency"] for h in hotels])
+    for hotel, price_rub in zip(hotels, prices_rub):
+        hotel["price_rub"] = price_rub
+    return hotels
+
+
+def _select_hotels(
+    hotels: list[dict],
+    price_min: Optional[int],
+    price_max: Optional[int],
+    min_rating: Optional[float],
+) -> list[dict]:
+    """Фильтры и сортировка поверх полного закэшированного набора, топ-10."""
+    # 1. Убираем отели с рейтингом ниже порога (по умолчанию 6.0 — "Bad", "Poor")
+    if min_rating is None:
+        hotels = [h for h in hotels if not h["rating"] or h["rating"] >= HOTELS_DEFAULT_MIN_RATING]
+    else:
+        hotels = [h for h in hotels if h["rating"] is not None and h["rating"] >= min_rating]
+
+    # 2. Фильтруем по цене (в рублях), если заданы границы
+    if price_min or price_max:
+        filtered = []
+        for h in hotels:
+            pr = h.get("price_rub")
+            if pr is None:
+                continue
+            if price_min and pr < price_min:
+                continue
+            if price_max and pr > price_max:
+                continue
+            filtered.append(h)
+        hotels = filtered
+
+    # 3. Сортируем: сначала с отзывами и высоким рейтингом
+    #    (без рейтинга уходят вниз)
+    hotels = sorted(hotels, key=lambda x: (
+        x["rating"] is not None,      # с рейтингом — вперёд
+        x["rating"] or 0,              # выше рейтинг — выше
+        x["review_count"] or 0,        # больше отзывов — выше
+    ), reverse=True)
+    # 4. Берём топ-10
+    return hotels[:10]
+
+
 # === Feature: eSIM Search (Airalo via Travelpayouts) ===
 
 TRAVELPAYOUTS_MARKER = os.getenv("TRAVELPAYOUTS_MARKER", "")
@@ -2974,21 +3286,18 @@ async def search_esim(
     lang: str = Query("ru"),
 ):
     """Поиск eSIM пакетов для страны назначения через Airalo (Travelpayouts affiliate)"""
-    city_name = city.split(",")[0].strip()
-
     try:
         # 1. Определяем страну по городу через Nominatim
-        country_en = None
-        async with httpx.AsyncClient(timeout=10) as client:
-            headers = {"User-Agent": "Luggify/1.0 (travel packing app)"}
-            geo_resp = await client.get(NOMINATIM_URL, params={
-                "q": city_name, "format": "json",
-                "accept-language": "en", "limit": 1,
-                "addressdetails": 1,
-            }, headers=headers)
-            if geo_resp.status_code == 200 and geo_resp.json():
-                addr = geo_resp.json()[0].get("address", {})
-                country_en = addr.get("country")
+        geo = await geocode_city(city.split(",")[0].strip(), "en")
+    except Exception as e:
+        print(f"eSIM geocode error: {e}")
+        geo = None
+    return _esim_payload(city, lang, geo)
+
+
+def _esim_payload(city: str, lang: str, geo: Optional[dict]) -> dict:
+    try:
+        country_en = (geo or {}).get("country")
 
         if not country_en:
             # Фоллбэк: пробуем вытащить страну из запятой в названии
@@ -3041,153 +3350,283 @@ async def search_esim(
         }
 
 
-async def get_weather_forecast_data(city: str, start_date: datetime.date, end_date: datetime.date, language: str = "ru") -> List[schemas.DailyForecast]:
-    """Helper to fetch weather forecast for a checklist (used when viewing saved checklists)"""
-    async with httpx.AsyncClient() as client:
-        # 1. Geocoding
-        headers = {"User-Agent": "Luggify/1.0 (travel packing app)"}
-        try:
-            geo_resp = await client.get(NOMINATIM_URL, params={
-                "q": city.split(",")[0].strip(),
-                "format": "json",
-                "accept-language": "ru",
-                "limit": 1,
-            }, headers=headers)
-            if geo_resp.status_code != 200:
-                return []
-            geo_data = geo_resp.json()
-            if not geo_data:
-                return []
-            
-            lat = float(geo_data[0]["lat"])
-            lon = float(geo_data[0]["lon"])
-        except Exception:
-            return []
+# === Trip bundle: все секции страницы поездки одним SSE-потоком ===
 
-        # Dates setup
-        # start_date/end_date passed as date objects
-        today = datetime.now().date()
-        forecast_limit = today + timedelta(days=15)
-        
-        daily_data = {}
+# Бюджет секции в секундах. Не уложилась — сразу уходит заглушка (partial=true), а работа
+# продолжается и досылается тем же событием, если успевает до BUNDLE_STREAM_TIMEOUT_SECONDS.
+# В любом случае она прогревает кэши для следующего открытия.
+BUNDLE_SECTION_DEADLINES = {
+    "attractions": float(os.getenv("BUNDLE_ATTRACTIONS_DEADLINE_SECONDS", "3")),
+    "hotels": float(os.getenv("BUNDLE_HOTELS_DEADLINE_SECONDS", "4")),
+    "flights": float(os.getenv("BUNDLE_FLIGHTS_DEADLINE_SECONDS", "4")),
+    "esim": float(os.getenv("BUNDLE_ESIM_DEADLINE_SECONDS", "2")),
+}
+BUNDLE_STREAM_TIMEOUT_SECONDS = float(os.getenv("BUNDLE_STREAM_TIMEOUT_SECONDS", "20"))
+BUNDLE_ATTRACTIONS_LIMIT = 10
+# Задачи секций переживают отключившегося клиента — держим ссылки, пока не завершатся
+BUNDLE_TASKS: set[asyncio.Task] = set()
 
-        # 2. Forecast (Open-Meteo)
-        if start_date <= forecast_limit:
-            forecast_end = min(end_date, forecast_limit)
-            try:
-                resp = await client.get(OPEN_METEO_FORECAST_URL, params={
-                    "latitude": lat,
-                    "longitude": lon,
-                    "daily": "temperature_2m_max,temperature_2m_min,weathercode",
-                    "timezone": "auto",
-                    "start_date": start_date.strftime("%Y-%m-%d"),
-                    "end_date": forecast_end.strftime("%Y-%m-%d"),
-                })
-                if resp.status_code == 200:
-                    d = resp.json().get("daily", {})
-                    times = d.get("time", [])
-                    maxs = d.get("temperature_2m_max", [])
-                    mins = d.get("temperature_2m_min", [])
-                    codes = d.get("weathercode", [])
-                    for i, t in enumerate(times):
-                        default_desc = "Unknown" if language != "ru" else "Неизвестно"
-                        desc, icon = WMO_CODES.get(language, {}).get(codes[i], (default_desc, "01d"))
-                        daily_data[t] = {
-                            "temp_max": maxs[i],
-                            "temp_min": mins[i],
-                            "weathercode": codes[i],
-                            "condition": desc,
-                            "icon": icon,
-                            "source": "forecast"
-                        }
-            except Exception:
-                pass
 
-        # 3. Historical (if needed)
-        hist_start = max(start_date, forecast_limit + timedelta(days=1))
-        if hist_start <= end_date:
-            try:
-                # Use last year data
-                hist_start_ly = hist_start.replace(year=hist_start.year - 1)
-                hist_end_ly = end_date.replace(year=end_date.year - 1)
-                
-                resp = await client.get(OPEN_METEO_HISTORICAL_URL, params={
-                    "latitude": lat,
-                    "longitude": lon,
-                    "daily": "temperature_2m_max,temperature_2m_min,weathercode",
-                    "timezone": "auto",
-                    "start_date": hist_start_ly.strftime("%Y-%m-%d"),
-                    "end_date": hist_end_ly.strftime("%Y-%m-%d"),
-                })
-                if resp.status_code == 200:
-                    d = resp.json().get("daily", {})
-                    times = d.get("time", [])
-                    maxs = d.get("temperature_2m_max", [])
-                    mins = d.get("temperature_2m_min", [])
-                    codes = d.get("weathercode", [])
-                    
-                    # Compute invalid year diff to map back to requested dates
-                    # But simpler: just iterate and map to hist_start + i days
-                    current_hist_date = hist_start
-                    for i, _ in enumerate(times):
-                        if current_hist_date > end_date: break
-                        
-                        default_desc = "Unknown" if language != "ru" else "Неизвестно"
-                        desc, icon = WMO_CODES.get(language, {}).get(codes[i], (default_desc, "01d"))
-                        date_str = current_hist_date.strftime("%Y-%m-%d")
-                        daily_data[date_str] = {
-                            "temp_max": maxs[i],
-                            "temp_min": mins[i],
-                            "weathercode": codes[i],
-                            "condition": desc,
-                            "icon": icon,
-                            "source": "historical"
-                        }
-                        current_hist_date += timedelta(days=1)
-            except Exception:
-                pass
+def _sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
 
-        # Convert to list
-        result = []
-        for date_str in sorted(daily_data.keys()):
-            item = daily_data[date_str]
-            result.append(schemas.DailyForecast(
-                date=date_str,
-                temp_min=item["temp_min"],
-                temp_max=item["temp_max"],
-                condition=item["condition"],
-                icon=item["icon"],
-                source=item.get("source", "forecast"),
-                city=item.get("city"),
-                humidity=item.get("humidity"),
-                uv_index=item.get("uv_index"),
-                wind_speed=item.get("wind_speed")
-            ))
-        return result
+
+def _bundle_trip_context(checklist: ChecklistResponse) -> tuple[str, str, Optional[str], Optional[str]]:
+    """Гео-контекст страницы: первый город маршрута, его короткое имя и даты."""
+    city = (checklist.city or "").split("+")[0].strip()
+    city_name = city.split(",")[0].strip()
+    start_date = checklist.start_date.isoformat() if checklist.start_date else None
+    end_date = checklist.end_date.isoformat() if checklist.end_date else None
+    return city, city_name, start_date, end_date
+
+
+async def _bundle_attractions(city_name: str, lang: str, base_url: str) -> dict:
+    async with SessionLocal() as session:
+        return await _attractions_payload(session, city_name, lang, BUNDLE_ATTRACTIONS_LIMIT, base_url)
+
+
+async def _bundle_geo(city: str, geo_task: asyncio.Task) -> Optional[dict]:
+    """Общий для секций геокод города; shield — чтобы отмена секции не отменила его у остальных."""
+    try:
+        return await asyncio.shield(geo_task)
+    except Exception as e:
+        print(f"Bundle geocode error for {city}: {e}")
+        return None
+
+
+def _bundle_geo_if_ready(geo_task: asyncio.Task) -> Optional[dict]:
+    if geo_task.done() and not geo_task.cancelled() and geo_task.exception() is None:
+        return geo_task.result()
+    return None
+
+
+async def _bundle_esim(city: str, lang: str, geo_task: asyncio.Task) -> dict:
+    return _esim_payload(city, lang, await _bundle_geo(city, geo_task))
+
+
+async def _bundle_hotels(
+    city: str, start_date: Optional[str], end_date: Optional[str], geo_task: asyncio.Task
+) -> dict:
+    return await _search_hotels(
+        city, start_date, end_date, price_min=None, price_max=None, adults=2, children_ages=None,
+        min_rating=None, geo=await _bundle_geo(city, geo_task),
+    )
+
+
+async def _bundle_flights(
+    city: str, start_date: Optional[str], end_date: Optional[str], origin: Optional[str], geo_task: asyncio.Task
+) -> dict:
+    return await _search_flights(city, start_date, end_date, origin, geo=await _bundle_geo(city, geo_task))
+
+
+async def _bundle_stale_attractions(city_name: str, lang: str, base_url: str) -> dict:
+    async with SessionLocal() as session:
+        cache_key = f"{city_name}_{lang}_{BUNDLE_ATTRACTIONS_LIMIT}".lower()
+        _, attractions = await _get_cached_attractions(session, cache_key, lang)
+    if not attractions and lang == "en":
+        attractions = _build_curated_attractions(city_name, BUNDLE_ATTRACTIONS_LIMIT)
+    return {"attractions": _proxied_attraction_images(attractions, base_url)}
+
+
+def _bundle_fallbacks(
+    checklist: ChecklistResponse, lang: str, base_url: str, geo_task: asyncio.Task
+) -> dict[str, Callable[[], Awaitable[dict]]]:
+    """Что отдать секции, не уложившейся в бюджет, пока запрос к провайдеру ещё идёт.
+
+    Данные берутся только из кэшей отелей, перелётов и достопримечательностей — в том
+    числе протухшие: старые цены с пометкой partial лучше пустой секции.
+    """
+    city, city_name, start_date, end_date = _bundle_trip_context(checklist)
+
+    async def esim() -> dict:
+        return _esim_payload(city, lang, _bundle_geo_if_ready(geo_task))
+
+    return {
+        "attractions": lambda: _bundle_stale_attractions(city_name, lang, base_url),
+        "hotels": lambda: _search_hotels(
+            city, start_date, end_date, price_min=None, price_max=None, adults=2, children_ages=None,
+            min_rating=None, geo=_bundle_geo_if_ready(geo_task), cached_only=True,
+        ),
+        "flights": lambda: _search_flights(
+            city, start_date, end_date, checklist.origin_city,
+            geo=_bundle_geo_if_ready(geo_task), cached_only=True,
+        ),
+        "esim": esim,
+    }
+
+
+BUNDLE_EMPTY_SECTIONS = {
+    "attractions": {"attractions": []},
+    "hotels": {"hotels": []},
+    "flights": {"flights": []},
+    "esim": {"esim": None, "browse_link": _build_airalo_affiliate_link("")},
+}
+
+
+async def _bundle_fallback(name: str, fallbacks: dict[str, Callable[[], Awaitable[dict]]]) -> dict:
+    try:
+        payload = await fallbacks[name]()
+    except Exception as e:
+        print(f"Bundle fallback {name} error: {e}")
+        payload = BUNDLE_EMPTY_SECTIONS[name]
+    return {**payload, "partial": True}
+
+
+def _start_bundle_task(coro) -> asyncio.Task:
+    task = asyncio.create_task(coro)
+    BUNDLE_TASKS.add(task)
+    task.add_done_callback(BUNDLE_TASKS.discard)
+    return task
+
+
+async def _trip_bundle_events(checklist: ChecklistResponse, lang: str, base_url: str):
+    yield _sse_event("checklist", checklist)
+
+    # Гео-контекст один раз на всю страницу: геокод города нужен отелям, билетам и eSIM
+    city, city_name, start_date, end_date = _bundle_trip_context(checklist)
+    geo_task = _start_bundle_task(geocode_city(city_name, "en"))
+
+    tasks = {
+        "attractions": _start_bundle_task(_bundle_attractions(city_name, lang, base_url)),
+        "hotels": _start_bundle_task(_bundle_hotels(city, start_date, end_date, geo_task)),
+        "flights": _start_bundle_task(_bundle_flights(city, start_date, end_date, checklist.origin_city, geo_task)),
+        "esim": _start_bundle_task(_bundle_esim(city, lang, geo_task)),
+    }
+    fallbacks = _bundle_fallbacks(checklist, lang, base_url, geo_task)
+    loop = asyncio.get_running_loop()
+    started = loop.time()
+    pending = dict(tasks)
+    missed: set[str] = set()
+
+    while pending:
+        elapsed = loop.time() - started
+        if elapsed >= BUNDLE_STREAM_TIMEOUT_SECONDS:
+            break
+        next_deadline = min(
+            [BUNDLE_SECTION_DEADLINES[name] for name in pending if name not in missed]
+            + [BUNDLE_STREAM_TIMEOUT_SECONDS]
+        )
+        await asyncio.wait(
+            pending.values(),
+            timeout=max(next_deadline - elapsed, 0),
+            return_when=asyncio.FIRST_COMPLETED,
+        )
+        elapsed = loop.time() - started
+        for name, task in list(pending.items()):
+            if task.done():
+                del pending[name]
+                if task.exception() is None:
+                    yield _sse_event(name, {**task.result(), "partial": False})
+                else:
+                    print(f"Bundle section {name} error: {task.exception()}")
+                    if name not in missed:
+                        yield _sse_event(name, await _bundle_fallback(name, fallbacks))
+            elif name not in missed and elapsed >= BUNDLE_SECTION_DEADLINES[name]:
+                missed.add(name)
+                yield _sse_event(name, await _bundle_fallback(name, fallbacks))
+
+    yield _sse_event("done", {"pending": sorted(pending)})
+
+
+@app.get("/trips/{slug}/bundle")
+async def get_trip_bundle(
+    slug: str,
+    request: Request,
+    lang: str = Query("ru"),
+    db: AsyncSession = Depends(get_read_db),
+    user=Depends(get_current_read_user),
+):
+    """Страница поездки одним запросом: чеклист, достопримечательности, отели, билеты, eSIM.
+
+    Server-Sent Events: событие на секцию по мере готовности, затем "done".
+    """
+    checklist = await get_checklist(slug, db, user)
+    base_url = PUBLIC_API_URL or str(request.base_url).rstrip("/")
+    return StreamingResponse(
+        _trip_bundle_events(checklist, lang, base_url),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+NOMINATIM_AUTOCOMPLETE_TIMEOUT = float(os.getenv("NOMINATIM_AUTOCOMPLETE_TIMEOUT", "2"))
+AUTOCOMPLETE_LIMIT = 10
+AUTOCOMPLETE_PROVIDER_LIMIT = 5
+
+
+def _remember_autocomplete_city(index: CityIndex, result: dict, population: int | None = None) -> None:
+    if result.get("lat") is None or result.get("lon") is None:
+        return
+    index.add(
+        City(
+            name_ru=result["name"],
+            name_en="",
+            country=result["country"],
+            country_name_ru=result["country_name"] or "",
+            country_name_en="",
+            admin1=result["admin1"] or "",
+            lat=float(result["lat"]),
+            lon=float(result["lon"]),
+            population=population or 0,
+            source=result["source"],
+        ),
+        [result["name"]],
+    )
 
 
 @app.get("/geo/cities-autocomplete")
 async def autocomplete_cities(namePrefix: str = Query(..., min_length=2)):
     """
-    Гибридный автокомплит: Open-Meteo (быстро, короткие префиксы) + Nominatim (точность, полные названия).
-    Объединяет результаты, убирает дубликаты.
+    Автокомплит: сначала локальный индекс городов (city_index); если он дал меньше
+    AUTOCOMPLETE_LIMIT городов — добираем гибридом Open-Meteo (быстро, короткие префиксы) +
+    Nominatim (точность, полные названия), без городов, которые уже есть в ответе.
+    Результаты внешних провайдеров добавляются в локальный индекс и кэшируются
+    (autocomplete_cache), в том числе для более длинных префиксов.
     """
+    local_results = CITY_INDEX.search(namePrefix, AUTOCOMPLETE_LIMIT)
+    if len(local_results) >= AUTOCOMPLETE_LIMIT:
+        return [city.to_autocomplete() for city in local_results]
+
+    remote_results = await _remote_autocomplete(namePrefix)
+    if not local_results:
+        return remote_results
+
+    # Локальные города первыми; внешние — только те, которых рядом ещё нет
+    response_index = CityIndex()
+    merged = []
+    for city in local_results:
+        merged.append(city.to_autocomplete())
+        _remember_autocomplete_city(response_index, merged[-1])
+    for result in remote_results:
+        if len(merged) >= AUTOCOMPLETE_LIMIT:
+            break
+        if result.get("lat") is not None and result.get("lon") is not None:
+            if response_index.find_near(float(result["lat"]), float(result["lon"])):
+                continue
+        merged.append(result)
+        _remember_autocomplete_city(response_index, result)
+    return merged
+
+
+async def _remote_autocomplete(namePrefix: str) -> list[dict]:
+    """Подсказки Open-Meteo + Nominatim через кэш autocomplete_cache."""
+    cached_results = AUTOCOMPLETE_CACHE.get("ru", namePrefix)
+    if cached_results is not None:
+        return cached_results
+
     results_open_meteo = []
     results_nominatim = []
 
     async def fetch_open_meteo():
         url = "https://geocoding-api.open-meteo.com/v1/search"
-        params = {"name": namePrefix, "count": 5, "language": "ru", "format": "json"}
+        params = {"name": namePrefix, "count": AUTOCOMPLETE_PROVIDER_LIMIT, "language": "ru", "format": "json"}
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(url, params=params)
-                if resp.status_code == 200:
-                    data = resp.json()
-                    if "results" in data:
-                        return data["results"]
+            resp = await get_http_client("open_meteo").get(url, params=params)
+            if resp.status_code == 200:
+                return resp.json().get("results") or []
         except Exception:
             pass
-        return []
+        return None
 
     async def fetch_nominatim():
         # Используем featuretype=city чтобы отсеять мусор, но это параметр reverse. 
@@ -3197,25 +3636,29 @@ async def autocomplete_cities(namePrefix: str = Query(..., min_length=2)):
             "q": namePrefix,
             "format": "json",
             "accept-language": "ru",
-            "limit": 5,
+            "limit": AUTOCOMPLETE_PROVIDER_LIMIT,
             "addressdetails": 1,
         }
-        headers = {"User-Agent": "Luggify/1.0 (travel packing app)"}
         try:
-            async with httpx.AsyncClient() as client:
-                resp = await client.get(NOMINATIM_URL, params=params, headers=headers)
-                if resp.status_code == 200:
-                    return resp.json()
+            # Nominatim ограничен 1 запросом/сек — не ждём очередь дольше, чем имеет смысл для подсказок
+            resp = await nominatim_search(params, timeout=NOMINATIM_AUTOCOMPLETE_TIMEOUT)
+            if resp.status_code == 200:
+                return resp.json()
         except Exception:
             pass
-        return []
+        return None
 
-    # Запускаем параллельно
+    # Запускаем параллельно; None — провайдер не ответил (такой ответ не кэшируем)
     import asyncio
     res_om, res_nom = await asyncio.gather(fetch_open_meteo(), fetch_nominatim())
+    providers_answered = res_om is not None and res_nom is not None
+    res_om = res_om or []
+    res_nom = res_nom or []
 
     final_results = []
     seen = set()
+    # Уже выданные города по сетке координат — проверка близости без перебора всего списка
+    response_index = CityIndex()
 
     # 1. Приоритет Open-Meteo (обычно релевантнее для префиксов)
     for item in res_om:
@@ -3245,6 +3688,7 @@ async def autocomplete_cities(namePrefix: str = Query(..., min_length=2)):
             "fullName": ", ".join(parts),
             "source": "om"
         })
+        _remember_autocomplete_city(response_index, final_results[-1], item.get("population"))
 
     # 2. Добавляем Nominatim (если такого города ещё нет)
     for item in res_nom:
@@ -3266,14 +3710,8 @@ async def autocomplete_cities(namePrefix: str = Query(..., min_length=2)):
         if key in seen: continue
         
         # Если такого ключа нет, но координаты ОЧЕНЬ близко к уже найденному -> тоже дубль
-        is_duplicate_coord = False
         lat, lon = float(item["lat"]), float(item["lon"])
-        for exist in final_results:
-            if abs(exist["lat"] - lat) < 0.1 and abs(exist["lon"] - lon) < 0.1:
-                is_duplicate_coord = True
-                break
-        
-        if is_duplicate_coord: continue
+        if response_index.find_near(lat, lon): continue
 
         seen.add(key)
         
@@ -3291,13 +3729,76 @@ async def autocomplete_cities(namePrefix: str = Query(..., min_length=2)):
             "fullName": ", ".join(parts),
             "source": "nom"
         })
+        _remember_autocomplete_city(response_index, final_results[-1])
+
+    for result in final_results:
+        _remember_autocomplete_city(CITY_INDEX, result)
+    if providers_answered:
+        AUTOCOMPLETE_CACHE.put(
+            "ru",
+            namePrefix,
+            final_results,
+            exhaustive=len(res_om) < AUTOCOMPLETE_PROVIDER_LIMIT and len(res_nom) < AUTOCOMPLETE_PROVIDER_LIMIT,
+        )
 
     return final_results
 
-async def calculate_packing_data(
-    city: str,
-    start_date_str: str,
-    end_date_str: str,
+# Сколько сегментов геокодируем одновременно (дальше всё равно упираемся в лимиты Nominatim)
+SEGMENT_CONTEXT_CONCURRENCY = int(os.getenv("SEGMENT_CONTEXT_CONCURRENCY", "4"))
+
+
+async def fetch_segment_contexts(
+    segments: list[tuple[str, str, str]],
+    language: str = "ru",
+) -> list[dict]:
+    """Гео + погода для сегментов (city, start_date, end_date) с сохранением порядка.
+
+    Геокодинг идёт параллельно с ограничением, погода всех сегментов приходит одним
+    мульти-координатным запросом на прогноз и одним на архив.
+    """
+    semaphore = asyncio.Semaphore(SEGMENT_CONTEXT_CONCURRENCY)
+
+    async def _geocode(city: str):
+        async with semaphore:
+            return await geocode_city(city.split(",")[0].strip(), language)
+
+    geos = await asyncio.gather(*(_geocode(city) for city, _, _ in segments))
+    for (city, _, _), geo in zip(segments, geos):
+        if not geo:
+            raise HTTPException(status_code=404, detail=f"Город {city} не найден")
+
+    date_ranges = [
+        (datetime.strptime(start_date_str, "%Y-%m-%d"), datetime.strptime(end_date_str, "%Y-%m-%d"))
+        for _, start_date_str, end_date_str in segments
+    ]
+    # Forecast + historical (Open-Meteo через кэш weather_days)
+    weather_batch = await get_daily_weather_batch([
+        (geo["lat"], geo["lon"], start_dt.date(), end_dt.date())
+        for geo, (start_dt, end_dt) in zip(geos, date_ranges)
+    ])
+
+    contexts = []
+    for (city, _, _), geo, (start_dt, end_dt), weather_by_day in zip(segments, geos, date_ranges, weather_batch):
+        daily_data = {}
+        for date_str, day in weather_by_day.items():
+            desc, icon = describe_weather_code(day["weathercode"], language)
+            daily_data[date_str] = {
+                **day,
+                "condition": desc,
+                "icon": icon,
+                "city": city.split(",")[0].strip(),
+            }
+        contexts.append({
+            "country": geo["country_code"],
+            "start_dt": start_dt,
+            "end_dt": end_dt,
+            "daily_data": daily_data,
+        })
+    return contexts
+
+
+def build_packing_data(
+    context: dict,
     trip_type: str,
     transport: str,
     gender: str,
@@ -3306,132 +3807,14 @@ async def calculate_packing_data(
     has_chronic_diseases: bool,
     language: str = "ru"
 ):
-    # 1. Geocoding
-    async with httpx.AsyncClient() as client:
-        headers = {"User-Agent": "Luggify/1.0"}
-        try:
-            geo_resp = await client.get(NOMINATIM_URL, params={
-                "q": city.split(",")[0].strip(),
-                "format": "json",
-                "accept-language": language,
-                "limit": 1,
-                "addressdetails": 1
-            }, headers=headers)
-            if geo_resp.status_code != 200 or not geo_resp.json():
-                raise HTTPException(status_code=404, detail=f"Город {city} не найден")
-            geo_data = geo_resp.json()
-        except Exception as e:
-            print(f"Geocoding error for {city}: {e}")
-            raise HTTPException(status_code=404, detail=f"Ошибка БД: 404: Город {city} не найден ({str(e)})")
+    """Список вещей по готовому контексту сегмента — без сетевых запросов."""
+    country = context["country"]
+    start_dt = context["start_dt"]
+    end_dt = context["end_dt"]
+    daily_data = context["daily_data"]
 
-        lat = float(geo_data[0]["lat"])
-        lon = float(geo_data[0]["lon"])
-        addr = geo_data[0].get("address", {})
-        country = addr.get("country_code", "").upper()
-
-        start_dt = datetime.strptime(start_date_str, "%Y-%m-%d")
-        end_dt = datetime.strptime(end_date_str, "%Y-%m-%d")
-        today = datetime.now().date()
-
-        forecast_limit = today + timedelta(days=15)
-        daily_data = {}
-
-        # 1) Open-Meteo Forecast
-        if start_dt.date() <= forecast_limit:
-            forecast_end = min(end_dt.date(), forecast_limit)
-            try:
-                resp = await client.get(OPEN_METEO_FORECAST_URL, params={
-                    "latitude": lat,
-                    "longitude": lon,
-                    "daily": "temperature_2m_max,temperature_2m_min,weathercode,relative_humidity_2m_mean,uv_index_max,wind_speed_10m_max",
-                    "timezone": "auto",
-                    "start_date": start_dt.strftime("%Y-%m-%d"),
-                    "end_date": forecast_end.strftime("%Y-%m-%d"),
-                })
-                if resp.status_code == 200:
-                    d = resp.json().get("daily", {})
-                    times = d.get("time", [])
-                    maxs = d.get("temperature_2m_max", [])
-                    mins = d.get("temperature_2m_min", [])
-                    codes = d.get("weathercode", [])
-                    hums = d.get("relative_humidity_2m_mean", [])
-                    uvs = d.get("uv_index_max", [])
-                    winds = d.get("wind_speed_10m_max", [])
-                    
-                    for i, t in enumerate(times):
-                        default_desc = "Unknown" if language != "ru" else "Неизвестно"
-                        desc, icon = WMO_CODES.get(language if language in WMO_CODES else "ru", {}).get(codes[i], (default_desc, "01d"))
-                        daily_data[t] = {
-                            "temp_max": maxs[i],
-                            "temp_min": mins[i],
-                            "weathercode": codes[i],
-                            "condition": desc,
-                            "icon": icon,
-                            "source": "forecast",
-                            "city": city.split(",")[0].strip(),
-                            "humidity": hums[i] if i < len(hums) else None,
-                            "uv_index": uvs[i] if i < len(uvs) else None,
-                            "wind_speed": winds[i] if i < len(winds) else None,
-                        }
-
-            except Exception as e:
-                print(f"Forecast error: {e}")
-
-        # 2) Historical
-        hist_start = max(start_dt.date(), forecast_limit + timedelta(days=1))
-        if hist_start <= end_dt.date():
-            try:
-                hist_start_ly = hist_start.replace(year=hist_start.year - 1)
-                hist_end_ly = end_dt.date().replace(year=end_dt.date().year - 1)
-                
-                resp = await client.get(OPEN_METEO_HISTORICAL_URL, params={
-                    "latitude": lat,
-                    "longitude": lon,
-                    "daily": "temperature_2m_max,temperature_2m_min,weathercode,relative_humidity_2m_mean,wind_speed_10m_max",
-                    "timezone": "auto",
-                    "start_date": hist_start_ly.strftime("%Y-%m-%d"),
-                    "end_date": hist_end_ly.strftime("%Y-%m-%d"),
-                })
-                if resp.status_code == 200:
-                    d = resp.json().get("daily", {})
-                    times = d.get("time", [])
-                    maxs = d.get("temperature_2m_max", [])
-                    mins = d.get("temperature_2m_min", [])
-                    codes = d.get("weathercode", [])
-                    hums = d.get("relative_humidity_2m_mean", [])
-                    winds = d.get("wind_speed_10m_max", [])
-                    
-                    current_hist_date = hist_start
-                    for i, _ in enumerate(times):
-                        if current_hist_date > end_dt.date(): break
-                        default_desc = "Unknown" if language != "ru" else "Неизвестно"
-                        desc, icon = WMO_CODES.get(language, {}).get(codes[i], (default_desc, "01d"))
-                        date_str = current_hist_date.strftime("%Y-%m-%d")
-                        daily_data[date_str] = {
-                            "temp_max": maxs[i],
-                            "temp_min": mins[i],
-                            "weathercode": codes[i],
-                            "condition": desc,
-                            "icon": icon,
-                            "source": "historical",
-                            "city": city.split(",")[0].strip(), # Add city
-                            "humidity": hums[i] if i < len(hums) else None,
-                            "uv_index": None,
-                            "wind_speed": winds[i] if i < len(winds) else None,
-                        }
-                        current_hist_date += timedelta(days=1)
-            except Exception as e:
-                print(f"Historical error: {e}")
-
-    # Process weather data
     daily_forecast = []
-    temps = []
     conditions = set()
-    wmo_codes = set()
-    humidities = []
-    uv_indices = []
-    wind_speeds = []
-
     for date_str in sorted(daily_data.keys()):
         item = daily_data[date_str]
         daily_forecast.append(schemas.DailyForecast(
@@ -3444,201 +3827,26 @@ async def calculate_packing_data(
             city=item.get("city"),
             humidity=item.get("humidity"),
             uv_index=item.get("uv_index"),
-            wind_speed=item.get("wind_speed")
+            wind_speed=item.get("wind_speed"),
+            precipitation_probability=item.get("precipitation_probability"),
         ))
-        temps.append((item["temp_min"] + item["temp_max"]) / 2)
         conditions.add(item["condition"])
-        wmo_codes.add(item["weathercode"])
-        if item["humidity"]: humidities.append(item["humidity"])
-        if item["uv_index"]: uv_indices.append(item["uv_index"])
-        if item["wind_speed"]: wind_speeds.append(item["wind_speed"])
-
-    avg_temp = round(sum(temps) / len(temps), 1) if temps else None
-    
-    # Calculate trip duration
-    start_dt_date = start_dt if isinstance(start_dt, type(start_dt)) else start_dt
-    end_dt_date = end_dt if isinstance(end_dt, type(end_dt)) else end_dt
-    try:
-        trip_days = (end_dt.date() - start_dt.date()).days + 1
-    except:
-        trip_days = (end_dt - start_dt).days + 1
-    trip_days = max(trip_days, 1)
-    
-    # Items Generation
-    items = set()
-
-    # ========== BASE ESSENTIALS (always included) ==========
-    items.update([
-        get_item("underwear", language),
-        get_item("socks", language),
-        get_item("pajamas", language),
-        get_item("towel", language),
-        get_item("copies_docs", language),
-    ])
-    
-    # Base hygiene (always)
-    items.update([
-        get_item("toothbrush", language),
-        get_item("deodorant", language),
-        get_item("soap", language),
-        get_item("shampoo", language),
-        get_item("hairbrush", language),
-        get_item("sanitizer", language),
-        get_item("tissues", language),
-    ])
-    
-    # Base tech (always)
-    items.update([
-        get_item("phone", language),
-        get_item("charger", language),
-        get_item("headphones", language),
-    ])
-    
-    # Base pharmacy (always)
-    items.update([
-        get_item("painkillers", language),
-        get_item("plasters", language),
-        get_item("activated_charcoal", language),
-    ])
 
-    # ========== DURATION-BASED QUANTITIES ==========
-    if trip_days > 7:
-        items.add(get_item("laundry_bag", language))
-        items.add(get_item("packing_cubes", language))
-    if trip_days > 3:
-        items.add(get_item("dry_shampoo", language))
-
-    # ========== WEATHER-BASED ITEMS ==========
-    if hums := [h for h in humidities if h > 80]:
-         items.add(get_item("styling", language))
-    if uvs := [u for u in uv_indices if u > 5]:
-         items.update([get_item("sunscreen_50", language), get_item("hat", language), get_item("sunglasses", language)])
-    if winds := [w for w in wind_speeds if w > 30]:
-         items.update([get_item("windbreaker", language), get_item("chapstick", language), get_item("scarf_buff", language)])
-
-    if any("swim" in c.lower() or "купание" in c.lower() for c in conditions) or country in ["TH", "ES", "GR", "IT", "TR", "EG"]:
-        items.add(get_item("swimsuit", language))
-    if any("mountain" in c.lower() or "гора" in c.lower() for c in conditions):
-        items.update([get_item("trekking_shoes", language), get_item("first_aid_kit", language), get_item("thermos", language), get_item("map_compass", language)])
-
-    # ========== HEALTH CONDITIONS ==========
-    if has_allergies:
-        items.update([get_item("antihistamine", language), get_item("allergies_list", language)])
-    if has_chronic_diseases:
-        items.update([get_item("meds_personal", language), get_item("meds_regular", language), get_item("med_report", language)])
-
-    # ========== GENDER ITEMS ==========
-    if gender == "female":
-        items.update([get_item("makeup", language), get_item("hygiene_fem", language), get_item("makeup_remover", language), get_item("cotton_pads", language), get_item("nail_kit", language)])
-        if avg_temp and avg_temp > 15:
-            items.add(get_item("dress", language))
-    elif gender == "male":
-        items.add(get_item("shaving_kit", language))
-
-    # ========== TRANSPORT ITEMS ==========
-    if transport == "plane":
-        items.update([get_item("neck_pillow", language), get_item("earplugs", language), get_item("powerbank_hand", language), get_item("liquids_bag", language), get_item("eye_mask", language)])
-    elif transport == "train":
-        items.update([get_item("slippers_train", language), get_item("mug", language), get_item("powerbank", language), get_item("clothes_train", language), get_item("wipes", language), get_item("eye_mask", language)])
-    elif transport == "car":
-        items.update([get_item("license", language), get_item("car_charger", language), get_item("snacks_water", language), get_item("playlist", language), get_item("sunglasses_driver", language)])
-    elif transport == "bus":
-        items.update([get_item("neck_pillow", language), get_item("earplugs", language), get_item("snacks_water", language), get_item("wipes", language), get_item("eye_mask", language)])
-
-    # ========== TEMPERATURE-BASED CLOTHING ==========
-    min_temp = min(daily_data[d]["temp_min"] for d in daily_data) if daily_data else 15
-    max_temp = max(daily_data[d]["temp_max"] for d in daily_data) if daily_data else 20
-    
-    if min_temp < -10:
-        # Extreme cold
-        items.update([get_item("jacket_warm", language), get_item("hat", language), get_item("scarf", language), get_item("gloves", language), get_item("thermo", language), get_item("boots_winter", language), get_item("socks_warm", language), get_item("hand_cream", language), get_item("chapstick", language)])
-    elif min_temp < 0:
-        # Cold
-        items.update([get_item("jacket_warm", language), get_item("hat", language), get_item("scarf", language), get_item("gloves", language), get_item("thermo", language), get_item("boots_winter", language), get_item("socks_warm", language)])
-    elif min_temp < 10:
-        # Cool
-        items.update([get_item("jacket_light", language), get_item("sweater", language), get_item("jeans", language), get_item("sneakers", language), get_item("hoodie", language)])
-    elif min_temp < 18:
-        # Mild
-        items.update([get_item("tshirt", language), get_item("jeans", language), get_item("sneakers", language), get_item("jacket_light", language), get_item("long_sleeve", language)])
-    else:
-        # Warm
-        items.update([get_item("tshirt", language), get_item("shorts", language), get_item("cap", language), get_item("shoes_light", language)])
-    
-    # Rain gear
-    if any("rain" in c.lower() or "дождь" in c.lower() or "ливень" in c.lower() or "морось" in c.lower() for c in conditions):
-        items.update([get_item("raincoat", language), get_item("umbrella", language)])
-    if max_temp > 22:
-        items.update([get_item("sunglasses", language), get_item("cap", language), get_item("sunscreen", language)])
-    if max_temp > 20:
-        items.add(get_item("water_bottle", language))
-    
-    # Temperature range is large (>15°C difference) — need layers
-    if daily_data and (max_temp - min_temp) > 15:
-        items.update([get_item("hoodie", language), get_item("long_sleeve", language)])
-        
-    # ========== PET ITEMS ==========
-    if traveling_with_pet:
-        items.update([get_item("vet_passport", language), get_item("pet_food", language), get_item("pet_bowl", language), get_item("leash", language), get_item("pet_pads", language), get_item("pet_toy", language)])
-
-    # ========== TRIP TYPE ITEMS ==========
-    if trip_type == "business":
-        items.update([get_item("suit", language), get_item("shirts", language), get_item("shoes_formal", language), get_item("laptop", language), get_item("business_cards", language), get_item("perfume", language)])
-    elif trip_type == "active":
-        items.update([get_item("sportswear", language), get_item("sneakers", language), get_item("backpack_walk", language), get_item("water_bottle", language), get_item("first_aid_kit", language), get_item("motion_sickness", language)])
-    elif trip_type == "beach":
-        items.update([get_item("swimsuit", language), get_item("pareo", language), get_item("flipflops", language), get_item("beach_towel", language), get_item("after_sun", language), get_item("beach_bag", language), get_item("sunscreen_50", language)])
-    elif trip_type == "winter":
-        items.update([get_item("ski_suit", language), get_item("thermo", language), get_item("fleece", language), get_item("mittens", language), get_item("goggles", language), get_item("wind_cream", language), get_item("hand_cream", language), get_item("chapstick", language)])
-    elif trip_type == "family":
-        items.update([get_item("baby_food", language), get_item("diapers", language), get_item("baby_wipes", language), get_item("stroller", language), get_item("kids_toys", language), get_item("kids_clothes", language), get_item("child_meds", language), get_item("baby_sunscreen", language), get_item("sippy_cup", language), get_item("snacks_water", language)])
-    elif trip_type == "romantic":
-        items.update([get_item("fancy_outfit", language), get_item("perfume", language)])
-        if gender == "female":
-            items.update([get_item("heels", language), get_item("jewelry", language)])
-    elif trip_type == "camping":
-        items.update([get_item("tent", language), get_item("sleeping_bag", language), get_item("sleeping_pad", language), get_item("camp_stove", language), get_item("camping_cookware", language), get_item("multitool", language), get_item("matches", language), get_item("headlamp", language), get_item("bug_net", language), get_item("trash_bags", language), get_item("rope", language), get_item("dry_bag", language), get_item("flashlight", language), get_item("first_aid_kit", language)])
-    elif trip_type == "city_break":
-        items.update([get_item("comfy_shoes", language), get_item("city_backpack", language), get_item("portable_charger", language), get_item("guidebook", language), get_item("camera", language)])
-
-    # ========== REGIONAL RECOMMENDATIONS ==========
-    # Tropical countries — insect protection
-    tropical_countries = ["TH", "VN", "KH", "LA", "MM", "ID", "MY", "PH", "IN", "LK", "MV", "BR", "CO", "MX", "CR", "CU", "KE", "TZ", "NG"]
-    if country in tropical_countries:
-        items.update([get_item("insect_spray", language), get_item("bite_cream", language), get_item("diarrhea_meds", language), get_item("sunscreen_50", language)])
-
-    # Muslim / conservative regions — modest clothing
-    conservative_countries = ["SA", "AE", "QA", "OM", "KW", "BH", "IR", "EG", "JO", "MA"]
-    if country in conservative_countries:
-        items.update([get_item("closed_clothing", language), get_item("head_covering", language)])
-
-    # Asian temples
-    temple_countries = ["TH", "KH", "LA", "MM", "IN", "LK", "JP", "CN"]
-    if country in temple_countries:
-        items.add(get_item("closed_clothing", language))
-
-    # Non-slavic countries — phrasebook
-    non_russian_speaking = country not in ["RU", "BY", "KZ", "KG", "UA", "MD"]
-    if non_russian_speaking and country:
-        items.add(get_item("phrasebook", language))
-
-    # 110V countries — voltage converter
-    voltage_110_countries = ["US", "CA", "MX", "JP", "CO", "BR", "CU"]
-    if country in voltage_110_countries:
-        items.add(get_item("converter_110v", language))
-
-    # Visa/Adapter logic
-    visa_countries = ["FR", "DE", "IT", "ES", "GB", "US", "CN", "JP", "TR", "EG", "TH", "IN", "AU", "NZ", "BR", "CA"]
-    if country in visa_countries:
-        items.add(get_item("visa", language))
-    
-    adapter_countries = ["US", "GB", "AU", "JP", "CN", "CH", "IN", "BR", "ZA"]
-    if country in adapter_countries:
-        items.add(get_item("adapter", language))
+    weather = summarize_weather(daily_data, start_dt, end_dt)
+    item_keys = PACKING_RULES.evaluate(TripFacts(
+        weather=weather,
+        country=country,
+        trip_type=trip_type,
+        transport=transport,
+        gender=gender,
+        traveling_with_pet=traveling_with_pet,
+        has_allergies=has_allergies,
+        has_chronic_diseases=has_chronic_diseases,
+    ))
 
     return {
-        "items": items,
-        "avg_temp": avg_temp,
+        "items": {get_item(key, language) for key in item_keys},
+        "avg_temp": weather.avg_temp,
         "conditions": list(conditions),
         "daily_forecast": daily_forecast,
         "country": country,
@@ -3775,8 +3983,10 @@ async def generate_list(req: PackingRequest, db: AsyncSession = Depends(get_db),
         "trip_type": req.trip_type,
         "transport": req.transport,
     }]
-    data = await calculate_packing_data(
-        req.city, req.start_date, req.end_date, req.trip_type, req.transport,
+    # Гео и погода считаются один раз на поездку и переиспользуются для всех участников
+    segment_contexts = await fetch_segment_contexts([(req.city, req.start_date, req.end_date)], req.language)
+    data = build_packing_data(
+        segment_contexts[0], req.trip_type, req.transport,
         req.gender, req.traveling_with_pet, req.has_allergies, req.has_chronic_diseases, req.language
     )
     participant_baggage_payloads = await build_participant_baggage_payloads(
@@ -3784,6 +3994,7 @@ async def generate_list(req: PackingRequest, db: AsyncSession = Depends(get_db),
         current_user=current_user,
         participant_user_ids=req.participant_user_ids,
         segments=segments,
+        segment_contexts=segment_contexts,
         owner_overrides={
             "gender": req.gender,
             "traveling_with_pet": req.traveling_with_pet,
@@ -3811,11 +4022,15 @@ async def generate_multi_city(req: MultiCityPackingRequest, db: AsyncSession = D
     
     transports = []
     
-    for seg in req.segments:
+    contexts = await fetch_segment_contexts(
+        [(seg.city, seg.start_date, seg.end_date) for seg in req.segments],
+        req.language,
+    )
+    for seg, context in zip(req.segments, contexts):
         cities.append(seg.city.split(",")[0])
         transports.append(seg.transport)
-        data = await calculate_packing_data(
-            seg.city, seg.start_date, seg.end_date, seg.trip_type, seg.transport,
+        data = build_packing_data(
+            context, seg.trip_type, seg.transport,
             req.gender, req.traveling_with_pet, req.has_allergies, req.has_chronic_diseases, req.language
         )
         all_items.update(data["items"])
@@ -3850,6 +4065,7 @@ async def generate_multi_city(req: MultiCityPackingRequest, db: AsyncSession = D
             }
             for segment in req.segments
         ],
+        segment_contexts=contexts,
         owner_overrides={
             "gender": req.gender,
             "traveling_with_pet": req.traveling_with_pet,
@@ -3890,21 +4106,31 @@ async def get_tg_checklists(tg_user_id: str, db: AsyncSession = Depends(get_db))
 @app.get("/checklist/{slug}", response_model=ChecklistResponse)
 async def get_checklist(
     slug: str,
-    db: AsyncSession = Depends(get_db),
-    user=Depends(get_current_user),
+    db: AsyncSession = Depends(get_read_db),
+    user=Depends(get_current_read_user),
 ):
     checklist = await crud.get_checklist_by_slug(db, slug)
     if not checklist:
         raise HTTPException(status_code=404, detail="Чеклист не найден")
 
-    # If daily_forecast is saved in DB, use it. Otherwise try to fetch fresh one (optional fallback)
+    # If daily_forecast is saved in DB, use it. Otherwise fetch it once and save (legacy checklists;
+    # массово их заполняет forecast_jobs.backfill_missing_forecasts)
     forecast = checklist.daily_forecast
     if not forecast:
-        # Fallback to fresh fetch if missing (for legacy checklists)
         try:
-            forecast = await get_weather_forecast_data(checklist.city, checklist.start_date, checklist.end_date, language="ru")
-        except:
+            [forecast] = await fetch_checklist_forecasts(
+                [(checklist.city, checklist.start_date, checklist.end_date)], language="ru"
+            )
+        except Exception as e:
+            print(f"Forecast fetch error for checklist {slug}: {e}")
             forecast = []
+        if forecast:
+            # db может смотреть в реплику — запись идёт отдельной сессией в primary
+            try:
+                async with SessionLocal() as session:
+                    await crud.save_checklist_forecasts(session, {checklist.id: forecast})
+            except Exception as e:
+                print(f"Forecast save error for checklist {slug}: {e}")
     
     viewer_id = user.id if user else None
     visible_backpacks = [
@@ -4396,45 +4622,27 @@ async def transfer_checklist_item(
         if item not in (checklist.items or []):
             raise HTTPException(status_code=404, detail="Вещь не найдена в списке")
 
-    if payload.source_backpack_id is None:
-        moved_quantity = max(1, get_map_quantity(checklist.item_quantities or {}, item, 1))
-        moved_packed = max(0, get_map_quantity(checklist.packed_quantities or {}, item, 0))
-        checklist.items = [existing for existing in (checklist.items or []) if existing != item]
-        checklist.checked_items = [existing for existing in (checklist.checked_items or []) if existing != item]
-        checklist.removed_items = [existing for existing in (checklist.removed_items or []) if existing != item]
-        checklist.item_quantities = set_map_quantity(checklist.item_quantities or {}, item, 0)
-        checklist.packed_quantities = set_map_quantity(checklist.packed_quantities or {}, item, 0)
-    else:
-        moved_quantity = max(1, get_map_quantity(source_backpack.item_quantities or {}, item, 1))
-        moved_packed = max(0, get_map_quantity(source_backpack.packed_quantities or {}, item, 0))
-        source_backpack.items = [existing for existing in (source_backpack.items or []) if existing != item]
-        source_backpack.checked_items = [existing for existing in (source_backpack.checked_items or []) if existing != item]
-        source_backpack.removed_items = [existing for existing in (source_backpack.removed_items or []) if existing != item]
-        source_backpack.item_quantities = set_map_quantity(source_backpack.item_quantities or {}, item, 0)
-        source_backpack.packed_quantities = set_map_quantity(source_backpack.packed_quantities or {}, item, 0)
-        source_backpack.checked_items = rebuild_checked_items(
-            source_backpack.items or [],
-            source_backpack.item_quantities or {},
-            source_backpack.packed_quantities or {},
-        )
-
-    if item not in (target_backpack.items or []):
-        target_backpack.items = [*(target_backpack.items or []), item]
-    target_backpack.removed_items = [existing for existing in (target_backpack.removed_items or []) if existing != item]
-    target_backpack.item_quantities = set_map_quantity(
-        target_backpack.item_quantities or {},
-        item,
-        max(1, get_map_quantity(target_backpack.item_quantities or {}, item, 0) + moved_quantity),
-    )
-    target_backpack.packed_quantities = set_map_quantity(
-        target_backpack.packed_quantities or {},
+    # Перенос трогает две строки checklist_items: вещь уходит из источника и
+    # добавляется (или досчитывается) в багаже назначения
+    source = checklist if source_backpack is None else source_backpack
+    moved_quantity = max(1, get_map_quantity(source.item_quantities or {}, item, 1))
+    moved_packed = max(0, get_map_quantity(source.packed_quantities or {}, item, 0))
+    await crud.remove_checklist_item(db, source, item)
+
+    target_quantity = max(1, get_map_quantity(target_backpack.item_quantities or {}, item, 0) + moved_quantity)
+    target_packed = max(0, get_map_quantity(target_backpack.packed_quantities or {}, item, 0) + moved_packed)
+    target_fields = {}
+    if normalize_item_key(item) not in {normalize_item_key(existing) for existing in (target_backpack.items or [])}:
+        target_fields["position"] = crud.next_item_position(target_backpack)
+    await crud.set_checklist_item(
+        db,
+        target_backpack,
         item,
-        max(0, get_map_quantity(target_backpack.packed_quantities or {}, item, 0) + moved_packed),
-    )
-    target_backpack.checked_items = rebuild_checked_items(
-        target_backpack.items or [],
-        target_backpack.item_quantities or {},
-        target_backpack.packed_quantities or {},
+        **target_fields,
+        is_removed=False,
+        quantity=target_quantity,
+        packed_quantity=target_packed or None,
+        is_checked=target_packed >= target_quantity,
     )
 
     await db.commit()
@@ -4503,23 +4711,16 @@ async def notify_invite(
     if is_checklist_participant(checklist, target_user_id):
         raise HTTPException(status_code=409, detail="Пользователь уже в чеклисте")
     
-    # Ensure participant baggage exists for direct collaborative checklist flow
-    existing_bp = await db.execute(
-        select(models.UserBackpack).where(
-            models.UserBackpack.checklist_id == checklist.id,
-            models.UserBackpack.user_id == target_user_id
-        )
-    )
-    if not existing_bp.scalar_one_or_none():
-        await crud.create_user_backpack(db, checklist.id, target_user_id)
-    
-    # Generate invite token if not exists
-    if not checklist.invite_token:
-        await crud.generate_checklist_invite_token(db, slug)
-        await db.refresh(checklist)
+    # Ensure participant baggage exists for direct collaborative checklist flow
+    # (рюкзака у приглашённого нет: это уже проверил is_checklist_participant)
+    owner_has_backpack = any(bp.user_id == user.id for bp in checklist.backpacks or [])
+    await crud.create_user_backpack(db, checklist.id, target_user_id)
+    
+    # Generate invite token if not exists
+    await crud.ensure_checklist_invite_token(db, checklist)
     
     # Create backpack for the owner if not exists
-    if checklist.user_id == user.id:
+    if not owner_has_backpack:
         await crud.create_user_backpack(db, checklist.id, user.id)
     
     # Create notification for target user
@@ -4539,8 +4740,8 @@ async def notify_invite(
 
 @app.get("/notifications", response_model=List[schemas.NotificationOut])
 async def get_notifications(
-    db: AsyncSession = Depends(get_db),
-    user=Depends(require_current_user)
+    db: AsyncSession = Depends(get_read_db),
+    user=Depends(require_current_read_user)
 ):
     from sqlalchemy import desc
     res = await db.execute(
@@ -4606,6 +4807,21 @@ async def delete_checklist(slug: str, db: AsyncSession = Depends(get_db)):
 async def root():
     return {"message": "Luggify backend is running"}
 
+@app.get("/metrics")
+async def metrics():
+    """Внутренние счётчики очередей и кэшей (JSON)"""
+    return {
+        "nominatim": NOMINATIM_SCHEDULER.metrics(),
+        "autocomplete_cache": AUTOCOMPLETE_CACHE.metrics(),
+        "city_index": {"size": len(CITY_INDEX)},
+        "attractions_single_flight": ATTRACTIONS_SINGLE_FLIGHT.metrics(),
+        "hotels": await HOTEL_CACHE.metrics(),
+        "flights": FLIGHT_CACHE.metrics(),
+        "exchange_rates": EXCHANGE_RATES.metrics(),
+        "read_replica": read_replica_metrics(),
+        "quotas": await quota_metrics(),
+    }
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint - проверяет доступность сервера и подключение к БД"""
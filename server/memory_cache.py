@@ -0,0 +1,36 @@
+import time
+from collections import OrderedDict
+from typing import Any, Optional
+
+
+class LRUCache:
+    """LRU в памяти процесса с необязательным TTL на чтении (общий для кэшей отелей и перелётов)."""
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self._entries: "OrderedDict[Any, tuple[Any, float]]" = OrderedDict()
+
+    def get(self, key, ttl: Optional[float] = None):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        value, stored_at = entry
+        # Протухшую запись не удаляем: её ещё может отдать get_stale, место освободит LRU
+        if ttl is not None and time.time() - stored_at >= ttl:
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_stale(self, key):
+        """Значение без учёта TTL — для ответа, когда свежие данные не успели."""
+        entry = self._entries.get(key)
+        return entry[0] if entry is not None else None
+
+    def put(self, key, value, stored_at: Optional[float] = None) -> None:
+        self._entries[key] = (value, stored_at if stored_at is not None else time.time())
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -1,7 +1,8 @@
-from sqlalchemy import Column, Integer, String, Date, Float, DateTime, ForeignKey, func, Boolean, JSON, Table, Text, UniqueConstraint
-from sqlalchemy.dialects.postgresql import ARRAY
+from sqlalchemy import Column, Integer, String, Date, Float, DateTime, ForeignKey, func, Boolean, JSON, Table, Text, UniqueConstraint, CheckConstraint, Index, text as sql_text
+from sqlalchemy.dialects.postgresql import ARRAY, JSONB
 from sqlalchemy.orm import relationship
 from datetime import datetime
+from typing import Optional
 from database import Base
 
 followers_association = Table(
@@ -63,25 +64,79 @@ class UserDevice(Base):
     user = relationship("User", back_populates="trusted_devices")
 
 
-class Checklist(Base):
+def normalize_item_key(value: Optional[str]) -> str:
+    # Та же нормализация, что normalize_item_key в main.py и ключи карт количеств на клиенте
+    return (value or "").strip().lower().replace("ё", "е")
+
+
+class ChecklistItemsMixin:
+    """items / checked_items / removed_items / added_items и карты количеств — только чтение.
+
+    Собираются из строк checklist_items (одна строка на вещь) в том виде, в каком раньше
+    лежали массивами и JSON в самой записи. Меняются они через crud.save_checklist_items и
+    crud.set_checklist_item — отдельным UPDATE/INSERT/DELETE на каждую изменившуюся вещь.
+    checked_items и removed_items идут в порядке строк (items, затем added_items), а не в
+    порядке отметок; вещи с одинаковым normalize_item_key — одна строка.
+    """
+
+    def _ordered_item_rows(self) -> list:
+        def order(row):
+            return (
+                row.position is None,
+                row.position or 0,
+                row.added_position is None,
+                row.added_position or 0,
+                row.id or 0,
+            )
+        return sorted(self.item_rows, key=order)
+
+    def _listed_item_texts(self, position_attr: str) -> list[str]:
+        rows = [row for row in self.item_rows if getattr(row, position_attr) is not None]
+        return [row.text for row in sorted(rows, key=lambda row: getattr(row, position_attr))]
+
+    @property
+    def items(self) -> list[str]:
+        return self._listed_item_texts("position")
+
+    @property
+    def added_items(self) -> list[str]:
+        return self._listed_item_texts("added_position")
+
+    @property
+    def checked_items(self) -> list[str]:
+        return [row.text for row in self._ordered_item_rows() if row.is_checked]
+
+    @property
+    def removed_items(self) -> list[str]:
+        return [row.text for row in self._ordered_item_rows() if row.is_removed]
+
+    @property
+    def item_quantities(self) -> dict[str, int]:
+        return {row.item_key: row.quantity for row in self._ordered_item_rows() if row.quantity is not None}
+
+    @property
+    def packed_quantities(self) -> dict[str, int]:
+        return {
+            row.item_key: row.packed_quantity
+            for row in self._ordered_item_rows()
+            if row.packed_quantity is not None
+        }
+
+
+class Checklist(ChecklistItemsMixin, Base):
     __tablename__ = "checklists"
 
     id = Column(Integer, primary_key=True, index=True)
     city = Column(String, nullable=False)
     start_date = Column(Date, nullable=False)
     end_date = Column(Date, nullable=False)
-    items = Column(ARRAY(String))  # массив строк
     avg_temp = Column(Float)        # float вместо строки
     conditions = Column(ARRAY(String))
     slug = Column(String, unique=True, index=True)  # токен/slug
     origin_city = Column(String, nullable=True)  # город отправления
     tg_user_id = Column(String, nullable=True, index=True)  # Telegram user id
-    checked_items = Column(ARRAY(String), nullable=True)
-    removed_items = Column(ARRAY(String), nullable=True)
-    added_items = Column(ARRAY(String), nullable=True)
-    item_quantities = Column(JSON, nullable=False, default=dict, server_default="{}")
-    packed_quantities = Column(JSON, nullable=False, default=dict, server_default="{}")
     daily_forecast = Column(JSON, nullable=True) 
+    forecast_updated_at = Column(DateTime, nullable=True)  # когда daily_forecast последний раз получен
     is_public = Column(Boolean, default=True)
     hidden_sections = Column(ARRAY(String), default=[], server_default="{}")
     transports = Column(ARRAY(String), nullable=True)
@@ -101,6 +156,15 @@ class Checklist(Base):
         lazy="selectin",
         order_by=lambda: (UserBackpack.user_id, UserBackpack.sort_order, UserBackpack.id),
     )
+
+    # Вещи общего списка (items, checked_items, ... — свойства ChecklistItemsMixin поверх них)
+    item_rows = relationship(
+        "ChecklistItem",
+        back_populates="checklist",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+        order_by="ChecklistItem.id",
+    )
 
     # События маршрута
     events = relationship("ItineraryEvent", back_populates="checklist", cascade="all, delete-orphan", lazy="selectin")
@@ -124,7 +188,7 @@ class TripReview(Base):
     checklist = relationship("Checklist", back_populates="reviews")
     user = relationship("User", back_populates="trip_reviews", lazy="joined")
 
-class UserBackpack(Base):
+class UserBackpack(ChecklistItemsMixin, Base):
     __tablename__ = "user_backpacks"
 
     id = Column(Integer, primary_key=True, index=True)
@@ -136,19 +200,58 @@ class UserBackpack(Base):
     is_default = Column(Boolean, nullable=False, default=False, server_default="false")
     editor_user_ids = Column(ARRAY(Integer), nullable=False, default=list, server_default="{}")
     
-    # Списки вещей конкретного пользователя
-    items = Column(ARRAY(String), default=[])
-    checked_items = Column(ARRAY(String), default=[])
-    added_items = Column(ARRAY(String), default=[])
-    removed_items = Column(ARRAY(String), default=[])
-    item_quantities = Column(JSON, nullable=False, default=dict, server_default="{}")
-    packed_quantities = Column(JSON, nullable=False, default=dict, server_default="{}")
-    
+    # Списки вещей конкретного пользователя (строки checklist_items)
+    item_rows = relationship(
+        "ChecklistItem",
+        back_populates="backpack",
+        cascade="all, delete-orphan",
+        lazy="selectin",
+        order_by="ChecklistItem.id",
+    )
+
     created_at = Column(DateTime, server_default=func.now())
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
     checklist = relationship("Checklist", back_populates="backpacks")
     user = relationship("User", lazy="joined")
+
+
+class ChecklistItem(Base):
+    """Вещь общего списка (checklist_id) или рюкзака (backpack_id) — задано ровно одно из двух."""
+    __tablename__ = "checklist_items"
+    __table_args__ = (
+        CheckConstraint("(checklist_id IS NULL) <> (backpack_id IS NULL)", name="ck_checklist_items_single_owner"),
+        Index(
+            "uq_checklist_items_checklist_key",
+            "checklist_id",
+            "item_key",
+            unique=True,
+            postgresql_where=sql_text("checklist_id IS NOT NULL"),
+        ),
+        Index(
+            "uq_checklist_items_backpack_key",
+            "backpack_id",
+            "item_key",
+            unique=True,
+            postgresql_where=sql_text("backpack_id IS NOT NULL"),
+        ),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    checklist_id = Column(Integer, ForeignKey("checklists.id", ondelete="CASCADE"), nullable=True, index=True)
+    backpack_id = Column(Integer, ForeignKey("user_backpacks.id", ondelete="CASCADE"), nullable=True, index=True)
+    section = Column(String, nullable=False, default="checklist", server_default="checklist")  # checklist | backpack
+    item_key = Column(String, nullable=False)  # normalize_item_key(text)
+    text = Column(String, nullable=False)
+    quantity = Column(Integer, nullable=True)
+    packed_quantity = Column(Integer, nullable=True)
+    is_checked = Column(Boolean, nullable=False, default=False, server_default="false")
+    is_removed = Column(Boolean, nullable=False, default=False, server_default="false")
+    position = Column(Integer, nullable=True)  # место в items, NULL — вещи нет в items
+    added_position = Column(Integer, nullable=True)  # место в added_items
+
+    checklist = relationship("Checklist", back_populates="item_rows")
+    backpack = relationship("UserBackpack", back_populates="item_rows")
 
 class ItineraryEvent(Base):
     __tablename__ = "itinerary_events"
@@ -169,9 +272,154 @@ class CityAttraction(Base):
 
     id = Column(Integer, primary_key=True, index=True)
     city_name = Column(String, unique=True, index=True, nullable=False) # lowercase
-    data = Column(JSON, nullable=False)
+    place_ids = Column(JSON, nullable=False, default=list, server_default="[]")  # упорядоченные attraction_places.id
+    # Список без Google-фото или с непереведёнными названиями: обновить в фоне при наличии ключа
+    needs_refresh = Column(Boolean, nullable=False, default=False, server_default="false")
     updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
 
+class AttractionPlace(Base):
+    """Место из выдачи /attractions, общее для всех вариантов (язык, limit) кэша города."""
+    __tablename__ = "attraction_places"
+
+    id = Column(Integer, primary_key=True, index=True)
+    link = Column(String, unique=True, index=True, nullable=False)  # googleMapsUri или поисковая ссылка
+    cid = Column(String, index=True, nullable=True)  # ?cid= из ссылки Google Maps
+    city_name = Column(String, index=True, nullable=False)  # lowercase, как в ключе city_attractions
+    names = Column(JSONB, nullable=False, default=dict, server_default="{}")  # язык -> название
+    image = Column(String, nullable=True)
+    photo_ref = Column(String, nullable=True)  # places/.../photos/... для повторной загрузки фото
+    rating = Column(Float, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class AttractionNameLocalization(Base):
+    """Кэш локализации названий мест через Википедию; localized_name="" — не найдено."""
+    __tablename__ = "attraction_name_localizations"
+    __table_args__ = (
+        UniqueConstraint("lang", "city_name", "source_name", name="uq_attraction_name_localizations_key"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    lang = Column(String, nullable=False)
+    city_name = Column(String, nullable=False)  # casefold
+    source_name = Column(String, nullable=False)  # casefold
+    localized_name = Column(String, nullable=False, default="", server_default="")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class HotelLocation(Base):
+    """Запрос города -> locationId booking-com18 (ID городов не меняются)."""
+    __tablename__ = "hotel_locations"
+
+    id = Column(Integer, primary_key=True, index=True)
+    query = Column(String, unique=True, index=True, nullable=False)  # lowercase
+    location_id = Column(String, nullable=False)
+    label = Column(String, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+class HotelSearch(Base):
+    """Сырой ответ stays/search на (locationId, заезд, выезд) — фильтры применяются локально."""
+    __tablename__ = "hotel_searches"
+    __table_args__ = (
+        UniqueConstraint("location_id", "check_in", "check_out", name="uq_hotel_searches_location_dates"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    location_id = Column(String, nullable=False)
+    check_in = Column(Date, nullable=False)
+    check_out = Column(Date, nullable=False)
+    results = Column(JSON, nullable=False)
+    fetched_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+class IataCode(Base):
+    """Город (как его ввёл пользователь) -> IATA-код из автокомплита Travelpayouts."""
+    __tablename__ = "iata_codes"
+
+    id = Column(Integer, primary_key=True, index=True)
+    query = Column(String, unique=True, index=True, nullable=False)  # lowercase
+    code = Column(String, nullable=False)
+    created_at = Column(DateTime, server_default=func.now())
+
+class ExchangeRateSnapshot(Base):
+    """Последний удачный ответ open.er-api.com: переживает рестарт и недоступность провайдера."""
+    __tablename__ = "exchange_rate_snapshots"
+
+    id = Column(Integer, primary_key=True, index=True)
+    base = Column(String, unique=True, index=True, nullable=False)
+    rates = Column(JSON, nullable=False)  # валюта -> рублей за единицу
+    fetched_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+class JobRun(Base):
+    """Последний удачный запуск фоновой задачи: общий для всех воркеров, переживает деплой."""
+    __tablename__ = "job_runs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, unique=True, index=True, nullable=False)
+    finished_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+class RateLimitSlot(Base):
+    """Общий для кластера лимит запросов к внешнему API: время, с которого свободен следующий слот."""
+    __tablename__ = "rate_limit_slots"
+
+    name = Column(String, primary_key=True)
+    next_at = Column(DateTime, nullable=False)
+
+class ApiUsage(Base):
+    """Счётчик платных запросов к внешним API по провайдеру и месяцу (общий для кластера)."""
+    __tablename__ = "api_usage"
+    __table_args__ = (
+        UniqueConstraint("provider", "period", name="uq_api_usage_provider_period"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    provider = Column(String, nullable=False)
+    period = Column(String, nullable=False)  # YYYY-MM
+    calls = Column(Integer, nullable=False, default=0, server_default="0")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class GeocodeCache(Base):
+    """Кэш ответов Nominatim: нормализованный запрос + язык -> координаты и адрес."""
+    __tablename__ = "geocode_cache"
+    __table_args__ = (
+        UniqueConstraint("query", "language", name="uq_geocode_cache_query_language"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    query = Column(String, nullable=False)  # casefold + схлопнутые пробелы
+    language = Column(String, nullable=False, default="", server_default="")
+    lat = Column(Float, nullable=False)
+    lon = Column(Float, nullable=False)
+    country_code = Column(String, nullable=True)
+    display_name = Column(String, nullable=True)
+    address = Column(JSON, nullable=True)
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now())
+
+class WeatherDay(Base):
+    """Кэш дневной погоды Open-Meteo по округлённым координатам.
+
+    Точка хранится целыми индексами сетки (сотые доли градуса), а не Float: сравнение
+    на равенство и уникальный ключ не зависят от представления 0.1 + 0.2.
+    source="forecast" — прогноз на дату поездки, source="historical" — архив за реальную
+    (прошлогоднюю) дату, на которую мапятся дни за горизонтом прогноза.
+    """
+    __tablename__ = "weather_days"
+    __table_args__ = (
+        UniqueConstraint("lat_idx", "lon_idx", "source", "day", name="uq_weather_days_point_source_day"),
+    )
+
+    id = Column(Integer, primary_key=True, index=True)
+    lat_idx = Column(Integer, nullable=False)  # round(lat * WEATHER_GRID_SCALE)
+    lon_idx = Column(Integer, nullable=False)
+    source = Column(String, nullable=False)  # forecast, historical
+    day = Column(Date, nullable=False)
+    data = Column(JSON, nullable=False)  # temp_max, temp_min, weathercode, humidity, uv_index, wind_speed
+    fetched_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+
+WEATHER_GRID_SCALE = 100  # шаг сетки weather_days — 0.01°
+
+
+def weather_grid_index(value: float) -> int:
+    return int(round(float(value) * WEATHER_GRID_SCALE))
+
 class Notification(Base):
     __tablename__ = "notifications"
 
@@ -0,0 +1,260 @@
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+
+# WMO-коды с осадками в виде дождя: морось (51-55), дождь (61-67), ливни (80-82)
+RAIN_CODES = frozenset({51, 53, 55, 61, 63, 65, 66, 67, 80, 81, 82})
+
+SWIM_COUNTRIES = frozenset({"TH", "ES", "GR", "IT", "TR", "EG"})
+TROPICAL_COUNTRIES = frozenset({"TH", "VN", "KH", "LA", "MM", "ID", "MY", "PH", "IN", "LK", "MV", "BR", "CO", "MX", "CR", "CU", "KE", "TZ", "NG"})
+CONSERVATIVE_COUNTRIES = frozenset({"SA", "AE", "QA", "OM", "KW", "BH", "IR", "EG", "JO", "MA"})
+TEMPLE_COUNTRIES = frozenset({"TH", "KH", "LA", "MM", "IN", "LK", "JP", "CN"})
+RUSSIAN_SPEAKING_COUNTRIES = frozenset({"RU", "BY", "KZ", "KG", "UA", "MD"})
+VOLTAGE_110_COUNTRIES = frozenset({"US", "CA", "MX", "JP", "CO", "BR", "CU"})
+VISA_COUNTRIES = frozenset({"FR", "DE", "IT", "ES", "GB", "US", "CN", "JP", "TR", "EG", "TH", "IN", "AU", "NZ", "BR", "CA"})
+ADAPTER_COUNTRIES = frozenset({"US", "GB", "AU", "JP", "CN", "CH", "IN", "BR", "ZA"})
+
+
+@dataclass(frozen=True)
+class WeatherSummary:
+    trip_days: int
+    has_days: bool
+    avg_temp: Optional[float]
+    min_temp: float
+    max_temp: float
+    wmo_codes: frozenset
+    max_humidity: Optional[float]
+    max_uv_index: Optional[float]
+    max_wind_speed: Optional[float]
+
+
+@dataclass(frozen=True)
+class TripFacts:
+    weather: WeatherSummary
+    country: str
+    trip_type: str
+    transport: str
+    gender: str
+    traveling_with_pet: bool = False
+    has_allergies: bool = False
+    has_chronic_diseases: bool = False
+
+
+@dataclass(frozen=True)
+class PackingRule:
+    """Правило: если все заданные условия выполнены, в список попадают items (ключи ITEMS_DB)."""
+    items: tuple[str, ...]
+    trip_types: Optional[frozenset] = None
+    transports: Optional[frozenset] = None
+    genders: Optional[frozenset] = None
+    countries: Optional[frozenset] = None
+    # Страна известна и не входит в набор
+    exclude_countries: Optional[frozenset] = None
+    flags: tuple[str, ...] = ()
+    wmo_codes: Optional[frozenset] = None
+    # Полуинтервал [min_temp_from, min_temp_to) по минимальной температуре поездки
+    min_temp_from: Optional[float] = None
+    min_temp_to: Optional[float] = None
+    max_temp_above: Optional[float] = None
+    avg_temp_above: Optional[float] = None
+    temp_range_above: Optional[float] = None
+    humidity_above: Optional[float] = None
+    uv_above: Optional[float] = None
+    wind_above: Optional[float] = None
+    trip_days_above: Optional[int] = None
+
+
+def _rule(*items: str, **conditions) -> PackingRule:
+    return PackingRule(items=items, **conditions)
+
+
+def _one(value: str) -> frozenset:
+    return frozenset({value})
+
+
+RULES: tuple[PackingRule, ...] = (
+    # ========== BASE ESSENTIALS (always included) ==========
+    _rule("underwear", "socks", "pajamas", "towel", "copies_docs"),
+    _rule("toothbrush", "deodorant", "soap", "shampoo", "hairbrush", "sanitizer", "tissues"),
+    _rule("phone", "charger", "headphones"),
+    _rule("painkillers", "plasters", "activated_charcoal"),
+
+    # ========== DURATION ==========
+    _rule("laundry_bag", "packing_cubes", trip_days_above=7),
+    _rule("dry_shampoo", trip_days_above=3),
+
+    # ========== WEATHER ==========
+    _rule("styling", humidity_above=80),
+    _rule("sunscreen_50", "hat", "sunglasses", uv_above=5),
+    _rule("windbreaker", "chapstick", "scarf_buff", wind_above=30),
+    _rule("swimsuit", countries=SWIM_COUNTRIES),
+
+    # ========== HEALTH ==========
+    _rule("antihistamine", "allergies_list", flags=("has_allergies",)),
+    _rule("meds_personal", "meds_regular", "med_report", flags=("has_chronic_diseases",)),
+
+    # ========== GENDER ==========
+    _rule("makeup", "hygiene_fem", "makeup_remover", "cotton_pads", "nail_kit", genders=_one("female")),
+    _rule("dress", genders=_one("female"), avg_temp_above=15),
+    _rule("shaving_kit", genders=_one("male")),
+
+    # ========== TRANSPORT ==========
+    _rule("neck_pillow", "earplugs", "powerbank_hand", "liquids_bag", "eye_mask", transports=_one("plane")),
+    _rule("slippers_train", "mug", "powerbank", "clothes_train", "wipes", "eye_mask", transports=_one("train")),
+    _rule("license", "car_charger", "snacks_water", "playlist", "sunglasses_driver", transports=_one("car")),
+    _rule("neck_pillow", "earplugs", "snacks_water", "wipes", "eye_mask", transports=_one("bus")),
+
+    # ========== TEMPERATURE ==========
+    _rule("jacket_warm", "hat", "scarf", "gloves", "thermo", "boots_winter", "socks_warm", "hand_cream", "chapstick", min_temp_to=-10),
+    _rule("jacket_warm", "hat", "scarf", "gloves", "thermo", "boots_winter", "socks_warm", min_temp_from=-10, min_temp_to=0),
+    _rule("jacket_light", "sweater", "jeans", "sneakers", "hoodie", min_temp_from=0, min_temp_to=10),
+    _rule("tshirt", "jeans", "sneakers", "jacket_light", "long_sleeve", min_temp_from=10, min_temp_to=18),
+    _rule("tshirt", "shorts", "cap", "shoes_light", min_temp_from=18),
+    _rule("raincoat", "umbrella", wmo_codes=RAIN_CODES),
+    _rule("sunglasses", "cap", "sunscreen", max_temp_above=22),
+    _rule("water_bottle", max_temp_above=20),
+    _rule("hoodie", "long_sleeve", temp_range_above=15),
+
+    # ========== PET ==========
+    _rule("vet_passport", "pet_food", "pet_bowl", "leash", "pet_pads", "pet_toy", flags=("traveling_with_pet",)),
+
+    # ========== TRIP TYPE ==========
+    _rule("suit", "shirts", "shoes_formal", "laptop", "business_cards", "perfume", trip_types=_one("business")),
+    _rule("sportswear", "sneakers", "backpack_walk", "water_bottle", "first_aid_kit", "motion_sickness", trip_types=_one("active")),
+    _rule("swimsuit", "pareo", "flipflops", "beach_towel", "after_sun", "beach_bag", "sunscreen_50", trip_types=_one("beach")),
+    _rule("ski_suit", "thermo", "fleece", "mittens", "goggles", "wind_cream", "hand_cream", "chapstick", trip_types=_one("winter")),
+    _rule("baby_food", "diapers", "baby_wipes", "stroller", "kids_toys", "kids_clothes", "child_meds", "baby_sunscreen", "sippy_cup", "snacks_water", trip_types=_one("family")),
+    _rule("fancy_outfit", "perfume", trip_types=_one("romantic")),
+    _rule("heels", "jewelry", trip_types=_one("romantic"), genders=_one("female")),
+    _rule("tent", "sleeping_bag", "sleeping_pad", "camp_stove", "camping_cookware", "multitool", "matches", "headlamp", "bug_net", "trash_bags", "rope", "dry_bag", "flashlight", "first_aid_kit", trip_types=_one("camping")),
+    _rule("comfy_shoes", "city_backpack", "portable_charger", "guidebook", "camera", trip_types=_one("city_break")),
+
+    # ========== REGIONAL ==========
+    _rule("insect_spray", "bite_cream", "diarrhea_meds", "sunscreen_50", countries=TROPICAL_COUNTRIES),
+    _rule("closed_clothing", "head_covering", countries=CONSERVATIVE_COUNTRIES),
+    _rule("closed_clothing", countries=TEMPLE_COUNTRIES),
+    _rule("phrasebook", exclude_countries=RUSSIAN_SPEAKING_COUNTRIES),
+    _rule("converter_110v", countries=VOLTAGE_110_COUNTRIES),
+    _rule("visa", countries=VISA_COUNTRIES),
+    _rule("adapter", countries=ADAPTER_COUNTRIES),
+)
+
+
+def summarize_weather(daily_data: dict[str, dict], start_dt: datetime, end_dt: datetime) -> WeatherSummary:
+    """Сводка по дням поездки — всё, что нужно правилам, считается один раз."""
+    days = list(daily_data.values())
+    temps = [(day["temp_min"] + day["temp_max"]) / 2 for day in days]
+    humidities = [day["humidity"] for day in days if day.get("humidity")]
+    uv_indices = [day["uv_index"] for day in days if day.get("uv_index")]
+    wind_speeds = [day["wind_speed"] for day in days if day.get("wind_speed")]
+    return WeatherSummary(
+        trip_days=max((end_dt.date() - start_dt.date()).days + 1, 1),
+        has_days=bool(days),
+        avg_temp=round(sum(temps) / len(temps), 1) if temps else None,
+        min_temp=min(day["temp_min"] for day in days) if days else 15,
+        max_temp=max(day["temp_max"] for day in days) if days else 20,
+        wmo_codes=frozenset(day.get("weathercode") for day in days),
+        max_humidity=max(humidities) if humidities else None,
+        max_uv_index=max(uv_indices) if uv_indices else None,
+        max_wind_speed=max(wind_speeds) if wind_speeds else None,
+    )
+
+
+def _above(value: Optional[float], threshold: float) -> bool:
+    return value is not None and value > threshold
+
+
+# Фабрики проверок: (поле правила) -> параметр условия -> предикат над фактами
+_CONDITION_TESTS: dict[str, Callable[..., Callable[[TripFacts], bool]]] = {
+    "exclude_countries": lambda excluded: lambda facts: bool(facts.country) and facts.country not in excluded,
+    "wmo_codes": lambda codes: lambda facts: not codes.isdisjoint(facts.weather.wmo_codes),
+    "min_temp_from": lambda low: lambda facts: facts.weather.min_temp >= low,
+    "min_temp_to": lambda high: lambda facts: facts.weather.min_temp < high,
+    "max_temp_above": lambda threshold: lambda facts: facts.weather.max_temp > threshold,
+    "avg_temp_above": lambda threshold: lambda facts: _above(facts.weather.avg_temp, threshold),
+    "temp_range_above": lambda threshold: lambda facts: (
+        facts.weather.has_days and facts.weather.max_temp - facts.weather.min_temp > threshold
+    ),
+    "humidity_above": lambda threshold: lambda facts: _above(facts.weather.max_humidity, threshold),
+    "uv_above": lambda threshold: lambda facts: _above(facts.weather.max_uv_index, threshold),
+    "wind_above": lambda threshold: lambda facts: _above(facts.weather.max_wind_speed, threshold),
+    "trip_days_above": lambda threshold: lambda facts: facts.weather.trip_days > threshold,
+}
+
+# Дискретные измерения: (поле правила, поле фактов)
+_INDEXED_DIMENSIONS = (
+    ("trip_types", "trip_type"),
+    ("transports", "transport"),
+    ("genders", "gender"),
+    ("countries", "country"),
+)
+
+_CompiledRule = tuple[frozenset, frozenset]
+
+
+class CompiledRules:
+    """Правила, скомпилированные один раз при импорте.
+
+    Каждое уникальное условие (порог, набор кодов, флаг) становится признаком, который
+    вычисляется по фактам ровно один раз. Правило — это множество нужных признаков;
+    правила с trip_type/transport/gender/country лежат в словарях по первому такому
+    измерению, так что evaluate смотрит только на кандидатов.
+    """
+
+    def __init__(self, rules: tuple[PackingRule, ...]):
+        self._features: dict[tuple, Callable[[TripFacts], bool]] = {}
+        always: set[str] = set()
+        self._generic: list[_CompiledRule] = []
+        self._indexes: list[tuple[str, dict[str, list[_CompiledRule]]]] = [
+            (facts_field, {}) for _, facts_field in _INDEXED_DIMENSIONS
+        ]
+        for rule in rules:
+            required = set()
+            for field_name, make_test in _CONDITION_TESTS.items():
+                value = getattr(rule, field_name)
+                if value is not None:
+                    required.add(self._feature((field_name, value), make_test(value)))
+            for flag in rule.flags:
+                required.add(self._feature(("flag", flag), lambda facts, flag=flag: bool(getattr(facts, flag))))
+
+            dimensions = [
+                (position, getattr(rule, rule_field))
+                for position, (rule_field, _) in enumerate(_INDEXED_DIMENSIONS)
+                if getattr(rule, rule_field) is not None
+            ]
+            if dimensions:
+                (position, values), *rest = dimensions
+                for rest_position, rest_values in rest:
+                    facts_field = _INDEXED_DIMENSIONS[rest_position][1]
+                    required.add(self._feature(
+                        (facts_field, rest_values),
+                        lambda facts, field=facts_field, allowed=rest_values: getattr(facts, field) in allowed,
+                    ))
+                index = self._indexes[position][1]
+                for value in values:
+                    index.setdefault(value, []).append((frozenset(required), frozenset(rule.items)))
+            elif required:
+                self._generic.append((frozenset(required), frozenset(rule.items)))
+            else:
+                always.update(rule.items)
+        self._always = frozenset(always)
+
+    def _feature(self, key: tuple, test: Callable[[TripFacts], bool]) -> tuple:
+        self._features.setdefault(key, test)
+        return key
+
+    def evaluate(self, facts: TripFacts) -> set[str]:
+        active = {key for key, test in self._features.items() if test(facts)}
+        result = set(self._always)
+        for required, items in self._generic:
+            if required <= active:
+                result |= items
+        for facts_field, index in self._indexes:
+            for required, items in index.get(getattr(facts, facts_field), ()):
+                if required <= active:
+                    result |= items
+        return result
+
+
+PACKING_RULES = CompiledRules(RULES)
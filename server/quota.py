@@ -0,0 +1,169 @@
+import asyncio
+import os
+import time
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Optional
+
+import crud
+from database import SessionLocal
+from rate_limit import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, TokenBucket
+
+
+# Квоты платных/лимитированных API. Месячный расход хранится в api_usage (общий для
+# кластера), поминутный лимит — token bucket в процессе. 0 в бюджете = без месячного лимита.
+QUOTA_USAGE_SYNC_SECONDS = 60
+# Фоновым задачам оставляем только бюджет сверх этой доли: остаток — для пользователей
+QUOTA_BACKGROUND_RESERVE_RATIO = float(os.getenv("QUOTA_BACKGROUND_RESERVE_RATIO", "0.2"))
+# Сколько интерактивный запрос готов ждать токен, прежде чем уйти в деградацию
+QUOTA_INTERACTIVE_MAX_WAIT_SECONDS = 5.0
+
+
+@dataclass(frozen=True)
+class QuotaSettings:
+    monthly_budget: int
+    per_minute: float
+
+
+QUOTA_SETTINGS: dict[str, QuotaSettings] = {
+    "google_places": QuotaSettings(
+        monthly_budget=int(os.getenv("RAPIDAPI_PLACES_MONTHLY_BUDGET", "1000")),
+        per_minute=float(os.getenv("RAPIDAPI_PLACES_PER_MINUTE", "30")),
+    ),
+    "booking": QuotaSettings(
+        monthly_budget=int(os.getenv("BOOKING_MONTHLY_CALL_BUDGET", "530")),
+        per_minute=float(os.getenv("BOOKING_PER_MINUTE", "10")),
+    ),
+    "travelpayouts": QuotaSettings(
+        monthly_budget=int(os.getenv("TRAVELPAYOUTS_MONTHLY_BUDGET", "0")),
+        per_minute=float(os.getenv("TRAVELPAYOUTS_PER_MINUTE", "60")),
+    ),
+    "gemini": QuotaSettings(
+        monthly_budget=int(os.getenv("GEMINI_MONTHLY_BUDGET", "0")),
+        per_minute=float(os.getenv("GEMINI_PER_MINUTE", "15")),
+    ),
+}
+
+
+def usage_period(now: Optional[datetime] = None) -> str:
+    """Квоты провайдеров считаются по календарному месяцу (UTC)."""
+    return (now or datetime.utcnow()).strftime("%Y-%m")
+
+
+class ProviderQuota:
+    """Бюджет одного провайдера: месячный лимит (Postgres) + поминутный token bucket.
+
+    Интерактивные запросы тратят бюджет до конца и ждут токен до
+    QUOTA_INTERACTIVE_MAX_WAIT_SECONDS; фоновые уступают, когда остаток бюджета меньше
+    резерва, и не ждут токенов. False из acquire означает «отдай кэш/заглушку».
+    """
+
+    def __init__(self, provider: str, settings: QuotaSettings):
+        self.provider = provider
+        self.settings = settings
+        self._bucket = TokenBucket(settings.per_minute / 60.0, capacity=max(settings.per_minute / 6.0, 1.0))
+        self._blocked_until = 0.0
+        self._used: Optional[int] = None
+        self._used_period = ""
+        self._synced_at = 0.0
+        self._counters = {
+            "granted": 0,
+            "denied_budget": 0,
+            "denied_rate": 0,
+            "yielded_background": 0,
+            "rate_limited": 0,
+        }
+
+    async def sync_usage(self) -> None:
+        period = usage_period()
+        if self._used_period == period and time.monotonic() - self._synced_at < QUOTA_USAGE_SYNC_SECONDS:
+            return
+        try:
+            async with SessionLocal() as session:
+                self._used = await crud.get_api_usage(session, self.provider, period)
+            self._used_period = period
+        except Exception as e:
+            print(f"Quota usage read error ({self.provider}): {e}")
+        self._synced_at = time.monotonic()
+
+    def remaining(self) -> Optional[int]:
+        if not self.settings.monthly_budget or self._used is None:
+            return None
+        return max(self.settings.monthly_budget - self._used, 0)
+
+    async def _record(self) -> None:
+        period = usage_period()
+        try:
+            async with SessionLocal() as session:
+                self._used = await crud.increment_api_usage(session, self.provider, period)
+            self._used_period = period
+            self._synced_at = time.monotonic()
+        except Exception as e:
+            # Счётчик не записали — считаем локально, следующая синхронизация поправит
+            print(f"Quota usage record error ({self.provider}): {e}")
+            if self._used is not None:
+                self._used += 1
+
+    async def acquire(self, priority: int = PRIORITY_INTERACTIVE) -> bool:
+        if self.settings.monthly_budget:
+            await self.sync_usage()
+            remaining = self.remaining()
+            if remaining is not None:
+                if remaining <= 0:
+                    self._counters["denied_budget"] += 1
+                    return False
+                if priority >= PRIORITY_BACKGROUND and remaining <= self.settings.monthly_budget * QUOTA_BACKGROUND_RESERVE_RATIO:
+                    self._counters["yielded_background"] += 1
+                    return False
+
+        if not await self._take_token(priority):
+            self._counters["denied_rate"] += 1
+            return False
+
+        self._counters["granted"] += 1
+        await self._record()
+        return True
+
+    async def _take_token(self, priority: int) -> bool:
+        if priority >= PRIORITY_BACKGROUND:
+            return time.monotonic() >= self._blocked_until and self._bucket.try_acquire()
+        deadline = time.monotonic() + QUOTA_INTERACTIVE_MAX_WAIT_SECONDS
+        while True:
+            now = time.monotonic()
+            if now >= self._blocked_until and self._bucket.try_acquire():
+                return True
+            wait = max(self._blocked_until - now, 1.0 / max(self._bucket.rate, 0.01))
+            if now + wait > deadline:
+                return False
+            await asyncio.sleep(wait)
+
+    def backoff(self, seconds: float) -> None:
+        """Провайдер ответил 429: все вызывающие ждут seconds, а не только этот запрос."""
+        self._counters["rate_limited"] += 1
+        self._blocked_until = max(self._blocked_until, time.monotonic() + seconds)
+
+    def metrics(self) -> dict:
+        return {
+            **self._counters,
+            "period": self._used_period or usage_period(),
+            "used": self._used,
+            "monthly_budget": self.settings.monthly_budget or None,
+            "remaining": self.remaining(),
+            "per_minute": self.settings.per_minute,
+        }
+
+
+QUOTAS: dict[str, ProviderQuota] = {
+    provider: ProviderQuota(provider, settings) for provider, settings in QUOTA_SETTINGS.items()
+}
+
+
+async def acquire_quota(provider: str, priority: int = PRIORITY_INTERACTIVE) -> bool:
+    return await QUOTAS[provider].acquire(priority)
+
+
+async def quota_metrics() -> dict:
+    for quota in QUOTAS.values():
+        if quota.settings.monthly_budget:
+            await quota.sync_usage()
+    return {provider: quota.metrics() for provider, quota in QUOTAS.items()}
@@ -0,0 +1,246 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Hashable, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from db_instrumentation import create_untracked_task
+
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+_PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_BACKGROUND: "background",
+}
+
+
+class TokenBucket:
+    """Классический token bucket: rate токенов в секунду, не больше capacity в запасе."""
+
+    def __init__(self, rate: float, capacity: float = 1.0):
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    def try_acquire(self, tokens: float = 1.0) -> bool:
+        self._refill()
+        if self._tokens >= tokens:
+            self._tokens -= tokens
+            return True
+        return False
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        async with self._lock:
+            while not self.try_acquire(tokens):
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+
+
+# Слот следующего запроса хранится в строке rate_limit_slots: upsert под блокировкой строки
+# сдвигает его на 1/rate и возвращает, сколько ждать до своего слота
+_RESERVE_SLOT_SQL = text("""
+    INSERT INTO rate_limit_slots (name, next_at)
+    VALUES (:name, CAST(clock_timestamp() AS timestamp) + make_interval(secs => :interval))
+    ON CONFLICT (name) DO UPDATE
+    SET next_at = GREATEST(rate_limit_slots.next_at, CAST(clock_timestamp() AS timestamp)) + make_interval(secs => :interval)
+    RETURNING EXTRACT(EPOCH FROM next_at - make_interval(secs => :interval) - CAST(clock_timestamp() AS timestamp))
+""")
+
+
+class ClusterRateLimiter:
+    """Лимит запросов на весь кластер (все воркеры и реплики), а не на процесс.
+
+    Тот же интерфейс, что у TokenBucket (acquire, rate), но без запаса: запросы идут не
+    чаще 1/rate секунды. Каждый acquire — один upsert в Postgres, соединение отдаётся в
+    пул до ожидания. Если база недоступна, лимит временно считается в процессе.
+    """
+
+    def __init__(self, name: str, rate: float, engine: AsyncEngine | None):
+        self.name = name
+        self.rate = rate
+        self.engine = engine
+        self.fallback = TokenBucket(rate, capacity=1)
+        self._lock = asyncio.Lock()
+
+    async def _reserve(self, interval: float) -> float:
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            wait = (await conn.execute(_RESERVE_SLOT_SQL, {"name": self.name, "interval": interval})).scalar()
+        return float(wait or 0.0)
+
+    async def acquire(self, tokens: float = 1.0) -> None:
+        if self.engine is None:
+            await self.fallback.acquire(tokens)
+            return
+        # Воркеры процесса резервируют слоты по очереди: ждать своего слота — не держа соединение
+        async with self._lock:
+            try:
+                wait = await self._reserve(tokens / self.rate)
+            except Exception as e:
+                print(f"Cluster rate limit {self.name} error, falling back to per-process limit: {e}")
+                await self.fallback.acquire(tokens)
+                return
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+
+class _Job:
+    __slots__ = ("key", "factory", "future", "priority", "enqueued_at", "waiters", "started")
+
+    def __init__(self, key: Hashable, factory: Callable[[], Awaitable[Any]], priority: int):
+        self.key = key
+        self.factory = factory
+        self.future: asyncio.Future = asyncio.get_running_loop().create_future()
+        self.priority = priority
+        self.enqueued_at = time.monotonic()
+        self.waiters = 0
+        self.started = False
+
+
+class RequestScheduler:
+    """Очередь запросов к внешнему API под общий token bucket.
+
+    - одинаковые запросы в полёте склеиваются (single-flight) по ключу;
+    - интерактивные запросы обгоняют фоновые, а фоновый запрос, к которому
+      присоединился интерактивный, поднимается в приоритете;
+    - если все ожидающие отвалились по таймауту, запрос не тратит токен.
+    """
+
+    def __init__(self, name: str, bucket: TokenBucket | ClusterRateLimiter, concurrency: int = 1):
+        self.name = name
+        self.bucket = bucket
+        self.concurrency = concurrency
+        self._heap: list[tuple[int, int, _Job]] = []
+        self._jobs: dict[Hashable, _Job] = {}
+        self._sequence = itertools.count()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._workers: list[asyncio.Task] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._counters = {
+            "submitted": 0,
+            "coalesced": 0,
+            "completed": 0,
+            "failed": 0,
+            "abandoned": 0,
+            "timeouts": 0,
+        }
+        self._max_queue_depth = 0
+        self._total_wait_seconds = 0.0
+
+    def _ensure_workers(self) -> None:
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            # Новый event loop (бот, скрипты): старые воркеры и очередь к нему не относятся
+            self._loop = loop
+            self._heap.clear()
+            self._jobs.clear()
+            self._workers = []
+            self._wakeup = asyncio.Event()
+        self._workers = [worker for worker in self._workers if not worker.done()]
+        while len(self._workers) < self.concurrency:
+            self._workers.append(create_untracked_task(self._worker()))
+
+    def _push(self, job: _Job) -> None:
+        heapq.heappush(self._heap, (job.priority, next(self._sequence), job))
+        self._max_queue_depth = max(self._max_queue_depth, self.queue_depth())
+        self._wakeup.set()
+
+    async def submit(
+        self,
+        key: Hashable,
+        factory: Callable[[], Awaitable[Any]],
+        priority: int = PRIORITY_INTERACTIVE,
+        timeout: Optional[float] = None,
+    ) -> Any:
+        """Выполнить factory() в порядке очереди; ждать не дольше timeout секунд."""
+        self._ensure_workers()
+        self._counters["submitted"] += 1
+        job = self._jobs.get(key)
+        if job is not None:
+            self._counters["coalesced"] += 1
+            if priority < job.priority and not job.started:
+                # Дубликат записи с более высоким приоритетом; старая будет пропущена
+                job.priority = priority
+                self._push(job)
+        else:
+            job = _Job(key, factory, priority)
+            self._jobs[key] = job
+            self._push(job)
+
+        job.waiters += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(job.future), timeout)
+        except asyncio.TimeoutError:
+            self._counters["timeouts"] += 1
+            raise
+        finally:
+            job.waiters -= 1
+
+    async def _worker(self) -> None:
+        while True:
+            while not self._heap:
+                self._wakeup.clear()
+                await self._wakeup.wait()
+            priority, _, job = heapq.heappop(self._heap)
+            if job.started or priority != job.priority:
+                continue
+            if job.waiters <= 0:
+                self._counters["abandoned"] += 1
+                self._finish(job)
+                job.future.cancel()
+                continue
+
+            await self.bucket.acquire()
+            if job.waiters <= 0:
+                self._counters["abandoned"] += 1
+                self._finish(job)
+                job.future.cancel()
+                continue
+            job.started = True
+            self._total_wait_seconds += time.monotonic() - job.enqueued_at
+            try:
+                result = await job.factory()
+            except Exception as e:
+                self._counters["failed"] += 1
+                job.future.set_exception(e)
+                # Исключение читают ожидающие; если их нет — не шумим в лог asyncio
+                job.future.exception()
+            else:
+                self._counters["completed"] += 1
+                job.future.set_result(result)
+            finally:
+                self._finish(job)
+
+    def _finish(self, job: _Job) -> None:
+        if self._jobs.get(job.key) is job:
+            del self._jobs[job.key]
+
+    def queue_depth(self, priority: Optional[int] = None) -> int:
+        return sum(
+            1
+            for job in self._jobs.values()
+            if not job.started and (priority is None or job.priority == priority)
+        )
+
+    def metrics(self) -> dict:
+        started = self._counters["completed"] + self._counters["failed"]
+        return {
+            **self._counters,
+            "queue_depth": {
+                name: self.queue_depth(priority) for priority, name in _PRIORITY_NAMES.items()
+            },
+            "max_queue_depth": self._max_queue_depth,
+            "in_flight": sum(1 for job in self._jobs.values() if job.started),
+            "avg_queue_wait_ms": round(self._total_wait_seconds / started * 1000, 1) if started else 0.0,
+            "rate_per_second": self.bucket.rate,
+        }
@@ -0,0 +1,193 @@
+import os
+from contextvars import ContextVar
+from typing import Optional
+
+from fastapi import Depends, HTTPException, Request
+from jose import JWTError, jwt
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from auth import ALGORITHM, SECRET_KEY, ensure_authenticated, oauth2_scheme, user_from_token
+from database import REPLICA_ENABLED, ReadSessionLocal, SessionLocal, async_engine, replica_engine
+from memory_cache import LRUCache
+
+
+# Read-your-writes: после записи пользователь читает с реплики, только когда она проиграла
+# WAL до LSN его последней записи. LSN отдаётся клиенту заголовком X-DB-LSN (клиент может
+# вернуть его с чтением — работает между воркерами) и запоминается в процессе по user_id
+# на READ_YOUR_WRITES_TTL_SECONDS (LRU на READ_YOUR_WRITES_MAX_USERS пользователей).
+DB_LSN_HEADER = "x-db-lsn"
+READ_YOUR_WRITES_TTL_SECONDS = float(os.getenv("READ_YOUR_WRITES_TTL_SECONDS", "60"))
+READ_YOUR_WRITES_MAX_USERS = int(os.getenv("READ_YOUR_WRITES_MAX_USERS", "10000"))
+WRITE_METHODS = {"POST", "PUT", "PATCH", "DELETE"}
+# Statement'ы, после которых LSN не нужен: запрос, который только читал, реплику не обгоняет
+_READ_ONLY_PREFIXES = ("SELECT", "SHOW")
+
+_USER_WRITE_LSN = LRUCache(READ_YOUR_WRITES_MAX_USERS)
+# Отметка «запрос писал в primary» для ReadYourWritesMiddleware
+_REQUEST_WROTE: ContextVar[Optional[dict]] = ContextVar("request_wrote_primary", default=None)
+_COUNTERS = {
+    "replica_reads": 0,
+    "primary_reads": 0,
+    "lag_fallbacks": 0,
+    "replica_errors": 0,
+    "writes_tracked": 0,
+}
+
+
+def _lsn_value(lsn: Optional[str]) -> int:
+    """'16/B374D848' -> число для сравнения; мусор -> 0."""
+    try:
+        high, low = (lsn or "").split("/")
+        return (int(high, 16) << 32) | int(low, 16)
+    except ValueError:
+        return 0
+
+
+def _bearer_token(authorization: str) -> Optional[str]:
+    scheme, _, token = authorization.partition(" ")
+    return token if scheme.lower() == "bearer" and token else None
+
+
+def _user_id_from_token(token: Optional[str]) -> Optional[int]:
+    if not token:
+        return None
+    try:
+        user_id = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM]).get("sub")
+        return int(user_id) if user_id is not None else None
+    except (JWTError, ValueError):
+        return None
+
+
+def _remember_write(user_id: int, lsn: str) -> None:
+    _USER_WRITE_LSN.put(user_id, lsn)
+    _COUNTERS["writes_tracked"] += 1
+
+
+def _required_lsn(request: Request, user_id: Optional[int]) -> Optional[str]:
+    candidates = [request.headers.get(DB_LSN_HEADER)]
+    if user_id is not None:
+        candidates.append(_USER_WRITE_LSN.get(user_id, ttl=READ_YOUR_WRITES_TTL_SECONDS))
+    candidates = [lsn for lsn in candidates if _lsn_value(lsn)]
+    return max(candidates, key=_lsn_value) if candidates else None
+
+
+async def _replica_has_replayed(lsn: str) -> bool:
+    async with replica_engine.connect() as conn:
+        row = (await conn.execute(
+            text("SELECT pg_is_in_recovery(), pg_last_wal_replay_lsn() >= CAST(:lsn AS pg_lsn)"),
+            {"lsn": lsn},
+        )).one()
+    in_recovery, replayed = row
+    # Не в recovery — это сам primary (одна база в обеих ролях), он всегда актуален
+    return not in_recovery or bool(replayed)
+
+
+async def _read_session_factory(request: Request, user_id: Optional[int]):
+    if not REPLICA_ENABLED:
+        return SessionLocal
+    required_lsn = _required_lsn(request, user_id)
+    if required_lsn:
+        try:
+            if not await _replica_has_replayed(required_lsn):
+                _COUNTERS["lag_fallbacks"] += 1
+                _COUNTERS["primary_reads"] += 1
+                return SessionLocal
+        except Exception as e:
+            print(f"Replica lag check error: {e}")
+            _COUNTERS["replica_errors"] += 1
+            _COUNTERS["primary_reads"] += 1
+            return SessionLocal
+    _COUNTERS["replica_reads"] += 1
+    return ReadSessionLocal
+
+
+async def get_read_db(request: Request, token: Optional[str] = Depends(oauth2_scheme)):
+    """Сессия только для чтения: реплика, либо primary, если реплика ещё не видит запись пользователя.
+
+    Пользователя определяет только по токену, без запроса к базе: в паре с ней
+    get_current_read_user читает его этой же сессией, а не через get_db на primary.
+    """
+    session_factory = await _read_session_factory(request, _user_id_from_token(token))
+    async with session_factory() as session:
+        try:
+            yield session
+        except HTTPException:
+            await session.rollback()
+            raise
+        except Exception as e:
+            await session.rollback()
+            raise HTTPException(status_code=503, detail=f"Ошибка БД: {str(e)}")
+
+
+async def get_current_read_user(
+    token: Optional[str] = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """get_current_user для эндпоинтов на get_read_db: пользователь читается той же сессией."""
+    return await user_from_token(token, db)
+
+
+async def require_current_read_user(user=Depends(get_current_read_user)):
+    return ensure_authenticated(user)
+
+
+def _mark_primary_write(conn, cursor, statement, parameters, context, executemany):
+    marker = _REQUEST_WROTE.get()
+    if marker is not None and not marker["wrote"] and not statement.lstrip().upper().startswith(_READ_ONLY_PREFIXES):
+        marker["wrote"] = True
+
+
+if REPLICA_ENABLED:
+    event.listen(async_engine.sync_engine, "before_cursor_execute", _mark_primary_write)
+
+
+async def current_primary_lsn() -> str:
+    async with async_engine.connect() as conn:
+        return (await conn.execute(text("SELECT pg_current_wal_lsn()::text"))).scalar_one()
+
+
+class ReadYourWritesMiddleware:
+    """После успешного изменяющего запроса: LSN primary в заголовок X-DB-LSN и в память по user_id.
+
+    LSN запрашивается, только если запрос действительно что-то записал в primary
+    (не SELECT через async_engine): POST-поиски и отклонённые изменения его не платят.
+    Сессия get_db к этому моменту уже закоммичена (зависимость закрывается до отправки ответа).
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if not REPLICA_ENABLED or scope["type"] != "http" or scope.get("method") not in WRITE_METHODS:
+            await self.app(scope, receive, send)
+            return
+
+        marker = {"wrote": False}
+
+        async def send_with_lsn(message):
+            if message["type"] == "http.response.start" and message["status"] < 400 and marker["wrote"]:
+                try:
+                    lsn = await current_primary_lsn()
+                except Exception as e:
+                    print(f"Primary LSN read error: {e}")
+                else:
+                    headers = dict(scope.get("headers") or [])
+                    user_id = _user_id_from_token(_bearer_token(headers.get(b"authorization", b"").decode("latin-1")))
+                    if user_id is not None:
+                        _remember_write(user_id, lsn)
+                    message = {
+                        **message,
+                        "headers": list(message.get("headers", [])) + [(DB_LSN_HEADER.encode(), lsn.encode())],
+                    }
+            await send(message)
+
+        token = _REQUEST_WROTE.set(marker)
+        try:
+            await self.app(scope, receive, send_with_lsn)
+        finally:
+            _REQUEST_WROTE.reset(token)
+
+
+def read_replica_metrics() -> dict:
+    return {**_COUNTERS, "enabled": REPLICA_ENABLED, "tracked_users": len(_USER_WRITE_LSN)}
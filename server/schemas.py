@@ -129,6 +129,7 @@ class DailyForecast(BaseModel):
     humidity: Optional[float] = None
     uv_index: Optional[float] = None
     wind_speed: Optional[float] = None
+    precipitation_probability: Optional[float] = None
     source: Optional[str] = "forecast"
 
 class ItineraryEventCreate(BaseModel):
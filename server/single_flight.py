@@ -0,0 +1,126 @@
+import asyncio
+import hashlib
+import os
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Awaitable, Callable
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from db_instrumentation import create_untracked_task
+
+
+def advisory_lock_key(namespace: str, key: str) -> int:
+    """Стабильный (между процессами) signed bigint для pg_advisory_*lock."""
+    digest = hashlib.blake2b(f"{namespace}:{key}".encode("utf-8"), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+# Как часто ждущий воркер проверяет, освободил ли лидер блокировку
+ADVISORY_LOCK_POLL_SECONDS = 0.25
+# Сколько соединений под advisory lock процесс держит одновременно (они вне пула, но
+# max_connections у Postgres общий); остальные лидеры ждут своей очереди
+ADVISORY_LOCK_MAX_CONNECTIONS = int(os.getenv("ADVISORY_LOCK_MAX_CONNECTIONS", "8"))
+_LOCK_CONNECTIONS = asyncio.Semaphore(ADVISORY_LOCK_MAX_CONNECTIONS)
+
+
+@asynccontextmanager
+async def session_advisory_lock(engine: AsyncEngine, lock_key: int) -> AsyncIterator[bool]:
+    """pg_try_advisory_lock на отдельном соединении в autocommit; отдаёт True, если блокировка взята.
+
+    engine — database.lock_engine (NullPool): блок может идти долго и открывать свои сессии,
+    поэтому соединение под блокировкой не берётся из пула приложения. Оно занято только
+    внутри блока и не висит в открытой транзакции. Если снять блокировку не удалось,
+    соединение закрывается (а с ним и блокировка), а не возвращается.
+    """
+    async with _LOCK_CONNECTIONS, engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        acquired = bool((await conn.execute(text("SELECT pg_try_advisory_lock(:key)"), {"key": lock_key})).scalar())
+        try:
+            yield acquired
+        finally:
+            if acquired:
+                try:
+                    await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": lock_key})
+                except Exception as e:
+                    print(f"Advisory unlock error: {e}")
+                    await conn.invalidate()
+
+
+class ClusterSingleFlight:
+    """Single-flight на весь кластер: один исполнитель на ключ среди всех воркеров и реплик.
+
+    Внутри процесса одновременные вызовы с одним ключом ждут одну задачу. Между
+    процессами задача выполняется под pg_try_advisory_lock: остальные воркеры опрашивают
+    блокировку, не держа соединений из пула, а factory после неё должна сначала
+    перепроверить кэш — к этому моменту там уже лежит результат лидера. Задачи хранятся
+    только пока выполняются.
+    """
+
+    def __init__(self, name: str, engine: AsyncEngine | None, lock_timeout_seconds: float = 30.0):
+        self.name = name
+        self.engine = engine
+        self.lock_timeout_seconds = lock_timeout_seconds
+        self._inflight: dict[str, asyncio.Task] = {}
+        self._counters = {
+            "leaders": 0,
+            "coalesced_local": 0,
+            "coalesced_remote": 0,
+            "lock_timeouts": 0,
+            "lock_errors": 0,
+        }
+        self._lock_wait_total = 0.0
+
+    async def _run_locked(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        if self.engine is None:
+            return await factory()
+        lock_key = advisory_lock_key(self.name, key)
+        started = time.monotonic()
+        waited = False
+        while True:
+            locked = False
+            try:
+                async with session_advisory_lock(self.engine, lock_key) as acquired:
+                    if acquired:
+                        locked = True
+                        if waited:
+                            self._lock_wait_total += time.monotonic() - started
+                        return await factory()
+            except Exception as e:
+                if locked:
+                    raise
+                # Не смогли проверить блокировку (БД недоступна) — лучше сделать запрос, чем отказать
+                self._counters["lock_errors"] += 1
+                print(f"{self.name} advisory lock error for {key}: {e}")
+                return await factory()
+
+            # Ключ уже обновляет другой воркер: соединение вернули в пул, ждём опросом
+            if not waited:
+                waited = True
+                self._counters["coalesced_remote"] += 1
+            if time.monotonic() - started >= self.lock_timeout_seconds:
+                self._counters["lock_timeouts"] += 1
+                self._lock_wait_total += time.monotonic() - started
+                print(f"{self.name} advisory lock timeout for {key}")
+                return await factory()
+            await asyncio.sleep(ADVISORY_LOCK_POLL_SECONDS)
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is not None:
+            self._counters["coalesced_local"] += 1
+        else:
+            self._counters["leaders"] += 1
+            task = create_untracked_task(self._run_locked(key, factory))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: отключившийся клиент не отменяет работу, которую ждут остальные
+        return await asyncio.shield(task)
+
+    def metrics(self) -> dict:
+        return {
+            **self._counters,
+            "inflight": len(self._inflight),
+            "lock_wait_seconds_total": round(self._lock_wait_total, 3),
+        }
@@ -652,7 +652,6 @@ async def toggle_interactive_checklist_item(
             }
 
         item_name = view["items"][item_index]["name"]
-        normalized_item = _normalize_text(item_name)
         selected_mode = _normalize_interaction_mode(interaction_mode)
 
         def _compute_next_packed(current_packed: int, needed: int) -> int:
@@ -689,20 +688,18 @@ async def toggle_interactive_checklist_item(
             quantity_map,
             getattr(backpack, "packed_quantities", None),
         )
-        removed_items = [item for item in (backpack.removed_items or []) if _normalize_text(item) != normalized_item]
         needed_quantity = _get_item_quantity(quantity_map, item_name)
         previous_packed = _get_item_packed_quantity(packed_map, item_name)
         next_packed = _compute_next_packed(previous_packed, needed_quantity)
-        if next_packed > 0:
-            packed_map[normalized_item] = next_packed
-        else:
-            packed_map.pop(normalized_item, None)
-        backpack.packed_quantities = packed_map
-        backpack.checked_items = [
-            item for item in (backpack.items or [])
-            if _get_item_packed_quantity(packed_map, item) >= _get_item_quantity(quantity_map, item)
-        ]
-        backpack.removed_items = removed_items
+        # Меняется одна вещь — пишем только её строку
+        await crud.set_checklist_item(
+            db,
+            backpack,
+            item_name,
+            packed_quantity=next_packed or None,
+            is_checked=next_packed >= needed_quantity,
+            is_removed=False,
+        )
         feedback_message = _build_feedback(previous_packed, next_packed, needed_quantity)
 
         await db.commit()
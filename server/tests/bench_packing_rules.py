@@ -0,0 +1,70 @@
+"""Микробенчмарк правил упаковки на матрице golden-тестов.
+
+    python tests/bench_packing_rules.py [--repeat 200]
+
+Меряет то, что build_packing_data делает на каждый сегмент поездки без сети: сводку
+погоды, PACKING_RULES.evaluate и перевод ключей в названия вещей.
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from packing_matrix import WEATHER_SCENARIOS, packing_cases  # noqa: E402
+from packing_rules import PACKING_RULES, TripFacts, summarize_weather  # noqa: E402
+from translations import get_item  # noqa: E402
+
+
+def _inputs() -> list[tuple[dict, dict, datetime, datetime]]:
+    start_dt = datetime(2026, 1, 1)
+    inputs = []
+    for case in packing_cases():
+        trip_days, days = WEATHER_SCENARIOS[case["weather"]]
+        daily_data = {(start_dt + timedelta(days=offset)).strftime("%Y-%m-%d"): day for offset, day in enumerate(days)}
+        inputs.append((case, daily_data, start_dt, start_dt + timedelta(days=trip_days - 1)))
+    return inputs
+
+
+def _run_once(inputs) -> None:
+    for case, daily_data, start_dt, end_dt in inputs:
+        weather = summarize_weather(daily_data, start_dt, end_dt)
+        keys = PACKING_RULES.evaluate(TripFacts(
+            weather=weather,
+            country=case["country"],
+            trip_type=case["trip_type"],
+            transport=case["transport"],
+            gender=case["gender"],
+            traveling_with_pet=case["traveling_with_pet"],
+            has_allergies=case["has_allergies"],
+            has_chronic_diseases=case["has_chronic_diseases"],
+        ))
+        {get_item(key, "ru") for key in keys}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    inputs = _inputs()
+    _run_once(inputs)  # прогрев
+    timings = []
+    for _ in range(args.repeat):
+        started = time.perf_counter()
+        _run_once(inputs)
+        timings.append((time.perf_counter() - started) / len(inputs))
+    print(
+        f"{len(inputs)} profiles x {args.repeat}: "
+        f"median {statistics.median(timings) * 1e6:.1f} µs, "
+        f"p95 {sorted(timings)[int(len(timings) * 0.95)] * 1e6:.1f} µs per profile"
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""Фиксированная матрица поездок для golden-тестов и бенчмарка правил упаковки."""
+
+from itertools import product
+
+
+def _days(count: int, temp_min: float, temp_max: float, code: int, humidity: float, uv: float, wind: float) -> list[dict]:
+    return [
+        {
+            "temp_min": temp_min,
+            "temp_max": temp_max,
+            "weathercode": code,
+            "humidity": humidity,
+            "uv_index": uv,
+            "wind_speed": wind,
+        }
+        for _ in range(count)
+    ]
+
+
+# Сценарий: (длительность поездки в днях, погода по дням). Пустой список — прогноза нет
+WEATHER_SCENARIOS: dict[str, tuple[int, list[dict]]] = {
+    "extreme_cold": (3, _days(3, -18, -9, 71, 70, 1, 20)),
+    "cold_snow": (5, _days(5, -6, 2, 73, 75, 1, 15)),
+    "cool_rain_wind": (4, _days(2, 4, 12, 61, 85, 2, 35) + _days(2, 6, 14, 3, 70, 3, 20)),
+    "mild_drizzle": (6, _days(6, 12, 19, 53, 60, 4, 10)),
+    "warm_uv_long": (9, _days(9, 20, 30, 0, 50, 8, 12)),
+    "hot_humid_showers": (8, _days(8, 24, 33, 81, 88, 11, 15)),
+    "desert_range": (5, _days(5, 8, 35, 1, 20, 9, 40)),
+    # Пороги ровно на границе и чуть выше: минимум -10/0/10/18, максимум 20/22, разброс 15,
+    # средняя 15, влажность 80, UV 5, ветер 30, длительность 3/7 дней
+    "thresholds_at": (7, _days(7, 0, 20, 2, 80, 5, 30)),
+    "thresholds_above": (8, _days(8, 10, 22.5, 45, 80.5, 5.5, 30.5)),
+    "thresholds_warm": (4, _days(4, 18, 23, 3, 81, 6, 31)),
+    "thresholds_cold_edge": (3, _days(3, -10, -1, 71, 60, 1, 10)),
+    "thresholds_mild_edge": (3, _days(3, 10, 20, 80, 60, 3, 10)),
+    "thresholds_max_edge": (2, _days(2, 12, 20.5, 2, 60, 3, 10)),
+    "thresholds_range_edge": (2, _days(1, 5, 20, 51, 60, 3, 10) + _days(1, 5, 20, 1, 60, 3, 10)),
+    "no_data": (4, []),
+}
+# Сценарии сетки погода x страна (WMO-проход ниже в неё не входит)
+GRID_SCENARIOS = tuple(WEATHER_SCENARIOS)
+
+# Все WMO-коды, которые отдаёт Open-Meteo: однодневная мягкая погода, меняется только код —
+# проверяет, что дождевые вещи зависят от кода, а не от текста описания
+WMO_SWEEP_CODES = (0, 1, 2, 3, 45, 48, 51, 53, 55, 61, 63, 65, 66, 67, 71, 73, 75, 77, 80, 81, 82, 85, 86, 95, 96, 99)
+for _code in WMO_SWEEP_CODES:
+    WEATHER_SCENARIOS[f"wmo_{_code}"] = (1, _days(1, 12, 18, _code, 60, 3, 10))
+
+COUNTRIES = ("RU", "TH", "EG", "US", "JP", "FR", "AE", "IN", "BR", "")
+TRIP_TYPES = ("business", "active", "beach", "winter", "family", "romantic", "camping", "city_break", "vacation", "")
+TRANSPORTS = ("plane", "train", "car", "bus")
+GENDERS = ("male", "female", "other")
+# (traveling_with_pet, has_allergies, has_chronic_diseases)
+FLAG_COMBOS = tuple(product((False, True), repeat=3))
+
+
+def packing_cases() -> list[dict]:
+    """Все профили x типы поездки x транспорт, вся сетка погода x страна и проход по WMO-кодам."""
+    cases = []
+    for index, (trip_type, transport, gender) in enumerate(product(TRIP_TYPES, TRANSPORTS, GENDERS)):
+        pet, allergies, chronic = FLAG_COMBOS[(index * 5) % len(FLAG_COMBOS)]
+        cases.append({
+            "weather": GRID_SCENARIOS[index % len(GRID_SCENARIOS)],
+            "country": COUNTRIES[(index * 3) % len(COUNTRIES)],
+            "trip_type": trip_type,
+            "transport": transport,
+            "gender": gender,
+            "traveling_with_pet": pet,
+            "has_allergies": allergies,
+            "has_chronic_diseases": chronic,
+        })
+    for index, (weather, country) in enumerate(product(GRID_SCENARIOS, COUNTRIES)):
+        cases.append({
+            "weather": weather,
+            "country": country,
+            "trip_type": TRIP_TYPES[index % len(TRIP_TYPES)],
+            "transport": TRANSPORTS[index % len(TRANSPORTS)],
+            "gender": GENDERS[index % len(GENDERS)],
+            "traveling_with_pet": False,
+            "has_allergies": False,
+            "has_chronic_diseases": False,
+        })
+    for code in WMO_SWEEP_CODES:
+        cases.append({
+            "weather": f"wmo_{code}",
+            "country": "",
+            "trip_type": "vacation",
+            "transport": "plane",
+            "gender": "other",
+            "traveling_with_pet": False,
+            "has_allergies": False,
+            "has_chronic_diseases": False,
+        })
+    return cases
+
+
+def case_id(case: dict) -> str:
+    flags = "".join(
+        flag[0] if case[name] else "-"
+        for name, flag in (("traveling_with_pet", "pet"), ("has_allergies", "allergies"), ("has_chronic_diseases", "chronic"))
+    )
+    return "-".join((case["weather"], case["country"] or "xx", case["trip_type"] or "none", case["transport"], case["gender"], flags))
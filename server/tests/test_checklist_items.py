@@ -0,0 +1,167 @@
+import asyncio
+from datetime import date, datetime
+
+import crud  # noqa: E402
+import main  # noqa: E402
+import models  # noqa: E402
+from db_instrumentation import track_queries  # noqa: E402
+
+
+async def _seed(db):
+    owner = models.User(username="alice", email="alice@example.com")
+    db.add(owner)
+    await db.flush()
+    checklist = models.Checklist(
+        city="Paris, France",
+        start_date=date(2026, 5, 1),
+        end_date=date(2026, 5, 5),
+        slug="trip",
+        user_id=owner.id,
+        hidden_sections=[],
+        daily_forecast=[{"date": "2026-05-01", "temp_min": 10, "temp_max": 20, "condition": "Ясно", "icon": "01d"}],
+        item_rows=[],
+    )
+    db.add(checklist)
+    await db.flush()
+    backpacks = [
+        models.UserBackpack(
+            checklist_id=checklist.id,
+            user_id=owner.id,
+            name=name,
+            sort_order=index,
+            is_default=index == 0,
+            editor_user_ids=[],
+            updated_at=datetime(2020, 1, 1),
+            item_rows=[],
+        )
+        for index, name in enumerate(("Рюкзак", "Чемодан"))
+    ]
+    db.add_all(backpacks)
+    await db.flush()
+    await crud.save_checklist_items(db, checklist, items=["Паспорт", "Зарядка", "Зонт"], item_quantities={"зонт": 2})
+    await crud.save_checklist_items(
+        db,
+        backpacks[0],
+        items=["Паспорт", "Носки"],
+        item_quantities={"носки": 3},
+        packed_quantities={"носки": 1},
+    )
+    await db.commit()
+    return owner, checklist, backpacks
+
+
+def _run(session_factory, scenario):
+    async def runner():
+        async with session_factory() as db:
+            seeded = await _seed(db)
+            return await scenario(db, *seeded)
+
+    return asyncio.run(runner())
+
+
+def _item_writes(stats) -> list[str]:
+    return [
+        shape
+        for shape, count in stats.shapes.items()
+        for _ in range(count)
+        if "checklist_items" in shape and not shape.startswith("SELECT")
+    ]
+
+
+def test_duplicate_spellings_collapse_into_one_row(session_factory):
+    async def scenario(db, owner, checklist, backpacks):
+        await crud.save_checklist_items(
+            db,
+            checklist,
+            items=["Паспорт", "паспорт ", "Ёлка", "елка", "Зарядка"],
+            checked_items=["Зарядка", "ПАСПОРТ"],
+            item_quantities={},
+        )
+        await db.commit()
+        return checklist
+
+    checklist = _run(session_factory, scenario)
+    assert checklist.items == ["Паспорт", "Ёлка", "Зарядка"]
+    assert len(checklist.item_rows) == 3
+    # Отметки читаются в порядке items, а не в порядке, в котором их прислали
+    assert checklist.checked_items == ["Паспорт", "Зарядка"]
+
+
+def test_toggle_updates_only_its_row(session_factory):
+    async def scenario(db, owner, checklist, backpacks):
+        backpack = backpacks[0]
+        untouched = {row.item_key: row.packed_quantity for row in backpack.item_rows if row.item_key != "паспорт"}
+        with track_queries() as stats:
+            await crud.set_checklist_item(db, backpack, "Паспорт", packed_quantity=1, is_checked=True)
+        await db.commit()
+        return backpack, untouched, stats
+
+    backpack, untouched, stats = _run(session_factory, scenario)
+    assert _item_writes(stats) == [
+        next(shape for shape in stats.shapes if shape.startswith("UPDATE checklist_items"))
+    ]
+    assert backpack.checked_items == ["Паспорт"]
+    assert backpack.packed_quantities == {"паспорт": 1, "носки": 1}
+    assert {row.item_key: row.packed_quantity for row in backpack.item_rows if row.item_key != "паспорт"} == untouched
+    assert backpack.updated_at > datetime(2020, 1, 1)
+
+
+def test_quantity_change_writes_one_row(session_factory):
+    async def scenario(db, owner, checklist, backpacks):
+        with track_queries() as stats:
+            changed = await crud.save_checklist_items(db, checklist, item_quantities={"зонт": 2, "Паспорт": 2})
+            unchanged = await crud.save_checklist_items(db, checklist, item_quantities={"Зонт": "2", "паспорт": 2})
+        await db.commit()
+        return checklist, changed, unchanged, stats
+
+    checklist, changed, unchanged, stats = _run(session_factory, scenario)
+    assert changed is True
+    assert unchanged is False
+    assert len(_item_writes(stats)) == 1
+    assert checklist.item_quantities == {"паспорт": 2, "зонт": 2}
+    assert checklist.items == ["Паспорт", "Зарядка", "Зонт"]
+
+
+def test_item_left_in_no_list_is_deleted(session_factory):
+    async def scenario(db, owner, checklist, backpacks):
+        await crud.save_checklist_items(db, checklist, items=["Паспорт", "Зарядка"], item_quantities={})
+        await db.commit()
+        return checklist
+
+    checklist = _run(session_factory, scenario)
+    assert [row.item_key for row in checklist.item_rows] == ["паспорт", "зарядка"]
+    assert checklist.item_quantities == {}
+
+
+def test_transfer_moves_item_between_backpacks(session_factory):
+    async def scenario(db, owner, checklist, backpacks):
+        source, target = backpacks
+        await crud.save_checklist_items(db, target, items=["Носки"], item_quantities={"носки": 1}, packed_quantities={})
+        await db.commit()
+        payload = main.BaggageTransferRequest(item="Носки", source_backpack_id=source.id, target_backpack_id=target.id)
+        with track_queries() as stats:
+            await main.transfer_checklist_item(checklist.slug, payload, db, owner)
+        return source, target, stats
+
+    source, target, stats = _run(session_factory, scenario)
+    assert source.items == ["Паспорт"]
+    assert source.item_quantities == {}
+    assert target.items == ["Носки"]
+    assert target.item_quantities == {"носки": 4}
+    assert target.packed_quantities == {"носки": 1}
+    assert target.checked_items == []
+    # DELETE в источнике и UPDATE в багаже назначения — остальные вещи не переписываются
+    assert len(_item_writes(stats)) == 2
+
+
+def test_transfer_from_shared_list_appends_to_backpack(session_factory):
+    async def scenario(db, owner, checklist, backpacks):
+        payload = main.BaggageTransferRequest(item="Зонт", target_backpack_id=backpacks[1].id)
+        await main.transfer_checklist_item(checklist.slug, payload, db, owner)
+        return checklist, backpacks[1]
+
+    checklist, target = _run(session_factory, scenario)
+    assert checklist.items == ["Паспорт", "Зарядка"]
+    assert target.items == ["Зонт"]
+    assert target.item_quantities == {"зонт": 2}
+    assert [row.section for row in target.item_rows] == ["backpack"]
@@ -0,0 +1,92 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import pytest
+
+from packing_matrix import WEATHER_SCENARIOS, WMO_SWEEP_CODES, case_id, packing_cases
+from packing_rules import PACKING_RULES, RAIN_CODES, TripFacts, summarize_weather
+from translations import get_item
+
+
+# Эталон снят со старой calculate_packing_data (см. golden/generate_packing_golden.py)
+GOLDEN_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden", "packing_items.json")
+with open(GOLDEN_PATH, encoding="utf-8") as f:
+    GOLDEN = json.load(f)
+GOLDEN_IDS = [f"{index:03d}-{entry['id']}" for index, entry in enumerate(GOLDEN)]
+
+RAIN_GEAR = {"raincoat", "umbrella"}
+# Вещи по длительности поездки: (ключи, больше скольких дней)
+DURATION_ITEMS = ((("laundry_bag", "packing_cubes"), 7), (("dry_shampoo",), 3))
+# Старый английский список искал "rain" в описании: морось без зонта, а "Snow grains" — с ним
+LEGACY_EN_RAIN_CODES = frozenset({61, 63, 65, 66, 67, 77, 80, 81, 82})
+
+
+def _names(keys, language: str) -> set[str]:
+    return {get_item(key, language) for key in keys}
+
+
+def _weather(case: dict):
+    trip_days, days = WEATHER_SCENARIOS[case["weather"]]
+    start_dt = datetime(2026, 1, 1)
+    end_dt = start_dt + timedelta(days=trip_days - 1)
+    daily_data = {(start_dt + timedelta(days=offset)).strftime("%Y-%m-%d"): day for offset, day in enumerate(days)}
+    return summarize_weather(daily_data, start_dt, end_dt)
+
+
+def _evaluate(case: dict) -> set[str]:
+    return PACKING_RULES.evaluate(TripFacts(
+        weather=_weather(case),
+        country=case["country"],
+        trip_type=case["trip_type"],
+        transport=case["transport"],
+        gender=case["gender"],
+        traveling_with_pet=case["traveling_with_pet"],
+        has_allergies=case["has_allergies"],
+        has_chronic_diseases=case["has_chronic_diseases"],
+    ))
+
+
+def test_golden_covers_current_matrix():
+    # Матрицу поменяли — эталон нужно снять заново со старой реализации
+    assert [entry["case"] for entry in GOLDEN] == packing_cases()
+    assert [entry["id"] for entry in GOLDEN] == [case_id(case) for case in packing_cases()]
+
+
+@pytest.mark.parametrize("entry", GOLDEN, ids=GOLDEN_IDS)
+def test_rules_match_legacy_output(entry):
+    case = entry["case"]
+    item_keys = _evaluate(case)
+
+    # Сравниваем то, что уходит пользователю: названия вещей (у styling/styling_product они совпадают)
+    assert _names(item_keys, "ru") == _names(entry["items"], "ru")
+    # В английском намеренно расходится только дождевая экипировка (см. test_rain_gear_*)
+    assert _names(item_keys - RAIN_GEAR, "en") == _names(set(entry["items_en"]) - RAIN_GEAR, "en")
+    assert _weather(case).avg_temp == entry["avg_temp"]
+
+
+@pytest.mark.parametrize("entry", GOLDEN, ids=GOLDEN_IDS)
+def test_duration_items_match_legacy_thresholds(entry):
+    trip_days, _ = WEATHER_SCENARIOS[entry["case"]["weather"]]
+    item_keys = _evaluate(entry["case"])
+    for keys, more_than_days in DURATION_ITEMS:
+        for key in keys:
+            assert (key in item_keys) == (trip_days > more_than_days) == (key in entry["items"]), key
+
+
+def test_matrix_covers_duration_thresholds():
+    trip_days = {WEATHER_SCENARIOS[entry["case"]["weather"]][0] for entry in GOLDEN}
+    for _, more_than_days in DURATION_ITEMS:
+        assert {more_than_days, more_than_days + 1} <= trip_days
+
+
+@pytest.mark.parametrize("code", WMO_SWEEP_CODES)
+def test_rain_gear_follows_wmo_codes(code):
+    entry = next(entry for entry in GOLDEN if entry["case"]["weather"] == f"wmo_{code}")
+    item_keys = _evaluate(entry["case"])
+    expected = code in RAIN_CODES
+
+    assert RAIN_GEAR & item_keys == (RAIN_GEAR if expected else set())
+    # Русский список старой версии совпадал с WMO-кодами, английский — нет
+    assert (RAIN_GEAR <= set(entry["items"])) == expected
+    assert (RAIN_GEAR <= set(entry["items_en"])) == (code in LEGACY_EN_RAIN_CODES)
@@ -0,0 +1,115 @@
+import asyncio
+from datetime import date
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import main  # noqa: E402
+import models  # noqa: E402
+from db_instrumentation import assert_query_budget, create_untracked_task, track_queries  # noqa: E402
+
+
+# Бюджеты — сколько запросов эндпоинты делают сейчас (selectin-подгрузки на каждую связь,
+# от числа чеклистов и подписчиков не зависит); рост значит новый N+1.
+PUBLIC_PROFILE_BUDGET = 12
+NOTIFY_INVITE_BUDGET = 17
+
+
+async def _seed(db: AsyncSession) -> dict:
+    owner = models.User(username="alice", email="alice@example.com", is_stats_public=True)
+    guest = models.User(username="bob", email="bob@example.com")
+    fans = [models.User(username=f"fan{index}") for index in range(6)]
+    db.add_all([owner, guest, *fans])
+    await db.flush()
+
+    checklists = []
+    for index in range(6):
+        checklist = models.Checklist(
+            city=f"City{index}, Country{index % 3}",
+            start_date=date(2026, 5, 1 + index),
+            end_date=date(2026, 5, 5 + index),
+            slug=f"trip-{index}",
+            user_id=owner.id,
+            is_public=index % 2 == 0,
+            hidden_sections=[],
+            item_rows=[
+                models.ChecklistItem(
+                    section="checklist",
+                    item_key=f"item {n}",
+                    text=f"item {n}",
+                    position=n,
+                    is_checked=False,
+                    is_removed=n == 0,
+                )
+                for n in range(5)
+            ],
+        )
+        checklists.append(checklist)
+    db.add_all(checklists)
+    await db.flush()
+
+    for checklist in checklists:
+        db.add(models.UserBackpack(checklist_id=checklist.id, user_id=fans[0].id, name="Рюкзак"))
+        db.add(models.TripReview(checklist_id=checklist.id, user_id=owner.id, rating=5, text="ok"))
+    await db.execute(insert(models.followers_association), [
+        {"follower_id": fan.id, "following_id": owner.id} for fan in fans
+    ])
+    await db.commit()
+    return {"owner_id": owner.id, "guest_id": guest.id, "slug": checklists[0].slug}
+
+
+def _run(session_factory, scenario):
+    async def runner():
+        async with session_factory() as db:
+            seeded = await _seed(db)
+        async with session_factory() as db:
+            return await scenario(db, seeded)
+
+    return asyncio.run(runner())
+
+
+def test_public_profile_query_budget(session_factory):
+    async def scenario(db, seeded):
+        viewer = await db.get(models.User, seeded["guest_id"])
+        with assert_query_budget(PUBLIC_PROFILE_BUDGET) as stats:
+            profile = await main.get_public_profile("alice", db, viewer)
+        return profile, stats
+
+    profile, stats = _run(session_factory, scenario)
+    assert profile["followers_count"] == 6
+    assert len(profile["checklists"]) == 3
+    assert profile["stats"]["total_trips"] == 6
+    assert len(profile["reviews"]) == 3
+    assert stats.count > 0
+
+
+def test_notify_invite_query_budget(session_factory):
+    async def scenario(db, seeded):
+        owner = await db.get(models.User, seeded["owner_id"])
+        with assert_query_budget(NOTIFY_INVITE_BUDGET) as stats:
+            result = await main.notify_invite(seeded["slug"], seeded["guest_id"], db, owner)
+        notifications = (await db.execute(
+            models.Notification.__table__.select().where(models.Notification.user_id == seeded["guest_id"])
+        )).all()
+        return result, notifications, stats
+
+    result, notifications, stats = _run(session_factory, scenario)
+    assert result == {"status": "ok"}
+    assert len(notifications) == 1
+    assert notifications[0].type == "checklist_invitation"
+    assert stats.count > 0
+
+
+def test_untracked_task_is_not_counted_into_request(session_factory):
+    async def scenario(db, seeded):
+        async def background():
+            async with session_factory() as other:
+                await other.get(models.User, seeded["owner_id"])
+
+        with track_queries() as stats:
+            await create_untracked_task(background())
+            await db.get(models.User, seeded["guest_id"])
+        return stats
+
+    stats = _run(session_factory, scenario)
+    assert stats.count == 1
@@ -0,0 +1,353 @@
+import asyncio
+import os
+from datetime import date, datetime, timedelta
+from typing import Optional
+
+import httpx
+
+import climatology
+import crud
+from database import SessionLocal
+from db_instrumentation import create_untracked_task
+from http_clients import get_http_client
+from translations import WMO_CODES
+
+
+# Open-Meteo API (бесплатный, без ключа)
+OPEN_METEO_FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+OPEN_METEO_HISTORICAL_URL = "https://archive-api.open-meteo.com/v1/archive"
+
+FORECAST_HORIZON_DAYS = 15
+# Кэш ключуется по координатам, округлённым до ~1 км (в weather_days — models.WEATHER_GRID_SCALE)
+WEATHER_COORD_PRECISION = 2
+# Прогноз на конкретный день меняется несколько раз в сутки, архив — практически никогда
+FORECAST_CACHE_TTL_HOURS = int(os.getenv("FORECAST_CACHE_TTL_HOURS", "6"))
+HISTORICAL_CACHE_TTL_DAYS = int(os.getenv("HISTORICAL_CACHE_TTL_DAYS", "365"))
+
+_DAILY_FIELDS = {
+    "forecast": "temperature_2m_max,temperature_2m_min,weathercode,relative_humidity_2m_mean,uv_index_max,wind_speed_10m_max",
+    "historical": "temperature_2m_max,temperature_2m_min,weathercode,relative_humidity_2m_mean,wind_speed_10m_max",
+}
+_CLIMATOLOGY_DAILY_FIELDS = "temperature_2m_max,temperature_2m_min,weathercode,precipitation_sum,relative_humidity_2m_mean,wind_speed_10m_max"
+# Ячейка -> фоновая задача, которая сейчас считает её нормы: тяжёлый многолетний запрос
+# к архиву не дублируем, но сборки разных ячеек друг друга не ждут
+_CLIMATOLOGY_INFLIGHT: dict[tuple[float, float], asyncio.Task] = {}
+_SOURCE_URLS = {
+    "forecast": OPEN_METEO_FORECAST_URL,
+    "historical": OPEN_METEO_HISTORICAL_URL,
+}
+
+
+def round_coord(value: float) -> float:
+    return round(float(value), WEATHER_COORD_PRECISION)
+
+
+def describe_weather_code(code, language: str) -> tuple[str, str]:
+    default_desc = "Unknown" if language != "ru" else "Неизвестно"
+    return WMO_CODES.get(language if language in WMO_CODES else "ru", {}).get(code, (default_desc, "01d"))
+
+
+def same_day_last_year(day: date) -> date:
+    try:
+        return day.replace(year=day.year - 1)
+    except ValueError:
+        # 29 февраля -> 28 февраля
+        return day.replace(year=day.year - 1, day=28)
+
+
+def _iter_days(start_date: date, end_date: date):
+    current = start_date
+    while current <= end_date:
+        yield current
+        current += timedelta(days=1)
+
+
+def _missing_ranges(days: list[date], cached: set[date]) -> list[tuple[date, date]]:
+    """Схлопывает незакэшированные дни в непрерывные подотрезки для запросов к API."""
+    ranges: list[tuple[date, date]] = []
+    run_start: Optional[date] = None
+    run_end: Optional[date] = None
+    for day in sorted(set(days)):
+        if day in cached:
+            continue
+        if run_end is not None and day == run_end + timedelta(days=1):
+            run_end = day
+            continue
+        if run_start is not None:
+            ranges.append((run_start, run_end))
+        run_start = run_end = day
+    if run_start is not None:
+        ranges.append((run_start, run_end))
+    return ranges
+
+
+def _is_fresh(fetched_at: Optional[datetime], source: str) -> bool:
+    if not fetched_at:
+        return False
+    if source == "forecast":
+        return datetime.now() - fetched_at < timedelta(hours=FORECAST_CACHE_TTL_HOURS)
+    return datetime.now() - fetched_at < timedelta(days=HISTORICAL_CACHE_TTL_DAYS)
+
+
+def _parse_daily(payload: dict) -> dict[date, dict]:
+    d = payload.get("daily", {}) or {}
+    times = d.get("time", [])
+    maxs = d.get("temperature_2m_max", [])
+    mins = d.get("temperature_2m_min", [])
+    codes = d.get("weathercode", [])
+    hums = d.get("relative_humidity_2m_mean", [])
+    uvs = d.get("uv_index_max", [])
+    winds = d.get("wind_speed_10m_max", [])
+
+    parsed: dict[date, dict] = {}
+    for i, t in enumerate(times):
+        if i >= len(maxs) or i >= len(mins) or maxs[i] is None or mins[i] is None:
+            continue
+        parsed[datetime.strptime(t, "%Y-%m-%d").date()] = {
+            "temp_max": maxs[i],
+            "temp_min": mins[i],
+            "weathercode": codes[i] if i < len(codes) else None,
+            "humidity": hums[i] if i < len(hums) else None,
+            "uv_index": uvs[i] if i < len(uvs) else None,
+            "wind_speed": winds[i] if i < len(winds) else None,
+        }
+    return parsed
+
+
+async def _fetch_range(
+    client: httpx.AsyncClient,
+    source: str,
+    points: list[tuple[float, float]],
+    start_date: date,
+    end_date: date,
+) -> list[dict[date, dict]]:
+    """Один запрос Open-Meteo на несколько координат (latitude/longitude через запятую)."""
+    try:
+        resp = await client.get(_SOURCE_URLS[source], params={
+            "latitude": ",".join(str(lat) for lat, _ in points),
+            "longitude": ",".join(str(lon) for _, lon in points),
+            "daily": _DAILY_FIELDS[source],
+            "timezone": "auto",
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": end_date.strftime("%Y-%m-%d"),
+        })
+        if resp.status_code != 200:
+            print(f"Open-Meteo {source} returned {resp.status_code}")
+            return [{} for _ in points]
+        payload = resp.json()
+        # Для одной точки API отдаёт объект, для нескольких — список в порядке координат
+        payloads = payload if isinstance(payload, list) else [payload]
+        if len(payloads) != len(points):
+            print(f"Open-Meteo {source} returned {len(payloads)} locations for {len(points)} points")
+            return [{} for _ in points]
+        return [_parse_daily(item) for item in payloads]
+    except Exception as e:
+        print(f"Open-Meteo {source} error: {e}")
+        return [{} for _ in points]
+
+
+async def _load_source_days(
+    client: httpx.AsyncClient,
+    source: str,
+    requests: list[tuple[float, float, list[date]]],
+) -> list[dict[date, dict]]:
+    """Дни из кэша + догрузка только недостающих подотрезков.
+
+    Недостающие дни всех точек схлопываются в общие непрерывные отрезки, и на каждый
+    отрезок уходит один мульти-координатный запрос по тем точкам, которым он нужен.
+    """
+    results: list[dict[date, dict]] = [{} for _ in requests]
+    if not any(days for _, _, days in requests):
+        return results
+
+    try:
+        async with SessionLocal() as session:
+            for index, (lat, lon, days) in enumerate(requests):
+                if not days:
+                    continue
+                rows = await crud.get_weather_days(session, lat, lon, source, min(days), max(days))
+                for row in rows:
+                    if _is_fresh(row.fetched_at, source):
+                        results[index][row.day] = row.data
+    except Exception as e:
+        print(f"Weather cache read error: {e}")
+
+    missing_by_index = {
+        index: {day for day in days if day not in results[index]}
+        for index, (_, _, days) in enumerate(requests)
+    }
+    all_missing = sorted(set().union(*missing_by_index.values()))
+    # Одинаковые координаты (один город в двух сегментах) запрашиваем и сохраняем один раз
+    fetched_by_point: dict[tuple[float, float], dict[date, dict]] = {}
+    for range_start, range_end in _missing_ranges(all_missing, set()):
+        points = list(dict.fromkeys(
+            (requests[index][0], requests[index][1])
+            for index, missing in missing_by_index.items()
+            if any(range_start <= day <= range_end for day in missing)
+        ))
+        fetched = await _fetch_range(client, source, points, range_start, range_end)
+        for point, point_days in zip(points, fetched):
+            fetched_by_point.setdefault(point, {}).update(point_days)
+
+    for index, (lat, lon, days) in enumerate(requests):
+        point_days = fetched_by_point.get((lat, lon)) or {}
+        for day in missing_by_index[index]:
+            if day in point_days:
+                results[index][day] = point_days[day]
+    try:
+        async with SessionLocal() as session:
+            for (lat, lon), point_days in fetched_by_point.items():
+                if point_days:
+                    await crud.save_weather_days(session, lat, lon, source, point_days)
+    except Exception as e:
+        print(f"Weather cache write error: {e}")
+    return results
+
+
+async def _build_climate_normals(
+    client: httpx.AsyncClient,
+    cells: tuple[tuple[float, float], ...],
+) -> dict[tuple[float, float], object]:
+    """Посчитать и сохранить нормы ячеек одним мульти-координатным запросом к архиву."""
+    start_date, end_date = climatology.archive_period(datetime.now().date())
+    try:
+        resp = await client.get(OPEN_METEO_HISTORICAL_URL, params={
+            "latitude": ",".join(str(lat) for lat, _ in cells),
+            "longitude": ",".join(str(lon) for _, lon in cells),
+            "daily": _CLIMATOLOGY_DAILY_FIELDS,
+            "timezone": "auto",
+            "start_date": start_date.strftime("%Y-%m-%d"),
+            "end_date": end_date.strftime("%Y-%m-%d"),
+        })
+        if resp.status_code != 200:
+            print(f"Open-Meteo climatology returned {resp.status_code}")
+            return {}
+        payload = resp.json()
+    except Exception as e:
+        print(f"Open-Meteo climatology error: {e}")
+        return {}
+
+    payloads = payload if isinstance(payload, list) else [payload]
+    if len(payloads) != len(cells):
+        print(f"Open-Meteo climatology returned {len(payloads)} locations for {len(cells)} cells")
+        return {}
+    normals = {}
+    for cell, item in zip(cells, payloads):
+        computed = await asyncio.to_thread(climatology.compute_normals, item.get("daily") or {})
+        if computed is not None:
+            climatology.save_normals(cell, computed)
+            normals[cell] = computed
+    return normals
+
+
+def _forget_climatology_build(cells: tuple[tuple[float, float], ...], task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"Climatology build error for {cells}: {task.exception()}")
+    for cell in cells:
+        if _CLIMATOLOGY_INFLIGHT.get(cell) is task:
+            del _CLIMATOLOGY_INFLIGHT[cell]
+
+
+def _warm_climate_normals(cells: list[tuple[float, float]]) -> None:
+    """Запустить в фоне сборку норм для ячеек, которые ещё никто не считает."""
+    to_build = tuple(cell for cell in dict.fromkeys(cells) if cell not in _CLIMATOLOGY_INFLIGHT)
+    if not to_build:
+        return
+    # Клиент общий, а не клиента запроса: сборка переживает сам запрос
+    task = create_untracked_task(_build_climate_normals(get_http_client("open_meteo"), to_build))
+    for cell in to_build:
+        _CLIMATOLOGY_INFLIGHT[cell] = task
+    task.add_done_callback(lambda done, cells=to_build: _forget_climatology_build(cells, done))
+
+
+def _load_climate_normals(cells: list[tuple[float, float]]) -> dict[tuple[float, float], object]:
+    """Нормы для ячеек, уже лежащие на диске; недостающие догружаются в фоне.
+
+    Многолетний архив под ячейку — тяжёлый запрос, и ждать его в интерактивном запросе
+    нельзя: пока нормы считаются, дни за горизонтом берутся из архива прошлого года.
+    """
+    normals = {}
+    for cell in cells:
+        loaded = climatology.load_normals(cell)
+        if loaded is not None:
+            normals[cell] = loaded
+    missing = [cell for cell in cells if cell not in normals]
+    if missing:
+        _warm_climate_normals(missing)
+    return normals
+
+
+async def get_daily_weather_batch(
+    points: list[tuple[float, float, date, date]],
+    client: httpx.AsyncClient | None = None,
+) -> list[dict[str, dict]]:
+    """Погода по дням для нескольких точек (lat, lon, start_date, end_date) одним запросом на источник.
+
+    Прогноз в пределах горизонта, дальше — климатические нормы (climatology), а пока их
+    нет на диске (считаются в фоне) — те же даты прошлого года из архива. Для каждой точки
+    возвращает {"YYYY-MM-DD": {"temp_max", "temp_min", "weathercode", "humidity",
+    "uv_index", "wind_speed", "source"}} в порядке входного списка.
+    """
+    client = client or get_http_client("open_meteo")
+    forecast_limit = datetime.now().date() + timedelta(days=FORECAST_HORIZON_DAYS)
+
+    forecast_requests = []
+    historical_requests = []
+    archive_maps = []
+    for lat, lon, start_date, end_date in points:
+        lat = round_coord(lat)
+        lon = round_coord(lon)
+        forecast_days = list(_iter_days(start_date, min(end_date, forecast_limit)))
+        historical_days = list(_iter_days(max(start_date, forecast_limit + timedelta(days=1)), end_date))
+        archive_day_by_trip_day = {day: same_day_last_year(day) for day in historical_days}
+        forecast_requests.append((lat, lon, forecast_days))
+        historical_requests.append((lat, lon, list(archive_day_by_trip_day.values())))
+        archive_maps.append(archive_day_by_trip_day)
+
+    # Дальше горизонта прогноза — климатические нормы; архив «прошлого года» только как запасной вариант
+    cells = [climatology.climate_cell(lat, lon) for lat, lon, _ in historical_requests]
+    climate_normals = _load_climate_normals(
+        [cell for cell, (_, _, days) in zip(cells, historical_requests) if days],
+    )
+    climate_results: list[dict[date, dict]] = []
+    for index, cell in enumerate(cells):
+        normals = climate_normals.get(cell)
+        if normals is None:
+            climate_results.append({})
+            continue
+        climate_results.append({
+            day: climatology.normals_for_day(normals, day) for day in archive_maps[index]
+        })
+        lat, lon, _ = historical_requests[index]
+        historical_requests[index] = (lat, lon, [])
+
+    forecast_results = await _load_source_days(client, "forecast", forecast_requests)
+    historical_results = await _load_source_days(client, "historical", historical_requests)
+
+    batch: list[dict[str, dict]] = []
+    for index, (_, _, forecast_days) in enumerate(forecast_requests):
+        daily_data: dict[str, dict] = {}
+        forecast = forecast_results[index]
+        for day in forecast_days:
+            if day in forecast:
+                daily_data[day.strftime("%Y-%m-%d")] = {**forecast[day], "source": "forecast"}
+        historical = historical_results[index]
+        climate = climate_results[index]
+        for day, archive_day in archive_maps[index].items():
+            if day in climate:
+                daily_data[day.strftime("%Y-%m-%d")] = {**climate[day], "source": "historical"}
+            elif archive_day in historical:
+                daily_data[day.strftime("%Y-%m-%d")] = {**historical[archive_day], "source": "historical"}
+        batch.append(daily_data)
+    return batch
+
+
+async def get_daily_weather(
+    lat: float,
+    lon: float,
+    start_date: date,
+    end_date: date,
+    client: httpx.AsyncClient | None = None,
+) -> dict[str, dict]:
+    """Погода по дням одной поездки (см. get_daily_weather_batch)."""
+    return (await get_daily_weather_batch([(lat, lon, start_date, end_date)], client))[0]